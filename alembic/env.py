@@ -25,6 +25,7 @@ if config.config_file_name is not None:
 # target_metadata = None
 from app.database import Base  # noqa: E402
 from app.models.user import User  # noqa: E402
+from app.models.webhook import StripeEvent, StripeEventDeadLetter  # noqa: E402
 target_metadata = Base.metadata
 
 # other values from the config, defined by the needs of env.py,
@@ -0,0 +1,41 @@
+"""Subscription timestamps with timezone
+
+Revision ID: 3d8e2a6f41c7
+Revises: 9b1f0c3e7a52
+Create Date: 2026-10-17 10:05:37.214690
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3d8e2a6f41c7'
+down_revision: Union[str, Sequence[str], None] = '9b1f0c3e7a52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing values were written as UTC
+    with op.batch_alter_table('subscriptions') as batch_op:
+        for column in ('created_at', 'updated_at'):
+            batch_op.alter_column(column,
+                                  existing_type=sa.DateTime(),
+                                  type_=sa.DateTime(timezone=True),
+                                  existing_nullable=True,
+                                  postgresql_using=f"{column} AT TIME ZONE 'UTC'")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('subscriptions') as batch_op:
+        for column in ('created_at', 'updated_at'):
+            batch_op.alter_column(column,
+                                  existing_type=sa.DateTime(timezone=True),
+                                  type_=sa.DateTime(),
+                                  existing_nullable=True,
+                                  postgresql_using=f"{column} AT TIME ZONE 'UTC'")
@@ -0,0 +1,41 @@
+"""Claim stripe events and store period end with timezone
+
+Revision ID: 9b1f0c3e7a52
+Revises: e4243ce87ba7
+Create Date: 2026-10-17 09:41:12.508317
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b1f0c3e7a52'
+down_revision: Union[str, Sequence[str], None] = 'e4243ce87ba7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('stripe_events', sa.Column('locked_until', sa.DateTime(timezone=True), nullable=True))
+    # Existing values were written as UTC
+    with op.batch_alter_table('subscriptions') as batch_op:
+        batch_op.alter_column('current_period_end',
+                              existing_type=sa.DateTime(),
+                              type_=sa.DateTime(timezone=True),
+                              existing_nullable=True,
+                              postgresql_using="current_period_end AT TIME ZONE 'UTC'")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('subscriptions') as batch_op:
+        batch_op.alter_column('current_period_end',
+                              existing_type=sa.DateTime(timezone=True),
+                              type_=sa.DateTime(),
+                              existing_nullable=True,
+                              postgresql_using="current_period_end AT TIME ZONE 'UTC'")
+    op.drop_column('stripe_events', 'locked_until')
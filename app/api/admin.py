@@ -1,28 +1,132 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import datetime, timezone
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from sqlalchemy import tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from app.database import get_async_session
+from app.database import get_async_session, engine, async_engine, replica_engines
 from app.models.user import User, UserRole
+from app.models.subscription import Subscription
 from app.utils.rbac import require_role
-from app.schemas.admin import UpdateUserRoleRequest
+from app.utils.pagination import encode_cursor, decode_cursor
+from app.utils.export import stream_rows, ndjson_chunks, csv_chunks, gzip_chunks
+from app.utils.password_hasher import hasher_stats
+from app.utils.principal_cache import invalidate_user, principal_cache_stats
+from app.utils.metrics import pool_stats
+from app.utils.catalog import catalog_stats
+from app.utils.entitlements import entitlement_cache_stats
+from app.utils.qr import qr_cache_stats
+from app.utils.totp import totp_stats
+from app.utils.rate_limit import rate_limit_stats
+from app.utils.cache import cache_stats
+from app.utils.redis_client import redis_client_stats
+from app.utils.profiler import get_profile, list_profiles, profiler_stats, to_collapsed, to_speedscope
+from app.utils.response_cache import cache_response, invalidate_user_responses, response_cache_stats
+from app.utils.serialization import json_response, to_model, to_user_out
+from app.schemas.admin import UpdateUserRoleRequest, UpdateUserRoleResponse, UserListResponse, UserSummary
 
 router = APIRouter()
 
+USERS_PAGE_SIZE = 50
+USERS_MAX_PAGE_SIZE = 200
+
+# Columns safe to expose in listings (no password hash or 2FA secrets)
+PUBLIC_USER_COLUMNS = (
+    User.id,
+    User.username,
+    User.email,
+    User.role,
+    User.is_2fa_enabled,
+    User.created_at,
+)
+
 
 # --- Get all users (admin only) ---
-@router.get("/users", dependencies=[Depends(require_role("admin"))])
-async def get_all_users(db: AsyncSession = Depends(get_async_session),):
-    # users = db.query(User).all()
-    users = (await db.execute(select(User))).scalars().all()
-    return {
-        "status": status.HTTP_200_OK,
-        "message": "Users retrieved successfully",
-        "data": [user for user in users]
-    }
+@router.get("/users", response_model=UserListResponse, dependencies=[Depends(require_role("admin"))])
+@cache_response(expire=30, vary="role", tags=("users:list",))
+async def get_all_users(
+    limit: int = Query(USERS_PAGE_SIZE, ge=1, le=USERS_MAX_PAGE_SIZE),
+    cursor: str | None = Query(None, description="next_cursor from the previous page"),
+    role: list[UserRole] | None = Query(None),
+    db: AsyncSession = Depends(get_async_session),
+):
+    """Keyset-paginated user listing ordered by (created_at, id)."""
+    query = (
+        select(*PUBLIC_USER_COLUMNS)
+        .order_by(User.created_at, User.id)
+        .limit(limit + 1)
+    )
+    if role:
+        query = query.where(User.role.in_(role))
+    if cursor:
+        created_at, user_id = decode_cursor(cursor)
+        query = query.where(tuple_(User.created_at, User.id) > tuple_(created_at, user_id))
+
+    rows = (await db.execute(query)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    return json_response(UserListResponse.model_construct(
+        status=status.HTTP_200_OK,
+        message="Users retrieved successfully",
+        data=[to_model(UserSummary, row) for row in rows],
+        next_cursor=next_cursor,
+    ))
+
+
+# --- Streaming export (admin only) ---
+EXPORTS = {
+    "users": (User, (*PUBLIC_USER_COLUMNS, User.updated_at)),
+    "subscriptions": (Subscription, (
+        Subscription.id,
+        Subscription.user_id,
+        Subscription.stripe_subscription_id,
+        Subscription.plan,
+        Subscription.status,
+        Subscription.current_period_end,
+        Subscription.is_active,
+        Subscription.payment_provider,
+        Subscription.payment_ref,
+        Subscription.created_at,
+        Subscription.updated_at,
+    )),
+}
+
+
+@router.get("/export/{resource}", dependencies=[Depends(require_role("admin"))])
+async def export_rows(
+    resource: Literal["users", "subscriptions"],
+    fmt: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    since: datetime | None = Query(None, description="only rows updated at or after this time"),
+    gzip: bool = Query(False, description="gzip the stream"),
+    db: AsyncSession = Depends(get_async_session),
+):
+    """Stream every row of a table as NDJSON or CSV in constant memory."""
+    model, columns = EXPORTS[resource]
+    query = select(*columns).order_by(model.created_at, model.id)
+    if since:
+        # updated_at is timezone-aware; read a bare timestamp as UTC
+        query = query.where(model.updated_at >= (since if since.tzinfo else since.replace(tzinfo=timezone.utc)))
+
+    batches = stream_rows(db, query)
+    if fmt == "csv":
+        body, media_type = csv_chunks([c.key for c in columns], batches), "text/csv"
+    else:
+        body, media_type = ndjson_chunks(batches), "application/x-ndjson"
+
+    headers = {"Content-Disposition": f'attachment; filename="{resource}.{fmt}"'}
+    if gzip:
+        body = gzip_chunks(body)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(body, media_type=media_type, headers=headers)
 
 
 # --- Update user role (admin only) ---
-@router.post("/update-role")
+@router.post("/update-role", response_model=UpdateUserRoleResponse)
 async def update_user_role(
     request: UpdateUserRoleRequest,
     db: AsyncSession = Depends(get_async_session),
@@ -32,7 +136,7 @@ async def update_user_role(
         raise HTTPException(status_code=403, detail="Not authorized")
     
     # user = db.query(User).filter(User.id == request.user_id).first()
-    user = (await db.execute(select(User).where(User.id == request.user_id))).scalars().first()
+    user = (await db.execute(select(User).where(User.id == str(request.user_id)))).scalars().first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -40,10 +144,65 @@ async def update_user_role(
         raise HTTPException(status_code=400, detail="Invalid role")
 
     user.role = request.new_role
+    user.token_version += 1  # revoke tokens that still carry the old role
     await db.commit()
     await db.refresh(user)
+    await invalidate_user(user.email)
+    await invalidate_user_responses(user.id)
+    return json_response(UpdateUserRoleResponse.model_construct(
+        status=status.HTTP_200_OK,
+        message=f"User role updated to {user.role}",
+        data=to_user_out(user),
+    ))
+
+
+# --- Runtime metrics (admin only) ---
+@router.get("/metrics", dependencies=[Depends(require_role("admin"))])
+async def get_metrics():
     return {
         "status": status.HTTP_200_OK,
-        "message": f"User role updated to {user.role}", 
-        "data": user
+        "message": "Metrics retrieved successfully",
+        "data": {
+            "principal_cache": principal_cache_stats(),
+            "password_hasher": hasher_stats(),
+            "entitlements": entitlement_cache_stats(),
+            "catalog": catalog_stats(),
+            "qr_codes": qr_cache_stats(),
+            "totp": totp_stats(),
+            "rate_limit": rate_limit_stats(),
+            "response_cache": response_cache_stats(),
+            "cache": cache_stats(),
+            "redis": redis_client_stats(),
+            "profiler": profiler_stats(),
+            "db_pool": {
+                "sync": pool_stats(engine.pool),
+                "async": pool_stats(async_engine.sync_engine.pool),
+                "replicas": [pool_stats(replica.sync_engine.pool) for replica in replica_engines],
+            },
         }
+    }
+
+
+# --- Request profiles (admin only) ---
+@router.get("/profiles", dependencies=[Depends(require_role("admin"))])
+async def get_profiles():
+    """Profiles captured by this worker, newest first."""
+    return {
+        "status": status.HTTP_200_OK,
+        "message": "Profiles retrieved successfully",
+        "data": list_profiles(),
+    }
+
+
+@router.get("/profiles/{profile_id}", dependencies=[Depends(require_role("admin"))])
+async def download_profile(
+    profile_id: int,
+    fmt: Literal["speedscope", "collapsed"] = Query("speedscope", alias="format"),
+):
+    """One profile as speedscope JSON (open at speedscope.app) or collapsed stacks for flamegraph.pl."""
+    profile = get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found (it may have been evicted or taken by another worker)")
+    if fmt == "collapsed":
+        return PlainTextResponse(to_collapsed(profile))
+    return to_speedscope(profile)
@@ -1,4 +1,6 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
@@ -6,15 +8,17 @@ from sqlalchemy.future import select
 from app.database import get_async_session
 from app.models.user import User, UserRole
 from app.utils.security import (
-    hash_password,
-    verify_password,
     create_access_token,
     generate_totp_secret,
-    verify_totp_code,
     generate_backup_code,
     hash_backup_code,
 )
-from app.utils.rbac import get_current_user, require_role
+from app.utils.password_hasher import hash_password_async, verify_password_async
+from app.utils.principal_cache import invalidate_user
+from app.utils.response_cache import invalidate_tags, invalidate_user_responses
+from app.utils.qr import forget_qr, qr_data_uri_async
+from app.utils.totp import consume_totp
+from app.utils.rbac import get_current_user_with_secrets, require_role
 from app.schemas.auth import (
     TokenRequest,
     TokenResponse,
@@ -29,22 +33,29 @@ from app.schemas.auth import (
 )
 
 import pyotp
-import qrcode
-import io
-import base64
 
 router = APIRouter()
 
+
+def _access_token_for(user: User) -> str:
+    """Issue a token carrying the claims needed for claims-only authorization."""
+    return create_access_token({
+        "sub": user.email,
+        "role": user.role,
+        "uid": user.id,
+        "ver": user.token_version,
+    })
+
 # ----------------- Auth Endpoints -----------------
 
 @router.post("/token", response_model=TokenResponse)
 async def token(request: TokenRequest, db: AsyncSession = Depends(get_async_session)) -> TokenResponse:
     # user = await db.query(User).filter(User.email == request.email).first()
     user = (await db.execute(select(User).where(User.email == request.email))).scalars().first()
-    if not user or not verify_password(request.password, user.hashed_password):
+    if not user or not await verify_password_async(request.password, user.hashed_password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
 
-    access_token = create_access_token({"sub": user.email, "role": user.role})
+    access_token = _access_token_for(user)
     return TokenResponse(
         status=status.HTTP_200_OK,
         message="Token generated successfully", 
@@ -59,7 +70,7 @@ async def signup(request: SignupRequest, db: AsyncSession = Depends(get_async_se
     if existing_user:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
 
-    hashed_pw = hash_password(request.password)
+    hashed_pw = await hash_password_async(request.password)
     new_user = User(
         username=request.username,
         email=request.email,
@@ -69,8 +80,10 @@ async def signup(request: SignupRequest, db: AsyncSession = Depends(get_async_se
     db.add(new_user)
     await db.commit()
     await db.refresh(new_user)
+    await invalidate_user(new_user.email)
+    await invalidate_tags("users:list")
 
-    token = create_access_token({"sub": new_user.email, "role": new_user.role})
+    token = _access_token_for(new_user)
     user_out = UserOut(
         id=new_user.id,
         username=new_user.username,
@@ -92,10 +105,10 @@ async def signup(request: SignupRequest, db: AsyncSession = Depends(get_async_se
 async def login(request: LoginRequest, db: AsyncSession = Depends(get_async_session)) -> LoginResponse:
     # user = await db.query(User).filter(User.email == request.email).first()
     user = (await db.execute(select(User).where(User.email == request.email))).scalars().first()
-    if not user or not verify_password(request.password, user.hashed_password):
+    if not user or not await verify_password_async(request.password, user.hashed_password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
 
-    token = create_access_token({"sub": user.email, "role": user.role})
+    token = _access_token_for(user)
     user_out = UserOut(
         id=user.id,
         username=user.username,
@@ -115,30 +128,34 @@ async def login(request: LoginRequest, db: AsyncSession = Depends(get_async_sess
 
 # ----------------- 2FA Endpoints -----------------
 
+def _provisioning_uri(user: User, secret: str) -> str:
+    return pyotp.TOTP(secret).provisioning_uri(name=user.email, issuer_name="Your App")
+
+
 @router.post("/setup-2fa", response_model=QRCodeResponse)
-async def setup_2fa(db: AsyncSession = Depends(get_async_session), current_user: User = Depends(get_current_user)):
+async def setup_2fa(
+    fmt: Literal["png", "svg"] = Query("png", alias="format", description="svg skips rasterizing and PNG encoding"),
+    db: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_user_with_secrets)):
     if current_user.is_2fa_enabled:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="2FA is already enabled")
 
-    secret = generate_totp_secret()
-    current_user.pending_2fa_secret = secret
-    await db.commit()
+    # Repeated calls reuse the pending secret, so the QR code comes from cache
+    secret = current_user.pending_2fa_secret
+    if not secret:
+        secret = generate_totp_secret()
+        current_user.pending_2fa_secret = secret
+        await db.commit()
+        await invalidate_user(current_user.email)
+        await invalidate_user_responses(current_user.id)
 
-    totp_uri = pyotp.TOTP(secret).provisioning_uri(name=current_user.email, issuer_name="Your App")
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(totp_uri)
-    qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white")
-    buf = io.BytesIO()
-    img.save(buf, format="PNG")
-    buf.seek(0)
-    qr_base64 = base64.b64encode(buf.getvalue()).decode()
+    qr_code = await qr_data_uri_async(_provisioning_uri(current_user, secret), fmt)
 
     return QRCodeResponse(
         status=status.HTTP_200_OK,
         message="Scan this QR code with your authenticator app",
         secret=secret,
-        qr_code=f"data:image/png;base64,{qr_base64}",
+        qr_code=qr_code,
     )
 
 
@@ -146,20 +163,23 @@ async def setup_2fa(db: AsyncSession = Depends(get_async_session), current_user:
 async def verify_2fa_setup(
     request: VerifyTwoFARequest, 
     db: AsyncSession = Depends(get_async_session), 
-    current_user: User = Depends(get_current_user)) -> BackupCodeResponse:
+    current_user: User = Depends(get_current_user_with_secrets)) -> BackupCodeResponse:
     if not current_user.pending_2fa_secret:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No pending 2FA setup found")
-    if not verify_totp_code(current_user.pending_2fa_secret, request.code):
+    if not await consume_totp(current_user.id, current_user.pending_2fa_secret, request.code):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid 2FA code")
 
     backup_code = generate_backup_code()
     hashed_backup = hash_backup_code(backup_code)
 
+    forget_qr(_provisioning_uri(current_user, current_user.pending_2fa_secret))
     current_user.active_2fa_secret = current_user.pending_2fa_secret
     current_user.pending_2fa_secret = None
     current_user.is_2fa_enabled = True
     current_user.backup_2fa_code = hashed_backup
     await db.commit()
+    await invalidate_user(current_user.email)
+    await invalidate_user_responses(current_user.id)
     
     return BackupCodeResponse(
         status=status.HTTP_200_OK,
@@ -170,16 +190,20 @@ async def verify_2fa_setup(
 
 
 @router.post("/enable-2fa")
-async def enable_2fa(db: AsyncSession = Depends(get_async_session), current_user: User = Depends(get_current_user)):
+async def enable_2fa(db: AsyncSession = Depends(get_async_session), current_user: User = Depends(get_current_user_with_secrets)):
     if current_user.is_2fa_enabled:
         return {
             "status": status.HTTP_400_BAD_REQUEST,
             "message": "2FA is already enabled"
             }
 
+    if current_user.pending_2fa_secret:
+        forget_qr(_provisioning_uri(current_user, current_user.pending_2fa_secret))
     secret = generate_totp_secret()
     current_user.pending_2fa_secret = secret
-    db.commit()
+    await db.commit()
+    await invalidate_user(current_user.email)
+    await invalidate_user_responses(current_user.id)
     return {
         "status": status.HTTP_200_OK,
         "message": "2FA enabled (pending verification)", 
@@ -188,7 +212,7 @@ async def enable_2fa(db: AsyncSession = Depends(get_async_session), current_user
 
 
 @router.post("/disable-2fa")
-async def disable_2fa(db: AsyncSession = Depends(get_async_session), current_user: User = Depends(get_current_user)):
+async def disable_2fa(db: AsyncSession = Depends(get_async_session), current_user: User = Depends(get_current_user_with_secrets)):
     if not current_user.is_2fa_enabled:
         return {
             "status": status.HTTP_400_BAD_REQUEST,
@@ -200,6 +224,8 @@ async def disable_2fa(db: AsyncSession = Depends(get_async_session), current_use
     current_user.pending_2fa_secret = None
     current_user.backup_2fa_code = None
     await db.commit()
+    await invalidate_user(current_user.email)
+    await invalidate_user_responses(current_user.id)
 
     return {
         "status": status.HTTP_200_OK,
@@ -207,11 +233,11 @@ async def disable_2fa(db: AsyncSession = Depends(get_async_session), current_use
         }
 
 @router.post("/verify-2fa")
-async def verify_2fa(request: VerifyTwoFARequest, current_user: User = Depends(get_current_user)):
+async def verify_2fa(request: VerifyTwoFARequest, current_user: User = Depends(get_current_user_with_secrets)):
     if not current_user.is_2fa_enabled:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="2FA is not enabled for this user")
 
-    totp_valid = verify_totp_code(current_user.totp_secret, request.code)
+    totp_valid = await consume_totp(current_user.id, current_user.active_2fa_secret, request.code)
     if not totp_valid:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid 2FA code")
 
@@ -1,19 +1,22 @@
 import os
-import stripe
-from datetime import datetime, timezone
 from fastapi import APIRouter, HTTPException, Depends, Request, status
 from fastapi.responses import JSONResponse, RedirectResponse
 
 from pydantic import BaseModel
 from typing import Optional
-from sqlalchemy.orm import Session
-
-from app.database import get_session
-from app.utils.rbac import get_current_user
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.database import get_async_session
+from app.utils.rbac import Principal, get_current_principal, get_current_user
+from app.utils.entitlements import get_entitlements, is_entitled
+from app.utils.catalog import get_catalog
+from app.utils.webhook_worker import ingest_event
+from app.utils.payment_gateway import GatewayError, GatewayUnavailable, get_gateway, verify_webhook_signature
 from app.models.user import User, Subscription
+from app.models.subscription import SubscriptionStatus
 
-# 🔑 Stripe setup
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+# 🔑 Stripe setup (API key and client live in app.utils.payment_gateway)
 STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
 PRICE_IDS = ["price_1S3LdN1G47fopV1p2KVkHMu7", "price_1S3Ldk1G47fopV1pL4XX12zU"]  # replace with your Stripe Price IDs
 
@@ -21,9 +24,19 @@ router = APIRouter()
 
 @router.get("/products")
 async def list_products():
-    """Return available subscription products."""
-    price_objs = [stripe.Price.retrieve(pid) for pid in PRICE_IDS]
-    return {"prices": price_objs}
+    """Return available subscription products, served from the catalog cache."""
+    try:
+        prices = await get_catalog(PRICE_IDS)
+    except Exception:
+        raise HTTPException(status_code=503, detail="Product catalog is temporarily unavailable")
+    return {"prices": prices}
+
+@router.get("/entitlements")
+async def my_entitlements(principal: Principal = Depends(get_current_principal)):
+    """Return the caller's current plan, as seen by require_subscription."""
+    entitlements = await get_entitlements(principal.db, principal.id)
+    return {**entitlements, "entitled": is_entitled(entitlements)}
+
 
 class CheckoutRequest(BaseModel):
     price_id: str
@@ -36,7 +49,7 @@ async def create_checkout_session(
 ):
     """Create a Stripe checkout session."""
     try:
-        checkout_session = stripe.checkout.Session.create(
+        checkout_session = await get_gateway().create_checkout_session(
             line_items=[
                 {
                     "price": req.price_id, 
@@ -48,88 +61,46 @@ async def create_checkout_session(
             cancel_url=str(request.base_url) + "products?canceled=1",
             client_reference_id=str(user.id),
         )
-        return {"checkout_url": checkout_session.url}
-    except Exception as e:
+        return {"checkout_url": checkout_session["url"]}
+    except GatewayUnavailable:
+        raise HTTPException(status_code=503, detail="Payment provider is temporarily unavailable")
+    except GatewayError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.post("/webhook")
-async def stripe_webhook(request: Request, db: Session = Depends(get_session)):
-    """Handle Stripe webhooks."""
+async def stripe_webhook(request: Request, db: AsyncSession = Depends(get_async_session)):
+    """
+    Verify, persist and acknowledge a Stripe webhook.
+    The event is applied later by the webhook worker; redeliveries are deduplicated by event id.
+    """
     payload = await request.body()
     sig_header = request.headers.get("stripe-signature")
 
-    try:
-        event = stripe.Webhook.construct_event(payload, sig_header, STRIPE_WEBHOOK_SECRET)
-    except (ValueError, stripe.error.SignatureVerificationError):
+    if not verify_webhook_signature(payload, sig_header, STRIPE_WEBHOOK_SECRET):
         raise HTTPException(status_code=400, detail="Invalid Stripe signature")
 
-    event_type = event["type"]
-    data = event["data"]["object"]
-
-    if event_type == "checkout.session.completed":
-        sub_id = data["subscription"]
-        user_id = data.get("client_reference_id")
-
-        user = db.query(User).get(user_id)
-        if not user:
-            return JSONResponse({"error": "User not found"}, status_code=404)
-
-        sub = stripe.Subscription.retrieve(sub_id)
-
-        subscription, _ = db.merge(
-            Subscription(
-                user_id=user.id,
-                stripe_subscription_id=sub_id,
-                status=sub["status"],
-                current_period_end=datetime.fromtimestamp(
-                    sub["current_period_end"], tz=timezone.utc
-                )
-                if sub.get("current_period_end")
-                else None,
-            )
-        )
-        db.add(subscription)
-        db.commit()
-        
-        print("Subscription created:", subscription)
-
-    elif event_type == "customer.subscription.updated":
-        db.query(Subscription).filter(
-            Subscription.stripe_subscription_id == data["id"]
-        ).update(
-            {
-                "status": data["status"],
-                "current_period_end": datetime.fromtimestamp(
-                    data["current_period_end"], tz=timezone.utc
-                )
-                if data.get("current_period_end")
-                else None,
-            }
-        )
-        db.commit()
-
-    elif event_type in ("customer.subscription.deleted", "invoice.payment_failed"):
-        sub = db.query(Subscription).filter(
-            Subscription.stripe_subscription_id == data["id"]
-        ).first()
-        if sub:
-            sub.status = "canceled"
-            db.commit()
-
-    return {"status": "success"}
+    try:
+        accepted = await ingest_event(db, payload.decode())
+    except (ValueError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid Stripe event")
+    return {"status": "accepted" if accepted else "duplicate"}
 
 
 @router.post("/cancel-subscription")
-async def cancel_subscription(user: User = Depends(get_current_user), db: Session = Depends(get_session)):
+async def cancel_subscription(user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_session)):
     """Cancel user's active subscription."""
-    sub = (
-        db.query(Subscription)
-        .filter(Subscription.user_id == user.id, Subscription.status == "active")
-        .first()
-    )
+    sub = (await db.execute(
+        select(Subscription)
+        .where(Subscription.user_id == user.id, Subscription.status == SubscriptionStatus.ACTIVE)
+    )).scalars().first()
     if not sub:
         raise HTTPException(status_code=404, detail="No active subscription found")
 
-    stripe.Subscription.modify(sub.stripe_subscription_id, cancel_at_period_end=True)
-    return {"message": "Subscription canceled at period end"}
\ No newline at end of file
+    try:
+        await get_gateway().cancel_subscription_at_period_end(sub.stripe_subscription_id)
+    except GatewayUnavailable:
+        raise HTTPException(status_code=503, detail="Payment provider is temporarily unavailable")
+    except GatewayError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": "Subscription canceled at period end"}
@@ -4,18 +4,23 @@ from sqlalchemy.future import select
 from typing import List
 
 from app.utils.rbac import get_current_user, require_role
+from app.utils.response_cache import cache_response
 from app.models.user import User
+from app.schemas.auth import MeResponse
+from app.utils.serialization import json_response, to_user_out
 
 router = APIRouter()
 
 
-@router.get("/me")
+@router.get("/me", response_model=MeResponse)
+@cache_response(expire=60, vary="user", tags=("user:{uid}",))
 async def get_me(current_user: User = Depends(get_current_user)):
     
     if not current_user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
     
-    return {
-        "message": "User info retrieved successfully", 
-        "user_info": current_user
-    }
\ No newline at end of file
+    # Public fields only: the response is cached outside the database
+    return json_response(MeResponse.model_construct(
+        message="User info retrieved successfully",
+        user_info=to_user_out(current_user),
+    ))
\ No newline at end of file
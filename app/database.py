@@ -4,6 +4,9 @@ from sqlalchemy.orm import sessionmaker, declarative_base, Session
 import os
 from pathlib import Path
 
+from app.utils.metrics import TimedQueuePool, TimedAsyncQueuePool, instrument_engine
+from app.utils.db_routing import RoutingSession, watch_replica
+
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -25,18 +28,90 @@ else:
     DB_PORT = os.getenv("POSTGRES_PORT", "5432")
     DATABASE_URL_SYNC = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
     DATABASE_URL_ASYNC = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-    
+
+
+# Optional read replicas: comma-separated async URLs, e.g.
+# postgresql+asyncpg://user:pw@replica1/db,postgresql+asyncpg://user:pw@replica2/db
+DB_REPLICA_URLS = [url.strip() for url in os.getenv("DB_REPLICA_URLS", "").split(",") if url.strip()]
+
+# Connection pool settings (applied per engine, per worker process)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds, -1 to never recycle
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() == "true"
+
+# asyncpg statement caches (set both to 0 behind pgbouncer in transaction mode)
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+DB_PREPARED_STATEMENT_CACHE_SIZE = int(os.getenv("DB_PREPARED_STATEMENT_CACHE_SIZE", "100"))
+
+POOL_OPTIONS = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+    "pool_recycle": DB_POOL_RECYCLE,
+    "pool_pre_ping": DB_POOL_PRE_PING,
+    "echo": DB_ECHO,
+}
+
+if DB_DRIVER == "sqlite":
+    SYNC_CONNECT_ARGS = {"check_same_thread": False}
+    ASYNC_CONNECT_ARGS = {}
+else:
+    SYNC_CONNECT_ARGS = {}
+    ASYNC_CONNECT_ARGS = {"statement_cache_size": DB_STATEMENT_CACHE_SIZE}
+    DATABASE_URL_ASYNC += f"?prepared_statement_cache_size={DB_PREPARED_STATEMENT_CACHE_SIZE}"
+
 
 # Create SQLAlchemy engine (for sync operations)
 engine = create_engine(
     DATABASE_URL_SYNC,
-    connect_args={"check_same_thread": False} if DB_DRIVER == "sqlite" else {}
+    connect_args=SYNC_CONNECT_ARGS,
+    poolclass=TimedQueuePool,
+    **POOL_OPTIONS,
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # Create async SQLAlchemy engine
-async_engine = create_async_engine(DATABASE_URL_ASYNC, echo=False)
-AsyncSessionLocal = sessionmaker(bind=async_engine, class_=AsyncSession, expire_on_commit=False)
+async_engine = create_async_engine(
+    DATABASE_URL_ASYNC,
+    connect_args=ASYNC_CONNECT_ARGS,
+    poolclass=TimedAsyncQueuePool,
+    **POOL_OPTIONS,
+)
+
+replica_engines = [
+    create_async_engine(
+        url,
+        connect_args={} if url.startswith("sqlite") else ASYNC_CONNECT_ARGS,
+        poolclass=TimedAsyncQueuePool,
+        **POOL_OPTIONS,
+    )
+    for url in DB_REPLICA_URLS
+]
+for replica in replica_engines:
+    watch_replica(replica)
+
+# Statement time feeds /metrics and each request's Server-Timing header
+for instrumented in (engine, async_engine.sync_engine, *(replica.sync_engine for replica in replica_engines)):
+    instrument_engine(instrumented)
+
+
+def make_async_sessionmaker(primary, replicas=()):
+    """Plain sessions on the primary, or routing sessions when replicas are configured."""
+    if not replicas:
+        return sessionmaker(bind=primary, class_=AsyncSession, expire_on_commit=False)
+    return sessionmaker(
+        class_=AsyncSession,
+        sync_session_class=RoutingSession,
+        primary=primary.sync_engine,
+        replicas=[replica.sync_engine for replica in replicas],
+        expire_on_commit=False,
+    )
+
+
+AsyncSessionLocal = make_async_sessionmaker(async_engine, replica_engines)
 
 # Base class for models
 Base = declarative_base()
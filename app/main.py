@@ -1,35 +1,67 @@
 from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 
 from app.api.auth import router as auth_router
 from app.api.admin import router as admin_router
 from app.api.user import router as user_router
+from app.api.payment import router as payment_router
 from app.models.user import User
 from app.utils.rbac import get_current_user
 from app.schemas.auth import UserOut
 
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi_cache.decorator import cache
 
-from app.utils.cache import init_redis_cache
-from app.utils.rate_limit import init_limiter, per_user_limiter
+from app.utils.cache import init_redis_cache, run_cache_invalidation_listener
+from app.utils.tiered_cache import run_tiered_cache_listener
+from app.utils.rate_limit import RateLimitHeadersMiddleware, init_limiter, multi_window_limiter, per_plan_limiter, per_user_limiter
 from app.utils.redis_client import close_redis
+from app.utils.password_hasher import shutdown_hasher
+from app.utils.db_routing import replica_health_loop
+from app.database import engine, async_engine, replica_engines
+from app.utils.metrics import MetricsMiddleware, render_prometheus
+from app.utils.webhook_worker import run_webhook_worker
+from app.utils.payment_gateway import close_gateway
+from app.utils.profiler import ProfilerMiddleware
+
+import os
 
 
 from dotenv import load_dotenv
 load_dotenv()
 
+# Run the Stripe webhook worker in this process (workers claim events, so any number may run it)
+STRIPE_WEBHOOK_WORKER = os.getenv("STRIPE_WEBHOOK_WORKER", "true").lower() == "true"
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
      # Initialize Redis cache
     await init_redis_cache()
+    # Keep this worker's in-process cache tier coherent with the others
+    cache_listener = asyncio.create_task(run_cache_invalidation_listener())
+    # Principal and entitlement caches: drop other workers' changes from the local tier
+    tiered_cache_listener = asyncio.create_task(run_tiered_cache_listener())
     # Initialize Redis-based rate limiter
     await init_limiter()
+    # Keep read replica health fresh so failed replicas leave rotation quickly
+    replica_probe = asyncio.create_task(replica_health_loop(replica_engines)) if replica_engines else None
+    # Apply persisted Stripe webhook events in the background
+    webhook_worker = asyncio.create_task(run_webhook_worker()) if STRIPE_WEBHOOK_WORKER else None
     
     # print("Application started...")
     yield
     # shutdown
+    cache_listener.cancel()
+    tiered_cache_listener.cancel()
+    if replica_probe:
+        replica_probe.cancel()
+    if webhook_worker:
+        webhook_worker.cancel()
+    await close_gateway()
     await close_redis()
+    shutdown_hasher()
     # print("Application shutdown complete.")
 
 app = FastAPI(
@@ -37,6 +69,7 @@ app = FastAPI(
     version="1.0.0",
     openapi_version="3.1.0",
     root_path="/api",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
@@ -49,10 +82,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- Rate Limit Headers Middleware ---
+# Adds RateLimit-* headers from multi_window_limiter, including on routes returning a Response
+app.add_middleware(RateLimitHeadersMiddleware)
+
+# --- Profiling Middleware ---
+# Samples requests sent by an admin with "X-Profile: 1" (or PROFILER_SAMPLE_RATE of all requests)
+app.add_middleware(ProfilerMiddleware)
+
+# --- Metrics Middleware ---
+# Outermost, so request latency and Server-Timing cover every other middleware
+app.add_middleware(MetricsMiddleware)
+
 # --- Include routers ---
 app.include_router(auth_router, prefix="/auth", tags=["auth"])
 app.include_router(admin_router, prefix="/admin", tags=["admin"])
 app.include_router(user_router, prefix="/user", tags=["user"])
+app.include_router(payment_router, prefix="/payment", tags=["payment"])
 
 
 # --- Root & Health ---
@@ -68,6 +114,18 @@ async def health_check() -> dict:
     return {
         "message": "Template API is healthy"
         }
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> PlainTextResponse:
+    """Prometheus scrape endpoint (per worker); keep it on an internal network."""
+    pools = {
+        "sync": engine.pool,
+        "async": async_engine.sync_engine.pool,
+        **{f"replica{i}": replica.sync_engine.pool for i, replica in enumerate(replica_engines)},
+    }
+    return PlainTextResponse(render_prometheus(pools), media_type="text/plain; version=0.0.4")
+
     
 @app.get("/cache-test")
 @cache(expire=60)  # cache response for 60 seconds
@@ -80,7 +138,17 @@ async def rate_limit_test(user: User = Depends(get_current_user)):
     return {"message": f"Hello {user.username}, you can call this 3 times per minute"}
 
 
+@app.get("/plan-rate-limit-test", dependencies=[Depends(per_plan_limiter({"basic": (10, 60), "pro": (60, 60), "premium": (300, 60)}, times=3, seconds=60))])
+async def plan_rate_limit_test(user: User = Depends(get_current_user)):
+    return {"message": f"Hello {user.username}, your quota depends on your plan"}
+
+
 
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+
+
+@app.get("/multi-window-rate-limit-test", dependencies=[Depends(multi_window_limiter((10, 1), (1000, 3600)))]) # 10/s burst, 1000/h sustained
+async def multi_window_rate_limit_test(user: User = Depends(get_current_user)):
+    return {"message": f"Hello {user.username}, check the RateLimit-* headers"}
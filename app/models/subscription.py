@@ -36,20 +36,21 @@ class Subscription(Base):
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
 
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
     stripe_subscription_id = Column(String, unique=True, index=True, nullable=False)
 
     plan = Column(Enum(SubscriptionPlan), nullable=True)  # optional, can derive from Stripe Price
     status = Column(Enum(SubscriptionStatus), nullable=False, default=SubscriptionStatus.ACTIVE)
 
-    current_period_end = Column(DateTime, nullable=True)
+    current_period_end = Column(DateTime(timezone=True), nullable=True)
     is_active = Column(Boolean, default=True)
 
     # optional Stripe metadata
     payment_provider = Column(String, default="stripe")
     payment_ref = Column(String, nullable=True)  # e.g., Stripe invoice ID
 
-    created_at = Column(DateTime, default=datetime.now(timezone.utc))
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), index=True)
 
     # relationship
     user = relationship("User", back_populates="subscriptions")
\ No newline at end of file
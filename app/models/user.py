@@ -2,9 +2,11 @@ from datetime import datetime, timezone
 from sqlalchemy import (
     Column, 
     String, 
+    Integer,
     Boolean, 
     DateTime, 
-    Enum
+    Enum,
+    Index
 )
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -20,6 +22,10 @@ class UserRole(str, enum.Enum):
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # Keyset pagination order for admin listings
+        Index("ix_users_created_at_id", "created_at", "id"),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()), index=True)
     username = Column(String, nullable=False, unique=True)
@@ -28,6 +34,8 @@ class User(Base):
     
     # Role-based access
     role = Column(Enum(UserRole), default=UserRole.user, nullable=False)
+    # Bumped to revoke every token issued before a role change
+    token_version = Column(Integer, default=0, server_default="0", nullable=False)
     
     # Two-Factor Authentication (2FA) fields
     is_2fa_enabled = Column(Boolean, default=False, nullable=False)
@@ -36,9 +44,12 @@ class User(Base):
     backup_2fa_code = Column(String, nullable=True)
     
     # Metadata
-    created_at = Column(DateTime(timezone=True), default=datetime.now(timezone.utc), nullable=False)
-    updated_at = Column(DateTime(timezone=True), default=datetime.now(timezone.utc), onupdate=datetime.now(timezone.utc))
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), index=True)
     
     # Relationships
     subscriptions = relationship("Subscription", back_populates="user", cascade="all, delete")
 
+
+# Register the Subscription mapper so the relationship above can resolve
+from app.models.subscription import Subscription  # noqa: E402,F401
@@ -0,0 +1,51 @@
+from datetime import datetime, timezone
+from sqlalchemy import (
+    Column,
+    String,
+    Integer,
+    Text,
+    DateTime,
+    Index
+)
+from app.database import Base
+
+
+# --- Raw Stripe webhook events, processed asynchronously ---
+class StripeEvent(Base):
+    __tablename__ = "stripe_events"
+    __table_args__ = (
+        # Worker scan order
+        Index("ix_stripe_events_status_created", "status", "stripe_created"),
+    )
+
+    id = Column(String, primary_key=True)  # Stripe event id, used for deduplication
+    type = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)
+
+    # Events sharing a key (the Stripe subscription id) are applied in order
+    subscription_key = Column(String, nullable=True, index=True)
+    stripe_created = Column(Integer, nullable=True)
+
+    status = Column(String, nullable=False, default="pending")  # "pending" or "processed"
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime(timezone=True), nullable=True)
+    locked_until = Column(DateTime(timezone=True), nullable=True)  # claimed by a worker until then
+    last_error = Column(Text, nullable=True)
+
+    received_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+
+
+# --- Events that exhausted their retries ---
+class StripeEventDeadLetter(Base):
+    __tablename__ = "stripe_event_dead_letters"
+
+    id = Column(String, primary_key=True)
+    type = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)
+    subscription_key = Column(String, nullable=True)
+    attempts = Column(Integer, nullable=False)
+    last_error = Column(Text, nullable=True)
+
+    received_at = Column(DateTime(timezone=True), nullable=False)
+    failed_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
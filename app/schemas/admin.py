@@ -1,9 +1,25 @@
+from datetime import datetime
 from pydantic import BaseModel, EmailStr
 from enum import Enum
 from uuid import UUID
 from typing import Optional, List
 from app.models.user import UserRole
+from app.schemas.auth import UserOut
 
 class UpdateUserRoleRequest(BaseModel):
     user_id: UUID
-    new_role: UserRole
\ No newline at end of file
+    new_role: UserRole
+
+class UserSummary(UserOut):
+    created_at: datetime
+
+class UserListResponse(BaseModel):
+    status: int
+    message: str
+    data: List[UserSummary]
+    next_cursor: Optional[str] = None
+
+class UpdateUserRoleResponse(BaseModel):
+    status: int
+    message: str
+    data: UserOut
@@ -10,6 +10,10 @@ class UserOut(BaseModel):
     email: EmailStr
     role: UserRole
     is_2fa_enabled: bool
+
+class MeResponse(BaseModel):
+    message: str
+    user_info: UserOut
     
 class TokenRequest(BaseModel):
     email: EmailStr
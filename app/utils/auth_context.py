@@ -0,0 +1,47 @@
+from fastapi import HTTPException, Request, status
+
+from app.utils.security import verify_token
+
+
+# --- Request-scoped token claims ---
+def get_bearer_token(request: Request) -> str | None:
+    """Return the bearer token from the Authorization header, if any."""
+    auth = request.headers.get("Authorization")
+    if not auth or not auth.lower().startswith("bearer "):
+        return None
+    return auth.split(" ", 1)[1].strip()
+
+
+def get_token_claims(request: Request) -> dict | None:
+    """
+    Verify the bearer token once per request.
+    The result is kept on request.state, which the limiter, RBAC and
+    handlers all share for the lifetime of the request.
+    """
+    try:
+        return request.state.auth_claims
+    except AttributeError:
+        pass
+
+    token = get_bearer_token(request)
+    claims = verify_token(token) if token else None
+    if claims is not None and "sub" not in claims:
+        claims = None
+
+    request.state.auth_claims = claims
+    return claims
+
+
+async def get_auth_claims(request: Request) -> dict:
+    """
+    Dependency returning verified token claims.
+    Usage: claims: dict = Depends(get_auth_claims)
+    """
+    claims = get_token_claims(request)
+    if claims is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return claims
@@ -1,7 +1,237 @@
+import asyncio
+import json
+import math
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional, Tuple
+
 from fastapi_cache import FastAPICache
-from fastapi_cache.backends.redis import RedisBackend
+from fastapi_cache.types import Backend
 from app.utils.redis_client import get_redis
+from app.utils.tiered_cache import REDIS_RETRY_AFTER, RedisBackoff
+
+CACHE_LOCAL_TTL = float(os.getenv("CACHE_LOCAL_TTL", "30"))  # upper bound on staleness if a message is lost
+CACHE_LOCAL_MAX_ENTRIES = int(os.getenv("CACHE_LOCAL_MAX_ENTRIES", "10000"))  # 0 disables the local tier
+CACHE_LOCAL_MAX_BYTES = int(os.getenv("CACHE_LOCAL_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_LOCAL_MAX_ITEM_BYTES = int(os.getenv("CACHE_LOCAL_MAX_ITEM_BYTES", str(1024 * 1024)))
+CACHE_INVALIDATION_CHANNEL = "fastapi-cache:invalidate"
+
+# Tags our own invalidation messages so the sender keeps its fresh copy
+_origin = uuid.uuid4().hex
+
+# key -> (local_expires_at, redis_expires_at, value); both monotonic
+_local: "OrderedDict[str, tuple[float, float, bytes]]" = OrderedDict()
+_local_bytes = 0
+# The local tier is only read while subscribed, so no invalidation can be missed
+_listening = False
+# Bumped by every received invalidation; a read that raced one is not kept locally
+_generation = 0
+_stats = {
+    "local_hits": 0,
+    "redis_hits": 0,
+    "misses": 0,
+    "sets": 0,
+    "evictions": 0,
+    "invalidations_sent": 0,
+    "invalidations_received": 0,
+    "redis_errors": 0,
+    "listener_errors": 0,
+}
+_redis = RedisBackoff(_stats)
+
+
+# --- Local tier ---
+def _local_get(key: str) -> tuple[int, bytes] | None:
+    entry = _local.get(key)
+    if entry is None:
+        return None
+    local_expires_at, redis_expires_at, value = entry
+    now = time.monotonic()
+    if local_expires_at < now:
+        _local_pop(key)
+        return None
+    _local.move_to_end(key)
+    return max(math.ceil(redis_expires_at - now), 0), value
+
+
+def _local_set(key: str, value: bytes, ttl: float):
+    global _local_bytes
+    if CACHE_LOCAL_MAX_ENTRIES <= 0 or len(value) > CACHE_LOCAL_MAX_ITEM_BYTES or ttl <= 0:
+        return
+    _local_pop(key)
+    now = time.monotonic()
+    _local[key] = (now + min(ttl, CACHE_LOCAL_TTL), now + ttl, value)
+    _local_bytes += len(value)
+    while _local and (len(_local) > CACHE_LOCAL_MAX_ENTRIES or _local_bytes > CACHE_LOCAL_MAX_BYTES):
+        _, (_, _, evicted) = _local.popitem(last=False)
+        _local_bytes -= len(evicted)
+        _stats["evictions"] += 1
+
+
+def _local_pop(key: str):
+    global _local_bytes
+    entry = _local.pop(key, None)
+    if entry is not None:
+        _local_bytes -= len(entry[2])
+
+
+def _local_clear(namespace: str | None = None):
+    global _local_bytes
+    if namespace is None:
+        _local.clear()
+        _local_bytes = 0
+        return
+    for key in [k for k in _local if k.startswith(f"{namespace}:")]:
+        _local_pop(key)
+
+
+# --- Redis tier ---
+def _invalidation(**payload) -> str:
+    _stats["invalidations_sent"] += 1
+    return json.dumps({"origin": _origin, **payload})
+
+
+def _apply_invalidation(raw: str):
+    """Handle a message from another worker: drop the keys or namespace it names."""
+    global _generation
+    message = json.loads(raw)
+    if message.get("origin") == _origin:
+        return
+    _stats["invalidations_received"] += 1
+    _generation += 1
+    if "namespace" in message:
+        _local_clear(message["namespace"])
+    for key in message.get("keys", ()):
+        _local_pop(key)
+
+
+class TieredBackend(Backend):
+    """
+    fastapi-cache backend with a bounded in-process LRU in front of Redis.
+    Writes and clears are published on CACHE_INVALIDATION_CHANNEL so every worker
+    drops its local copy; run_cache_invalidation_listener() must run in each worker.
+    """
+
+    async def get_with_ttl(self, key: str) -> Tuple[int, Optional[bytes]]:
+        if _listening:
+            cached = _local_get(key)
+            if cached is not None:
+                _stats["local_hits"] += 1
+                return cached
+
+        if _redis.available():
+            generation = _generation
+            try:
+                async with (await get_redis()).pipeline(transaction=False) as pipe:
+                    ttl, value = await pipe.ttl(key).get(key).execute()
+            except Exception:
+                _redis.failed()
+            else:
+                if value is not None:
+                    _stats["redis_hits"] += 1
+                    # The shared client decodes responses; the coders expect bytes
+                    value = value.encode() if isinstance(value, str) else value
+                    if _listening and generation == _generation:
+                        _local_set(key, value, ttl if ttl > 0 else CACHE_LOCAL_TTL)
+                    return max(ttl, 0), value
+        _stats["misses"] += 1
+        return 0, None
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return (await self.get_with_ttl(key))[1]
+
+    async def set(self, key: str, value: bytes, expire: Optional[int] = None) -> None:
+        _stats["sets"] += 1
+        _local_pop(key)
+        if not _redis.available():
+            return
+        try:
+            async with (await get_redis()).pipeline(transaction=False) as pipe:
+                pipe.set(key, value, ex=expire)
+                pipe.publish(CACHE_INVALIDATION_CHANNEL, _invalidation(keys=[key]))
+                await pipe.execute()
+        except Exception:
+            _redis.failed()
+            return
+        if _listening:
+            _local_set(key, value, expire or CACHE_LOCAL_TTL)
+
+    async def clear(self, namespace: Optional[str] = None, key: Optional[str] = None) -> int:
+        if namespace:
+            _local_clear(namespace)
+        elif key:
+            _local_pop(key)
+        else:
+            return 0
+
+        # The local tier is cleared either way; other workers' expire within CACHE_LOCAL_TTL
+        if not _redis.available():
+            return 0
+        try:
+            client = await get_redis()
+            if key:
+                count = await client.delete(key)
+                await client.publish(CACHE_INVALIDATION_CHANNEL, _invalidation(keys=[key]))
+                return count
+
+            count, batch = 0, []
+            async for name in client.scan_iter(match=f"{namespace}:*", count=500):
+                batch.append(name)
+                if len(batch) >= 500:
+                    count += await client.delete(*batch)
+                    batch = []
+            if batch:
+                count += await client.delete(*batch)
+            await client.publish(CACHE_INVALIDATION_CHANNEL, _invalidation(namespace=namespace))
+            return count
+        except Exception:
+            _redis.failed()
+            return 0
+
+
+async def run_cache_invalidation_listener():
+    """Apply other workers' invalidations to the local tier. Runs until cancelled."""
+    global _listening
+    while True:
+        pubsub = None
+        try:
+            pubsub = (await get_redis()).pubsub(ignore_subscribe_messages=True)
+            await pubsub.subscribe(CACHE_INVALIDATION_CHANNEL)
+            # Messages may have been missed while unsubscribed
+            _local_clear()
+            _listening = True
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    _apply_invalidation(message["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            _stats["listener_errors"] += 1
+        finally:
+            _listening = False
+            if pubsub is not None:
+                try:
+                    await pubsub.reset()
+                except Exception:
+                    pass
+        await asyncio.sleep(REDIS_RETRY_AFTER)
+
 
 async def init_redis_cache():
-    redis_client = await get_redis()
-    FastAPICache.init(RedisBackend(redis_client), prefix="fastapi-cache")
+    FastAPICache.init(TieredBackend(), prefix="fastapi-cache")
+
+
+def cache_stats() -> dict:
+    lookups = _stats["local_hits"] + _stats["redis_hits"] + _stats["misses"]
+    redis_lookups = _stats["redis_hits"] + _stats["misses"]
+    return {
+        **_stats,
+        "listening": _listening,
+        "local_size": len(_local),
+        "local_bytes": _local_bytes,
+        "local_hit_ratio": round(_stats["local_hits"] / lookups, 4) if lookups else 0.0,
+        "redis_hit_ratio": round(_stats["redis_hits"] / redis_lookups, 4) if redis_lookups else 0.0,
+        "hit_ratio": round((lookups - _stats["misses"]) / lookups, 4) if lookups else 0.0,
+    }
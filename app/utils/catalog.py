@@ -0,0 +1,106 @@
+import asyncio
+import json
+import os
+import time
+
+from app.utils.payment_gateway import get_gateway
+from app.utils.redis_client import get_redis
+
+CATALOG_TTL = float(os.getenv("CATALOG_TTL", "300"))  # seconds a fetched catalog counts as fresh
+CATALOG_REFRESH_AHEAD = float(os.getenv("CATALOG_REFRESH_AHEAD", "0.8"))  # refresh after this fraction of the TTL
+CATALOG_MAX_STALE = float(os.getenv("CATALOG_MAX_STALE", "86400"))  # serve stale data this long while Stripe is down
+CATALOG_REDIS = os.getenv("CATALOG_REDIS", "true").lower() == "true"
+CATALOG_REDIS_KEY = "catalog:prices"
+
+# {"price_ids": [...], "fetched_at": <unix time>, "prices": [...]}
+_entry: dict | None = None
+_refresh_task: asyncio.Task | None = None
+_stats = {"hits": 0, "refreshes": 0, "refresh_errors": 0}
+
+
+# --- Redis tier ---
+async def _redis_load(price_ids: list[str]) -> dict | None:
+    if not CATALOG_REDIS:
+        return None
+    try:
+        raw = await (await get_redis()).get(CATALOG_REDIS_KEY)
+    except Exception:
+        return None
+    entry = json.loads(raw) if raw else None
+    return entry if entry and entry["price_ids"] == price_ids else None
+
+
+async def _redis_store(entry: dict):
+    if not CATALOG_REDIS:
+        return
+    try:
+        await (await get_redis()).set(CATALOG_REDIS_KEY, json.dumps(entry), ex=int(CATALOG_MAX_STALE))
+    except Exception:
+        pass
+
+
+# --- Refresh ---
+async def _refresh(price_ids: list[str]) -> dict:
+    """Fetch all prices concurrently; adopt a fresher copy from Redis if another worker already did."""
+    global _entry
+    shared = await _redis_load(price_ids)
+    if shared and time.time() - shared["fetched_at"] < CATALOG_TTL * CATALOG_REFRESH_AHEAD:
+        _entry = shared
+        return shared
+
+    gateway = get_gateway()
+    try:
+        prices = await asyncio.gather(*(gateway.retrieve_price(pid) for pid in price_ids))
+    except Exception:
+        _stats["refresh_errors"] += 1
+        raise
+
+    _stats["refreshes"] += 1
+    _entry = {"price_ids": price_ids, "fetched_at": time.time(), "prices": list(prices)}
+    await _redis_store(_entry)
+    return _entry
+
+
+def _refresh_in_background(price_ids: list[str]) -> asyncio.Task:
+    """Start a refresh unless one is already running (single flight)."""
+    global _refresh_task
+    if _refresh_task is None or _refresh_task.done():
+        _refresh_task = asyncio.create_task(_refresh(price_ids))
+        # Failures are counted in _stats; stale data keeps being served
+        _refresh_task.add_done_callback(lambda task: task.cancelled() or task.exception())
+    return _refresh_task
+
+
+# --- Public API ---
+async def get_catalog(price_ids: list[str]) -> list[dict]:
+    """
+    Return the prices for `price_ids` from cache, refreshing ahead of expiry.
+    Stale prices are served while Stripe is unreachable, up to CATALOG_MAX_STALE.
+    """
+    global _entry
+    entry = _entry if _entry and _entry["price_ids"] == price_ids else None
+    if entry is None:
+        entry = await _redis_load(price_ids)
+        _entry = entry or _entry
+
+    if entry is None:
+        # Cold start: nothing to serve yet, wait for the first fetch.
+        # Shielded: a disconnecting client must not cancel the refresh other callers share
+        entry = await asyncio.shield(_refresh_in_background(price_ids))
+        return entry["prices"]
+
+    age = time.time() - entry["fetched_at"]
+    if age >= CATALOG_TTL * CATALOG_REFRESH_AHEAD:
+        task = _refresh_in_background(price_ids)
+        if age >= CATALOG_MAX_STALE:
+            entry = await asyncio.shield(task)
+
+    _stats["hits"] += 1
+    return entry["prices"]
+
+
+def catalog_stats() -> dict:
+    return {
+        **_stats,
+        "age_seconds": round(time.time() - _entry["fetched_at"], 1) if _entry else None,
+    }
@@ -0,0 +1,85 @@
+import asyncio
+import itertools
+import time
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+REPLICA_RETRY_AFTER = 30.0  # seconds a failed replica is skipped
+
+_down_until: dict[Engine, float] = {}
+_round_robin = itertools.count()
+
+
+# --- Replica health ---
+def mark_replica_down(engine: Engine, seconds: float = REPLICA_RETRY_AFTER):
+    _down_until[engine] = time.monotonic() + seconds
+
+
+def mark_replica_up(engine: Engine):
+    _down_until.pop(engine, None)
+
+
+def is_replica_healthy(engine: Engine) -> bool:
+    return _down_until.get(engine, 0.0) <= time.monotonic()
+
+
+def watch_replica(engine: AsyncEngine):
+    """Take a replica out of rotation when it fails to connect or drops connections."""
+    @event.listens_for(engine.sync_engine, "handle_error")
+    def on_error(context):
+        if context.is_disconnect or isinstance(context.sqlalchemy_exception, OperationalError):
+            mark_replica_down(engine.sync_engine)
+
+
+async def probe_replicas(replicas: list[AsyncEngine]):
+    """Run SELECT 1 on every replica and update its health."""
+    for replica in replicas:
+        try:
+            async with replica.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+        except Exception:
+            mark_replica_down(replica.sync_engine)
+        else:
+            mark_replica_up(replica.sync_engine)
+
+
+async def replica_health_loop(replicas: list[AsyncEngine], interval: float = 10.0):
+    while True:
+        await probe_replicas(replicas)
+        await asyncio.sleep(interval)
+
+
+# --- Routing session ---
+class RoutingSession(Session):
+    """
+    Sends reads to a replica and everything else to the primary.
+    Once the session flushes or runs an INSERT/UPDATE/DELETE it stays on
+    the primary, so a request reads its own writes.
+    """
+
+    def __init__(self, *, primary: Engine, replicas: list[Engine], **kwargs):
+        super().__init__(**kwargs)
+        self.primary = primary
+        self.replicas = replicas
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._flushing or (clause is not None and clause.is_dml):
+            self.info["pinned_to_primary"] = True
+        if self.info.get("pinned_to_primary"):
+            return self.primary
+        if not isinstance(clause, Select) or clause._for_update_arg is not None:
+            return self.primary
+
+        replica = self.info.get("replica")
+        if replica is None or not is_replica_healthy(replica):
+            healthy = [r for r in self.replicas if is_replica_healthy(r)]
+            if not healthy:
+                return self.primary
+            replica = healthy[next(_round_robin) % len(healthy)]
+            self.info["replica"] = replica
+        return replica
@@ -0,0 +1,98 @@
+import os
+from datetime import datetime, timezone
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.models.subscription import Subscription, SubscriptionPlan, SubscriptionStatus
+from app.utils.tiered_cache import TwoTierCache
+
+ENTITLEMENT_CACHE_SIZE = int(os.getenv("ENTITLEMENT_CACHE_SIZE", "10000"))  # 0 disables the local tier
+ENTITLEMENT_CACHE_LOCAL_TTL = float(os.getenv("ENTITLEMENT_CACHE_LOCAL_TTL", "30"))
+ENTITLEMENT_CACHE_REDIS_TTL = int(os.getenv("ENTITLEMENT_CACHE_REDIS_TTL", "3600"))  # 0 disables the Redis tier
+ENTITLEMENT_CACHE_PREFIX = "entitlements:"
+
+# Higher plans include the features of lower ones
+PLAN_RANK = {SubscriptionPlan.BASIC.value: 1, SubscriptionPlan.PRO.value: 2, SubscriptionPlan.PREMIUM.value: 3}
+ENTITLED_STATUSES = {SubscriptionStatus.ACTIVE.value, SubscriptionStatus.TRIALING.value}
+
+# Users without a subscription are cached too, so free users never hit the database
+NO_ENTITLEMENTS = {"plan": None, "status": None, "current_period_end": None}
+
+_cache = TwoTierCache(ENTITLEMENT_CACHE_PREFIX, ENTITLEMENT_CACHE_SIZE, ENTITLEMENT_CACHE_LOCAL_TTL, ENTITLEMENT_CACHE_REDIS_TTL)
+_stats = {"refreshes": 0}
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite hands timezone-aware columns back as naive UTC
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+# --- Computation ---
+async def compute_entitlements(db: AsyncSession, user_id: str) -> dict:
+    """Pick the user's best entitled subscription straight from the database."""
+    subscriptions = (await db.execute(
+        select(Subscription.plan, Subscription.status, Subscription.current_period_end)
+        .where(Subscription.user_id == str(user_id))
+    )).all()
+
+    best = NO_ENTITLEMENTS
+    for plan, status, period_end in subscriptions:
+        if status is None or status.value not in ENTITLED_STATUSES:
+            continue
+        candidate = {
+            "plan": plan.value if plan else None,
+            "status": status.value,
+            "current_period_end": _as_utc(period_end).isoformat() if period_end else None,
+        }
+        if best is NO_ENTITLEMENTS or PLAN_RANK.get(candidate["plan"], 0) > PLAN_RANK.get(best["plan"], 0):
+            best = candidate
+    return best
+
+
+def is_entitled(entitlements: dict, plan: str | SubscriptionPlan | None = None) -> bool:
+    """True if the entitlements are current and cover `plan` (any paid plan when None)."""
+    if entitlements["status"] not in ENTITLED_STATUSES:
+        return False
+    period_end = entitlements["current_period_end"]
+    if period_end and datetime.fromisoformat(period_end) <= datetime.now(timezone.utc):
+        return False
+    if plan is None:
+        return True
+    plan = plan.value if isinstance(plan, SubscriptionPlan) else plan
+    return PLAN_RANK.get(entitlements["plan"], 0) >= PLAN_RANK[plan]
+
+
+# --- Public API ---
+async def get_entitlements(db: AsyncSession, user_id: str) -> dict:
+    """
+    Return the user's entitlements: {"plan", "status", "current_period_end"}.
+    Looks in the local LRU, then Redis, then the database.
+    """
+    user_id = str(user_id)
+    generation = _cache.generation
+    data = await _cache.get(user_id)
+    if data is not None:
+        return data
+
+    data = await compute_entitlements(db, user_id)
+    await _cache.fill(user_id, data, generation)
+    return data
+
+
+async def refresh_entitlements(db: AsyncSession, user_id: str) -> dict:
+    """Recompute and store a user's entitlements. Call after committing a subscription change."""
+    user_id = str(user_id)
+    _stats["refreshes"] += 1
+    data = await compute_entitlements(db, user_id)
+    await _cache.set(user_id, data, publish=True)
+    return data
+
+
+async def invalidate_entitlements(user_id: str):
+    """Drop a user's entitlements from both tiers."""
+    await _cache.delete(str(user_id))
+
+
+def entitlement_cache_stats() -> dict:
+    return {**_cache.stats(), **_stats}
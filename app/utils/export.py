@@ -0,0 +1,68 @@
+import csv
+import enum
+import io
+import json
+import os
+import uuid
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, Iterable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+
+from app.database import AsyncSessionLocal
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+# --- Row source ---
+async def stream_rows(db: AsyncSession, query: Select) -> AsyncIterator[list[dict]]:
+    """
+    Yield result rows in batches of EXPORT_BATCH_SIZE using a server-side cursor.
+    Opens its own session, configured like `db`, so the stream outlives the
+    request's session dependency.
+    """
+    async with (AsyncSession(db.bind) if db.bind is not None else AsyncSessionLocal()) as session:
+        result = await session.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for partition in result.mappings().partitions():
+            yield [{key: _plain(value) for key, value in row.items()} for row in partition]
+
+
+# --- Encoders ---
+async def ndjson_chunks(batches: AsyncIterator[list[dict]]) -> AsyncIterator[bytes]:
+    async for batch in batches:
+        yield "".join(json.dumps(row) + "\n" for row in batch).encode()
+
+
+async def csv_chunks(columns: Iterable[str], batches: AsyncIterator[list[dict]]) -> AsyncIterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=list(columns))
+    writer.writeheader()
+    async for batch in batches:
+        writer.writerows(batch)
+        yield buf.getvalue().encode()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode()
+
+
+async def gzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Compress a byte stream incrementally into a single gzip member."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,245 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool
+
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "true").lower() == "true"
+
+# Upper bounds in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Work broken out per request in Server-Timing and app_component_duration_seconds
+COMPONENTS = ("db", "redis", "bcrypt", "jwt")
+
+
+class Histogram:
+    """Fixed-bucket histogram, safe to update from several threads."""
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.counts[bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> dict:
+        """Cumulative bucket counts, keyed by upper bound."""
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative, running = {}, 0
+        for bound, n in zip((*map(str, self.buckets), "+Inf"), counts):
+            running += n
+            cumulative[bound] = running
+        return {"count": count, "sum": round(total, 6), "buckets": cumulative}
+
+
+# --- Connection pool instrumentation ---
+class _CheckoutTimerMixin:
+    """Records how long each checkout waited for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkout_wait = Histogram()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.checkout_wait.observe(time.perf_counter() - start)
+
+
+class TimedQueuePool(_CheckoutTimerMixin, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_CheckoutTimerMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def pool_stats(pool: Pool) -> dict:
+    """Live pool occupancy plus the checkout-wait histogram."""
+    stats = {"class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+        )
+    if isinstance(pool, _CheckoutTimerMixin):
+        stats["checkout_wait_seconds"] = pool.checkout_wait.snapshot()
+    return stats
+
+
+# --- Per-request component timings ---
+# component -> [seconds, calls] for the request being served; None outside requests
+_request_timings: ContextVar[dict | None] = ContextVar("request_timings", default=None)
+_component_seconds = {component: Histogram() for component in COMPONENTS}
+
+
+def record_timing(component: str, seconds: float):
+    _component_seconds[component].observe(seconds)
+    timings = _request_timings.get()
+    if timings is not None:
+        entry = timings.setdefault(component, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+
+@contextmanager
+def timed(component: str):
+    """
+    Time a block (or, as a decorator, a sync function) as `component` work.
+    Usage: with timed("redis"): await client.get(key)
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(component, time.perf_counter() - start)
+
+
+def instrument_engine(engine: Engine):
+    """Count the time spent in every statement run on `engine` as "db" work."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _stop(conn, cursor, statement, parameters, context, executemany):
+        record_timing("db", time.perf_counter() - conn.info["query_start"].pop())
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts:
+            record_timing("db", time.perf_counter() - starts.pop())
+
+
+# --- HTTP metrics ---
+_requests: dict[tuple[str, str, int], int] = {}  # (method, route, status) -> count
+_request_seconds: dict[tuple[str, str], Histogram] = {}  # (method, route) -> latency
+_in_progress: dict[str, int] = {}  # method -> requests being served
+
+
+def _server_timing(timings: dict, total: float) -> str:
+    parts = [
+        f'{component};dur={seconds * 1000:.2f};desc="{calls} call{"s" if calls != 1 else ""}"'
+        for component, (seconds, calls) in timings.items()
+    ]
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording per-route request counts, latency and in-flight requests,
+    and adding a Server-Timing header with the request's db/redis/bcrypt/jwt time.
+    Routes are labelled by their path template, so ids never become label values.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        timings: dict = {}
+        response = {"status": 500}
+        token = _request_timings.set(timings)
+        _in_progress[method] = _in_progress.get(method, 0) + 1
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                if SERVER_TIMING_ENABLED:
+                    header = _server_timing(timings, time.perf_counter() - start)
+                    message["headers"] = [*message.get("headers", ()), (b"server-timing", header.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_timings.reset(token)
+            _in_progress[method] -= 1
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            key = (method, route, response["status"])
+            _requests[key] = _requests.get(key, 0) + 1
+            histogram = _request_seconds.get((method, route))
+            if histogram is None:
+                histogram = _request_seconds[(method, route)] = Histogram()
+            histogram.observe(elapsed)
+
+
+# --- Prometheus exposition ---
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _histogram_lines(name: str, histogram: Histogram, **labels) -> list[str]:
+    snapshot = histogram.snapshot()
+    lines = [f"{name}_bucket{_labels(**labels, le=bound)} {count}" for bound, count in snapshot["buckets"].items()]
+    lines.append(f"{name}_sum{_labels(**labels)} {snapshot['sum']}")
+    lines.append(f"{name}_count{_labels(**labels)} {snapshot['count']}")
+    return lines
+
+
+def render_prometheus(pools: dict[str, Pool] | None = None) -> str:
+    """This worker's metrics in the Prometheus text exposition format (0.0.4)."""
+    lines = [
+        "# HELP http_requests_total HTTP requests served, by route template and status code.",
+        "# TYPE http_requests_total counter",
+        *(
+            f"http_requests_total{_labels(method=method, route=route, status=status)} {count}"
+            for (method, route, status), count in sorted(_requests.items())
+        ),
+        "# HELP http_request_duration_seconds HTTP request latency, by route template.",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    for (method, route), histogram in sorted(_request_seconds.items()):
+        lines += _histogram_lines("http_request_duration_seconds", histogram, method=method, route=route)
+
+    lines += [
+        "# HELP http_requests_in_progress HTTP requests currently being served.",
+        "# TYPE http_requests_in_progress gauge",
+        *(f"http_requests_in_progress{_labels(method=method)} {count}" for method, count in sorted(_in_progress.items())),
+        "# HELP app_component_duration_seconds Time spent waiting on each component (db, redis, bcrypt, jwt).",
+        "# TYPE app_component_duration_seconds histogram",
+    ]
+    for component, histogram in _component_seconds.items():
+        lines += _histogram_lines("app_component_duration_seconds", histogram, component=component)
+
+    if pools:
+        lines += [
+            "# HELP db_pool_checked_out Connections currently checked out of each pool.",
+            "# TYPE db_pool_checked_out gauge",
+            *(f"db_pool_checked_out{_labels(pool=name)} {pool.checkedout()}" for name, pool in pools.items() if isinstance(pool, QueuePool)),
+            "# HELP db_pool_checkout_wait_seconds Time spent waiting for a pooled connection.",
+            "# TYPE db_pool_checkout_wait_seconds histogram",
+        ]
+        for name, pool in pools.items():
+            if isinstance(pool, _CheckoutTimerMixin):
+                lines += _histogram_lines("db_pool_checkout_wait_seconds", pool.checkout_wait, pool=name)
+    return "\n".join(lines) + "\n"
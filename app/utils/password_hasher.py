@@ -0,0 +1,83 @@
+import asyncio
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from fastapi import HTTPException, status
+
+from app.utils.metrics import timed
+from app.utils.security import hash_password, verify_password
+
+# bcrypt releases the GIL, so threads are enough; "process" is available for
+# deployments that want hashing fully isolated from the interpreter.
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")  # "thread" or "process"
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))  # 0 = hash inline
+PASSWORD_HASH_QUEUE_SIZE = int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", "32"))
+PASSWORD_HASH_RETRY_AFTER = int(os.getenv("PASSWORD_HASH_RETRY_AFTER", "1"))
+
+_executor: Executor | None = None
+_pending = 0  # jobs running or waiting in the pool
+
+
+def _get_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        if PASSWORD_HASH_EXECUTOR == "process":
+            _executor = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+    return _executor
+
+
+async def _submit(func, *args):
+    """
+    Run a bcrypt call in the worker pool.
+    Rejects with 503 once workers and queue are full, instead of letting latency grow.
+    """
+    global _pending
+    if PASSWORD_HASH_WORKERS <= 0:
+        with timed("bcrypt"):
+            return func(*args)
+
+    if _pending >= PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication service is busy, please retry",
+            headers={"Retry-After": str(PASSWORD_HASH_RETRY_AFTER)},
+        )
+
+    _pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        # Includes time queued for a worker: that is what the request waits for
+        with timed("bcrypt"):
+            return await loop.run_in_executor(_get_executor(), func, *args)
+    finally:
+        _pending -= 1
+
+
+# --- Async Password Hashing ---
+async def hash_password_async(password: str) -> str:
+    """Hash password using bcrypt without blocking the event loop."""
+    return await _submit(hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify bcrypt hashed password without blocking the event loop."""
+    return await _submit(verify_password, plain_password, hashed_password)
+
+
+def hasher_stats() -> dict:
+    """Current load of the password hashing pool."""
+    return {
+        "executor": PASSWORD_HASH_EXECUTOR,
+        "workers": PASSWORD_HASH_WORKERS,
+        "queue_size": PASSWORD_HASH_QUEUE_SIZE,
+        "pending": _pending,
+    }
+
+
+def shutdown_hasher():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
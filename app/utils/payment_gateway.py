@@ -0,0 +1,251 @@
+import asyncio
+import hashlib
+import hmac
+import os
+import random
+import time
+import uuid
+from abc import ABC, abstractmethod
+
+import httpx
+
+STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
+STRIPE_API_BASE = os.getenv("STRIPE_API_BASE", "https://api.stripe.com")  # e.g. a local Stripe stub for tests
+STRIPE_TIMEOUT = float(os.getenv("STRIPE_TIMEOUT", "10"))  # seconds per attempt
+STRIPE_CONNECT_TIMEOUT = float(os.getenv("STRIPE_CONNECT_TIMEOUT", "3"))
+STRIPE_MAX_RETRIES = int(os.getenv("STRIPE_MAX_RETRIES", "2"))
+STRIPE_RETRY_BASE = float(os.getenv("STRIPE_RETRY_BASE", "0.5"))  # seconds, doubled per retry
+STRIPE_MAX_CONNECTIONS = int(os.getenv("STRIPE_MAX_CONNECTIONS", "20"))
+STRIPE_BREAKER_THRESHOLD = int(os.getenv("STRIPE_BREAKER_THRESHOLD", "5"))  # consecutive failures before opening
+STRIPE_BREAKER_COOLDOWN = float(os.getenv("STRIPE_BREAKER_COOLDOWN", "30"))  # seconds before a trial call
+STRIPE_WEBHOOK_TOLERANCE = int(os.getenv("STRIPE_WEBHOOK_TOLERANCE", "300"))
+
+RETRYABLE_STATUS = {409, 429, 500, 502, 503, 504}
+
+
+class GatewayError(Exception):
+    """The provider rejected the request (4xx); retrying will not help."""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class GatewayUnavailable(Exception):
+    """The provider could not be reached, or the circuit breaker is open."""
+
+
+# --- Circuit breaker ---
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures and fails fast for `cooldown`
+    seconds, then lets a single trial call through (half-open).
+    """
+
+    def __init__(self, threshold: int = STRIPE_BREAKER_THRESHOLD, cooldown: float = STRIPE_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def before_call(self) -> bool:
+        """Raise if calls are blocked; return True if this call is the half-open trial."""
+        state = self.state
+        if state == "open" or (state == "half_open" and self._trial_running):
+            raise GatewayUnavailable("Payment provider circuit is open")
+        if state == "half_open":
+            self._trial_running = True
+            return True
+        return False
+
+    def end_trial(self):
+        """Let another trial through if this one was cancelled or failed before recording a result."""
+        self._trial_running = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_running = False
+        if self.opened_at is not None or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+# --- Webhook signatures ---
+def verify_webhook_signature(payload: bytes, sig_header: str | None, secret: str | None,
+                             tolerance: int = STRIPE_WEBHOOK_TOLERANCE) -> bool:
+    """Check a `Stripe-Signature` header (t=...,v1=...) locally; no network call is involved."""
+    if not sig_header or not secret:
+        return False
+    timestamp, signatures = None, []
+    for item in sig_header.split(","):
+        key, _, value = item.strip().partition("=")
+        if key == "t":
+            timestamp = value
+        elif key == "v1":
+            signatures.append(value)
+    if not timestamp or not timestamp.isdigit() or not signatures:
+        return False
+    if tolerance and abs(time.time() - int(timestamp)) > tolerance:
+        return False
+
+    expected = hmac.new(secret.encode(), timestamp.encode() + b"." + payload, hashlib.sha256).hexdigest()
+    return any(hmac.compare_digest(expected, signature) for signature in signatures)
+
+
+def _form_encode(params: dict, prefix: str = "") -> list[tuple[str, str]]:
+    """Flatten nested params the way Stripe expects: line_items[0][price]=..."""
+    pairs = []
+    for key, value in params.items():
+        name = f"{prefix}[{key}]" if prefix else str(key)
+        if isinstance(value, dict):
+            pairs.extend(_form_encode(value, name))
+        elif isinstance(value, (list, tuple)):
+            pairs.extend(_form_encode(dict(enumerate(value)), name))
+        elif isinstance(value, bool):
+            pairs.append((name, "true" if value else "false"))
+        elif value is not None:
+            pairs.append((name, str(value)))
+    return pairs
+
+
+# --- Gateways ---
+class PaymentGateway(ABC):
+    """
+    Remote calls made to the payment provider.
+    Replace the active gateway with set_gateway() to run against a local stub.
+    """
+
+    @abstractmethod
+    async def retrieve_subscription(self, subscription_id: str) -> dict:
+        ...
+
+    @abstractmethod
+    async def retrieve_price(self, price_id: str) -> dict:
+        ...
+
+    @abstractmethod
+    async def create_checkout_session(self, **params) -> dict:
+        ...
+
+    @abstractmethod
+    async def cancel_subscription_at_period_end(self, subscription_id: str) -> dict:
+        ...
+
+    async def close(self):
+        pass
+
+
+class StripeHTTPGateway(PaymentGateway):
+    """
+    Stripe REST API over a pooled keep-alive httpx.AsyncClient.
+    Each attempt has its own timeout; connection errors, 429 and 5xx are retried
+    with jittered backoff, and repeated failures open the circuit breaker.
+    """
+
+    def __init__(self, api_key: str | None = STRIPE_SECRET_KEY, api_base: str = STRIPE_API_BASE,
+                 transport: httpx.AsyncBaseTransport | None = None, breaker: CircuitBreaker | None = None):
+        self.api_key = api_key
+        self.api_base = api_base.rstrip("/")
+        self.breaker = breaker or CircuitBreaker()
+        self._transport = transport
+        self._client: httpx.AsyncClient | None = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created lazily so the pool binds to the running event loop
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.api_base,
+                auth=(self.api_key or "", ""),
+                timeout=httpx.Timeout(STRIPE_TIMEOUT, connect=STRIPE_CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_connections=STRIPE_MAX_CONNECTIONS,
+                                    max_keepalive_connections=STRIPE_MAX_CONNECTIONS),
+                transport=self._transport,
+            )
+        return self._client
+
+    async def _request(self, method: str, path: str, params: dict | None = None) -> dict:
+        trial = self.breaker.before_call()
+        try:
+            return await self._send(method, path, params)
+        finally:
+            if trial:
+                self.breaker.end_trial()
+
+    async def _send(self, method: str, path: str, params: dict | None) -> dict:
+        headers = {}
+        if method == "POST":
+            # Same key on every attempt, so a retried POST is applied once by Stripe
+            headers["Idempotency-Key"] = str(uuid.uuid4())
+
+        for attempt in range(STRIPE_MAX_RETRIES + 1):
+            try:
+                if method == "GET":
+                    response = await self.client.get(path, params=_form_encode(params or {}), headers=headers)
+                else:
+                    response = await self.client.post(path, data=dict(_form_encode(params or {})), headers=headers)
+            except httpx.TransportError as e:
+                failure = f"{type(e).__name__}: {e}"
+            else:
+                if response.status_code < 400:
+                    self.breaker.record_success()
+                    return response.json()
+                if response.status_code not in RETRYABLE_STATUS:
+                    # The provider answered; the circuit stays healthy
+                    self.breaker.record_success()
+                    try:
+                        message = response.json()["error"]["message"]
+                    except Exception:
+                        message = response.text
+                    raise GatewayError(response.status_code, message)
+                failure = f"HTTP {response.status_code}"
+
+            if attempt < STRIPE_MAX_RETRIES:
+                await asyncio.sleep(random.uniform(0, STRIPE_RETRY_BASE * 2 ** attempt))
+
+        self.breaker.record_failure()
+        raise GatewayUnavailable(f"Payment provider unavailable ({failure})")
+
+    async def retrieve_subscription(self, subscription_id: str) -> dict:
+        return await self._request("GET", f"/v1/subscriptions/{subscription_id}")
+
+    async def retrieve_price(self, price_id: str) -> dict:
+        return await self._request("GET", f"/v1/prices/{price_id}")
+
+    async def create_checkout_session(self, **params) -> dict:
+        return await self._request("POST", "/v1/checkout/sessions", params)
+
+    async def cancel_subscription_at_period_end(self, subscription_id: str) -> dict:
+        return await self._request("POST", f"/v1/subscriptions/{subscription_id}", {"cancel_at_period_end": True})
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+_gateway: PaymentGateway = StripeHTTPGateway()
+
+
+def get_gateway() -> PaymentGateway:
+    return _gateway
+
+
+def set_gateway(gateway: PaymentGateway):
+    global _gateway
+    _gateway = gateway
+
+
+async def close_gateway():
+    await _gateway.close()
@@ -0,0 +1,102 @@
+import os
+from datetime import datetime
+
+from sqlalchemy import DateTime, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import make_transient_to_detached
+
+from app.models.user import User, UserRole
+from app.utils.tiered_cache import TwoTierCache
+
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))  # 0 disables the local tier
+PRINCIPAL_CACHE_LOCAL_TTL = float(os.getenv("PRINCIPAL_CACHE_LOCAL_TTL", "30"))
+PRINCIPAL_CACHE_REDIS_TTL = int(os.getenv("PRINCIPAL_CACHE_REDIS_TTL", "300"))  # 0 disables the Redis tier
+PRINCIPAL_CACHE_PREFIX = "principal:"
+
+# The password hash and 2FA secrets never leave the database
+SECRET_COLUMNS = ("hashed_password", "active_2fa_secret", "pending_2fa_secret", "backup_2fa_code")
+_COLUMNS = [c for c in User.__table__.columns if c.key not in SECRET_COLUMNS]
+
+_cache = TwoTierCache(PRINCIPAL_CACHE_PREFIX, PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_LOCAL_TTL, PRINCIPAL_CACHE_REDIS_TTL)
+
+
+# --- Snapshot (de)serialization ---
+def _to_snapshot(user: User) -> dict:
+    data = {}
+    for column in _COLUMNS:
+        value = getattr(user, column.key)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif isinstance(value, UserRole):
+            value = value.value
+        data[column.key] = value
+    return data
+
+
+def _from_snapshot(data: dict) -> User:
+    values = {}
+    for column in _COLUMNS:
+        value = data.get(column.key)
+        if value is not None and isinstance(column.type, DateTime):
+            value = datetime.fromisoformat(value)
+        values[column.key] = value
+    values["role"] = UserRole(values["role"])
+    user = User(**values)
+    # Mark as an unmodified, persistent row so the session tracks later changes
+    make_transient_to_detached(user)
+    return user
+
+
+# --- Tier lookups ---
+async def _store(email: str, user: User, generation: int) -> dict:
+    data = _to_snapshot(user)
+    await _cache.fill(email, data, generation)
+    return data
+
+
+# --- Public API ---
+async def get_cached_user(db: AsyncSession, email: str) -> User | None:
+    """
+    Return the user with this email, attached to `db`.
+    Looks in the local LRU, then Redis, then the database.
+    """
+    generation = _cache.generation
+    data = await _cache.get(email)
+    if data is not None:
+        return await db.merge(_from_snapshot(data), load=False)
+
+    user = (await db.execute(select(User).where(User.email == email))).scalars().first()
+    if user:
+        await _store(email, user, generation)
+    return user
+
+
+async def get_cached_snapshot(db: AsyncSession, email: str) -> dict | None:
+    """
+    Return the cached column values of a user without building an ORM object.
+    Only touches the database on a miss in both tiers.
+    """
+    generation = _cache.generation
+    data = await _cache.get(email)
+    if data is not None:
+        return data
+
+    user = (await db.execute(select(User).where(User.email == email))).scalars().first()
+    return await _store(email, user, generation) if user else None
+
+
+async def load_secrets(db: AsyncSession, user: User):
+    """Load the columns the cache leaves out, for the endpoints that need them."""
+    unloaded = [name for name in SECRET_COLUMNS if name in inspect(user).unloaded]
+    if unloaded:
+        await db.refresh(user, attribute_names=unloaded)
+
+
+async def invalidate_user(email: str):
+    """Drop a user from both tiers in every worker. Call after committing a change to the row."""
+    await _cache.delete(email)
+
+
+def principal_cache_stats() -> dict:
+    return _cache.stats()
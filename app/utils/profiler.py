@@ -0,0 +1,237 @@
+import functools
+import itertools
+import os
+import random
+import sys
+import sysconfig
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+from fastapi import Request
+
+from app.database import get_async_session
+from app.utils.auth_context import get_token_claims
+from app.utils.principal_cache import get_cached_snapshot
+
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "true").lower() == "true"
+PROFILER_SAMPLE_RATE = float(os.getenv("PROFILER_SAMPLE_RATE", "0"))  # fraction of all requests to profile
+PROFILER_INTERVAL = float(os.getenv("PROFILER_INTERVAL_MS", "1")) / 1000
+PROFILER_BUFFER_SIZE = int(os.getenv("PROFILER_BUFFER_SIZE", "50"))  # profiles kept per worker
+PROFILE_HEADER = b"x-profile"  # sent by an admin to profile one request
+PROFILE_ID_HEADER = b"x-profile-id"
+
+# Stripped from file names: the project root, site-packages and the stdlib
+_PATH_PREFIXES = sorted(
+    {str(Path(__file__).resolve().parent.parent.parent)}
+    | {sysconfig.get_paths()[key] for key in ("purelib", "platlib", "stdlib")},
+    key=len, reverse=True,
+)
+
+# Finished profiles, newest last
+_profiles: "deque[dict]" = deque(maxlen=PROFILER_BUFFER_SIZE)
+_ids = itertools.count(1)
+_stats = {"profiled": 0, "samples": 0}
+
+
+# --- Sampler ---
+@functools.lru_cache(maxsize=4096)
+def _frame_key(code) -> tuple[str, str, int]:
+    filename = code.co_filename
+    for prefix in _PATH_PREFIXES:
+        if filename.startswith(prefix + os.sep):
+            filename = filename[len(prefix) + 1:]
+            break
+    return code.co_qualname, filename, code.co_firstlineno
+
+
+class _Session:
+    """One profiled request: the stacks seen below its middleware frame."""
+
+    def __init__(self, anchor, thread_id: int):
+        self.anchor = anchor
+        self.thread_id = thread_id
+        self.stacks: dict[tuple, list] = {}  # root-first (name, file, line) frames -> [samples, milliseconds]
+
+    def record(self, chain: list, elapsed_ms: float):
+        stack = tuple(_frame_key(frame.f_code) for frame in reversed(chain))
+        entry = self.stacks.setdefault(stack, [0, 0.0])
+        entry[0] += 1
+        entry[1] += elapsed_ms
+
+
+class _Sampler:
+    """
+    Background thread that samples the event loop thread while any request is profiled.
+    A sample counts for a request only if the request's own middleware frame is on the
+    stack, so concurrent requests on the same loop do not leak into each other's profile.
+    Time spent awaiting I/O or in the threadpool is not sampled: this is a CPU profile.
+    """
+
+    def __init__(self):
+        self._sessions: set[_Session] = set()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def start(self, session: _Session):
+        with self._lock:
+            self._sessions.add(session)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+
+    def stop(self, session: _Session):
+        with self._lock:
+            self._sessions.discard(session)
+
+    def _run(self):
+        last = time.perf_counter()
+        while True:
+            time.sleep(PROFILER_INTERVAL)
+            now = time.perf_counter()
+            elapsed_ms, last = (now - last) * 1000, now
+            # Held while sampling so a stopped session is never written to again
+            with self._lock:
+                if not self._sessions:
+                    self._thread = None
+                    return
+                frames = sys._current_frames()
+                for session in self._sessions:
+                    chain, frame = [], frames.get(session.thread_id)
+                    while frame is not None and frame is not session.anchor:
+                        chain.append(frame)
+                        frame = frame.f_back
+                    if frame is not None and chain:
+                        session.record(chain, elapsed_ms)
+                        _stats["samples"] += 1
+                del frames
+
+
+_sampler = _Sampler()
+
+
+# --- Middleware ---
+async def _is_admin(scope, claims: dict) -> bool:
+    """Check the token against the principal cache, as get_current_principal does, so revoked admins are refused."""
+    if claims.get("role") != "admin" or not {"sub", "ver"} <= claims.keys():
+        return False
+    # Same session source as the routes, including test overrides
+    overrides = getattr(scope.get("app"), "dependency_overrides", {})
+    sessions = overrides.get(get_async_session, get_async_session)()
+    try:
+        snapshot = await get_cached_snapshot(await anext(sessions), claims["sub"])
+    finally:
+        await sessions.aclose()
+    return snapshot is not None and snapshot["token_version"] == claims["ver"] and snapshot["role"] == "admin"
+
+
+async def _should_profile(scope) -> bool:
+    if PROFILER_SAMPLE_RATE and random.random() < PROFILER_SAMPLE_RATE:
+        return True
+    if not any(name == PROFILE_HEADER for name, _ in scope["headers"]):
+        return False
+    claims = get_token_claims(Request(scope))
+    return bool(claims) and await _is_admin(scope, claims)
+
+
+class ProfilerMiddleware:
+    """
+    Pure ASGI middleware that samples the call stacks of selected requests.
+    A request is profiled when an admin sends `X-Profile: 1` or it is picked by
+    PROFILER_SAMPLE_RATE. The response carries `X-Profile-Id`; fetch the profile
+    from /admin/profiles/{id}.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not PROFILER_ENABLED or scope["type"] != "http" or not await _should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = next(_ids)
+        response = {"status": None}
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                message["headers"] = [*message.get("headers", ()), (PROFILE_ID_HEADER, str(profile_id).encode())]
+            await send(message)
+
+        session = _Session(sys._getframe(), threading.get_ident())
+        started_at = time.time()
+        start = time.perf_counter()
+        _sampler.start(session)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _sampler.stop(session)
+            _stats["profiled"] += 1
+            _profiles.append({
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": response["status"],
+                "started_at": started_at,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+                "interval_ms": PROFILER_INTERVAL * 1000,
+                "stacks": session.stacks,
+            })
+
+
+# --- Export ---
+def list_profiles() -> list[dict]:
+    return [
+        {key: value for key, value in profile.items() if key != "stacks"}
+        | {"samples": sum(samples for samples, _ in profile["stacks"].values())}
+        for profile in reversed(_profiles)
+    ]
+
+
+def get_profile(profile_id: int) -> dict | None:
+    return next((profile for profile in _profiles if profile["id"] == profile_id), None)
+
+
+def to_collapsed(profile: dict) -> str:
+    """Brendan Gregg's collapsed-stack format (flamegraph.pl, speedscope, inferno): `a;b;c samples`."""
+    return "".join(
+        ";".join(f"{name} ({file}:{line})".replace(";", ":") for name, file, line in stack) + f" {samples}\n"
+        for stack, (samples, _) in profile["stacks"].items()
+    )
+
+
+def to_speedscope(profile: dict) -> dict:
+    """A speedscope 'sampled' profile weighted by sampled wall time on the event loop."""
+    frames: list[dict] = []
+    index: dict[tuple, int] = {}
+    samples, weights = [], []
+    for stack, (_, milliseconds) in profile["stacks"].items():
+        for frame in stack:
+            if frame not in index:
+                index[frame] = len(frames)
+                frames.append(dict(zip(("name", "file", "line"), frame)))
+        samples.append([index[frame] for frame in stack])
+        weights.append(round(milliseconds, 3))
+
+    name = f"{profile['method']} {profile['path']} #{profile['id']}"
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "app.utils.profiler",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": round(sum(weights), 3),
+            "samples": samples,
+            "weights": weights,
+        }],
+    }
+
+
+def profiler_stats() -> dict:
+    return {**_stats, "buffered": len(_profiles), "sample_rate": PROFILER_SAMPLE_RATE}
@@ -0,0 +1,101 @@
+import asyncio
+import base64
+import io
+import os
+from collections import OrderedDict
+from urllib.parse import quote
+
+import qrcode
+
+QR_CACHE_SIZE = int(os.getenv("QR_CACHE_SIZE", "1024"))  # rendered codes kept in memory; 0 disables
+QR_FORMATS = ("png", "svg")
+# Left as is in SVG data URIs; markup uses single quotes so attributes need no escaping
+SVG_URI_SAFE = " '/=:.-"
+
+# (data, fmt) -> data URI. Holds provisioning URIs, so it stays in-process only.
+_cache: "OrderedDict[tuple[str, str], str]" = OrderedDict()
+_stats = {"hits": 0, "renders": 0}
+
+
+# --- Rendering (CPU bound, run off the event loop) ---
+def _qr(data: str, border: int) -> qrcode.QRCode:
+    qr = qrcode.QRCode(version=1, box_size=10, border=border)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr
+
+
+def render_png(data: str) -> bytes:
+    img = _qr(data, border=5).make_image(fill_color="black", back_color="white")
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def render_svg(data: str) -> bytes:
+    """
+    Vector QR code: a single stroked path, one relative segment per run of dark modules.
+    Skips rasterizing and PNG encoding entirely.
+    """
+    matrix = _qr(data, border=4).get_matrix()
+    size = len(matrix)
+    path = []
+    for y, row in enumerate(matrix):
+        x, pen = 0, None
+        while x < size:
+            if not row[x]:
+                x += 1
+                continue
+            start = x
+            while x < size and row[x]:
+                x += 1
+            # Absolute move for the first run of a row, relative afterwards
+            path.append(f"M{start} {y}.5h{x - start}" if pen is None else f"m{start - pen} 0h{x - start}")
+            pen = x
+    return (
+        f"<svg xmlns='http://www.w3.org/2000/svg' viewBox='0 0 {size} {size}'>"
+        f"<rect width='{size}' height='{size}' fill='#fff'/>"
+        f"<path stroke='#000' d='{''.join(path)}'/></svg>"
+    ).encode()
+
+
+def qr_data_uri(data: str, fmt: str = "png") -> str:
+    """
+    Render `data` as a data URI in `fmt` ("png" or "svg").
+    SVG markup is percent-encoded rather than base64, which would add a third to its size.
+    """
+    if fmt == "svg":
+        return "data:image/svg+xml;utf8," + quote(render_svg(data), safe=SVG_URI_SAFE)
+    return "data:image/png;base64," + base64.b64encode(render_png(data)).decode()
+
+
+# --- Cached, non-blocking entry point ---
+async def qr_data_uri_async(data: str, fmt: str = "png") -> str:
+    """
+    Return the QR data URI for `data`, rendering in a worker thread on a miss.
+    Repeated setup calls for the same pending secret are answered from the LRU.
+    """
+    key = (data, fmt)
+    uri = _cache.get(key)
+    if uri is not None:
+        _stats["hits"] += 1
+        _cache.move_to_end(key)
+        return uri
+
+    _stats["renders"] += 1
+    uri = await asyncio.to_thread(qr_data_uri, data, fmt)
+    if QR_CACHE_SIZE > 0:
+        _cache[key] = uri
+        while len(_cache) > QR_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return uri
+
+
+def forget_qr(data: str):
+    """Drop cached renders of `data`, e.g. once its secret is activated or discarded."""
+    for fmt in QR_FORMATS:
+        _cache.pop((data, fmt), None)
+
+
+def qr_cache_stats() -> dict:
+    return {**_stats, "size": len(_cache)}
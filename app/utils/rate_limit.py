@@ -1,15 +1,32 @@
+import math
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+
 import redis.asyncio as redis
-from fastapi import Request, HTTPException
-from fastapi_limiter import FastAPILimiter
+from fastapi import Depends, Request, Response, HTTPException
+from fastapi_limiter import FastAPILimiter, http_default_callback
 from fastapi_limiter.depends import RateLimiter
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.utils.security import verify_token
+from app.database import get_async_session
+from app.models.subscription import SubscriptionPlan
+from app.utils.auth_context import get_bearer_token, get_token_claims
+from app.utils.entitlements import get_entitlements, is_entitled
 from app.utils.redis_client import get_redis
+from app.utils.tiered_cache import RedisBackoff
 
 import os
 
 redis_client: redis.Redis | None = None
 
+# "hybrid": per-worker token buckets leased from Redis; "redis": one fastapi-limiter round trip per request
+RATE_LIMIT_ENGINE = os.getenv("RATE_LIMIT_ENGINE", "hybrid")
+RATE_LIMIT_LEASE_FRACTION = float(os.getenv("RATE_LIMIT_LEASE_FRACTION", "0.1"))  # share of a limit leased at once
+RATE_LIMIT_LEASE_TTL = float(os.getenv("RATE_LIMIT_LEASE_TTL", "1"))  # seconds before unused tokens go back to Redis
+RATE_LIMIT_LOCAL_KEYS = int(os.getenv("RATE_LIMIT_LOCAL_KEYS", "100000"))  # leases kept per worker
+RATE_LIMIT_PREFIX = "ratelimit:bucket:"
+
 async def init_limiter():
     """
     Initialize Redis-backed async rate limiter.
@@ -21,21 +38,392 @@ async def init_limiter():
 
 # --- Extract user identifier from request ---
 async def user_identifier(request: Request) -> str:
-    auth: str = request.headers.get("Authorization")
-    if not auth or not auth.lower().startswith("bearer "):
+    if not get_bearer_token(request):
         raise HTTPException(status_code=401, detail="Missing or invalid Authorization header")
 
-    token = auth.split(" ")[1]
-    payload = verify_token(token)
-    if not payload or "sub" not in payload:
+    payload = get_token_claims(request)
+    if not payload:
         raise HTTPException(status_code=401, detail="Invalid token")
 
     return f"user:{payload['sub']}"
 
 
+def _route_scope(request: Request) -> str:
+    """Matched route template, so /users/1 and /users/2 share a bucket."""
+    route = request.scope.get("route")
+    return f"{request.method}:{getattr(route, 'path', request.scope['path'])}"
+
+
+# --- Hybrid token buckets ---
+# The shared bucket lives in Redis. Each worker leases a batch of tokens and
+# spends them locally, handing leftovers back with its next lease. Tokens are
+# deducted in Redis before they are spent, so workers never admit more than the
+# limit between them; at most workers x lease size tokens sit idle in leases.
+TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local want = tonumber(ARGV[3])
+local give_back = tonumber(ARGV[4])
+
+local clock = redis.call('TIME')
+local now = clock[1] * 1000 + math.floor(clock[2] / 1000)
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate + give_back)
+
+local granted = math.min(want, math.floor(tokens))
+tokens = tokens - granted
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate))
+
+local wait = 0
+if granted == 0 then
+    wait = math.ceil((1 - tokens) / rate)
+end
+return {granted, wait}
+"""
+
+# key -> [tokens left, lease expiry (monotonic)]
+_leases: "OrderedDict[str, list]" = OrderedDict()
+# key -> retry time (monotonic); rejected callers are answered locally until then
+_denied: dict[str, float] = {}
+# key -> [tokens, last refill (monotonic)]; only used while Redis is unreachable
+_fallback: "OrderedDict[str, list]" = OrderedDict()
+_bucket_script = None
+_stats = {"local_hits": 0, "leases": 0, "rejected": 0, "fallback": 0, "redis_errors": 0}
+_redis = RedisBackoff(_stats)
+
+
+def _lease_size(times: int) -> int:
+    return max(1, min(times, math.ceil(times * RATE_LIMIT_LEASE_FRACTION)))
+
+
+async def _lease(key: str, times: int, milliseconds: int, want: int, give_back: int) -> tuple[int, int]:
+    global _bucket_script
+    client = await get_redis()
+    if _bucket_script is None or _bucket_script.registered_client is not client:
+        _bucket_script = client.register_script(TOKEN_BUCKET_LUA)
+    granted, wait = await _bucket_script(
+        keys=[RATE_LIMIT_PREFIX + key],
+        args=[times, times / milliseconds, want, give_back],
+    )
+    return int(granted), int(wait)
+
+
+def _take_fallback(key: str, times: int, milliseconds: int) -> int:
+    """Per-worker token bucket used while Redis is down."""
+    now = time.monotonic()
+    tokens, ts = _fallback.get(key, (times, now))
+    tokens = min(times, tokens + (now - ts) * 1000 * times / milliseconds)
+    _fallback[key] = [tokens, now]
+    _fallback.move_to_end(key)
+    while len(_fallback) > RATE_LIMIT_LOCAL_KEYS:
+        _fallback.popitem(last=False)
+    if tokens < 1:
+        return math.ceil((1 - tokens) * milliseconds / times)
+    _fallback[key][0] = tokens - 1
+    return 0
+
+
+async def take_token(key: str, times: int, milliseconds: int) -> int:
+    """
+    Spend one token from the `times` per `milliseconds` bucket for `key`.
+    Returns 0 when allowed, otherwise milliseconds until a token is available.
+    """
+    now = time.monotonic()
+    lease = _leases.get(key)
+    if lease is not None and lease[0] > 0 and lease[1] > now:
+        lease[0] -= 1
+        _stats["local_hits"] += 1
+        return 0
+
+    retry_at = _denied.get(key)
+    if retry_at is not None:
+        if retry_at > now:
+            _stats["rejected"] += 1
+            return math.ceil((retry_at - now) * 1000)
+        del _denied[key]
+
+    # Lease exhausted or expired: return what is left and lease a new batch in one round trip
+    give_back = lease[0] if lease is not None else 0
+    if _redis.available():
+        try:
+            granted, wait = await _lease(key, times, milliseconds, _lease_size(times), give_back)
+        except Exception:
+            _redis.failed()
+        else:
+            _stats["leases"] += 1
+            if granted == 0:
+                _leases.pop(key, None)
+                if len(_denied) >= RATE_LIMIT_LOCAL_KEYS:
+                    _denied.clear()
+                _denied[key] = now + wait / 1000
+                _stats["rejected"] += 1
+                return max(wait, 1)
+            _leases[key] = [granted - 1, now + RATE_LIMIT_LEASE_TTL]
+            _leases.move_to_end(key)
+            while len(_leases) > RATE_LIMIT_LOCAL_KEYS:
+                _leases.popitem(last=False)
+            return 0
+
+    _stats["fallback"] += 1
+    wait = _take_fallback(key, times, milliseconds)
+    if wait:
+        _stats["rejected"] += 1
+    return wait
+
+
+class HybridRateLimiter:
+    """Per-user limiter spending locally leased tokens; most requests never touch Redis."""
+
+    def __init__(self, times: int, seconds: int, identifier=user_identifier):
+        self.times = times
+        self.milliseconds = seconds * 1000
+        self.identifier = identifier
+
+    async def __call__(self, request: Request, response: Response):
+        key = f"{await self.identifier(request)}:{_route_scope(request)}"
+        wait = await take_token(key, self.times, self.milliseconds)
+        if wait:
+            return await http_default_callback(request, response, wait)
+
+
+def rate_limit_stats() -> dict:
+    return {**_stats, "engine": RATE_LIMIT_ENGINE, "leased_keys": len(_leases)}
+
+
 def per_user_limiter(times: int = 5, seconds: int = 60):
     """
     Returns a list of dependencies for a route to apply rate limiting.
     """
+    if RATE_LIMIT_ENGINE == "hybrid":
+        return HybridRateLimiter(times=times, seconds=seconds, identifier=user_identifier)
     return RateLimiter(times=times, seconds=seconds, identifier=user_identifier)
 
+
+
+# --- Per-plan rate limiting ---
+def _plan_identifier(plan: str):
+    """user_identifier plus the plan, so an upgrade starts a fresh bucket at the new quota."""
+    async def identifier(request: Request) -> str:
+        return f"{await user_identifier(request)}:{plan}"
+    return identifier
+
+
+class PlanRateLimiter:
+    """
+    Rate limiter whose quota depends on the caller's subscription plan.
+    Each plan gets its own fastapi-limiter RateLimiter, which does the Redis work.
+    The plan comes from the entitlement cache, so a warm lookup adds no Redis
+    or database call; the session is only used on a cold miss.
+    """
+
+    def __init__(self, policies: dict, default: tuple[int, int]):
+        # plan -> RateLimiter; "free" covers callers without an entitled plan
+        self.limiters = {
+            plan: RateLimiter(times=times, seconds=seconds, identifier=_plan_identifier(plan))
+            for plan, (times, seconds) in {
+                **{SubscriptionPlan(plan).value: policy for plan, policy in policies.items()},
+                "free": default,
+            }.items()
+        }
+
+    async def resolve_limit(self, request: Request, db: AsyncSession) -> tuple[str, int, int]:
+        """Return (plan, times, milliseconds) for the caller; "free" without an entitled plan."""
+        plan = "free"
+        claims = get_token_claims(request)
+        if claims and "uid" in claims:
+            entitlements = await get_entitlements(db, claims["uid"])
+            if is_entitled(entitlements) and entitlements["plan"] in self.limiters:
+                plan = entitlements["plan"]
+        limiter = self.limiters[plan]
+        return plan, limiter.times, limiter.milliseconds
+
+    async def __call__(self, request: Request, response: Response, db: AsyncSession = Depends(get_async_session)):
+        plan, times, milliseconds = await self.resolve_limit(request, db)
+        limiter = self.limiters[plan]
+
+        if RATE_LIMIT_ENGINE == "hybrid":
+            key = f"{await limiter.identifier(request)}:{_route_scope(request)}"
+            wait = await take_token(key, times, milliseconds)
+            if wait:
+                return await http_default_callback(request, response, wait)
+            return
+        return await limiter(request, response)
+
+
+def per_plan_limiter(policies: dict, times: int = 5, seconds: int = 60):
+    """
+    Rate limit per user with a quota chosen by subscription plan.
+    Callers without an active plan listed in `policies` get `times` per `seconds`.
+    Usage: Depends(per_plan_limiter({"basic": (10, 60), "pro": (60, 60), "premium": (300, 60)}, times=3, seconds=60))
+    """
+    return PlanRateLimiter(policies, default=(times, seconds))
+
+
+# --- Multi-window GCRA ---
+# Generic cell rate algorithm: each window keeps a theoretical arrival time (TAT).
+# A request is admitted only if every window admits it, and all windows are
+# checked and updated in a single script call.
+GCRA_LUA = """
+local count = #ARGV / 2
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+
+local tats, retry, max_period = {}, 0, 0
+for i = 1, count do
+    local limit, period = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    local interval = period / limit
+    local tat = math.max(tonumber(redis.call('HGET', KEYS[1], limit .. ':' .. period)) or now, now)
+    local allow_at = tat + interval - period
+    if allow_at > now then
+        retry = math.max(retry, allow_at - now)
+    end
+    tats[i] = tat
+    max_period = math.max(max_period, period)
+end
+
+local result = {math.ceil(retry)}
+for i = 1, count do
+    local limit, period = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    local interval = period / limit
+    if retry == 0 then
+        tats[i] = tats[i] + interval
+        redis.call('HSET', KEYS[1], limit .. ':' .. period, tostring(tats[i]))
+    end
+    result[#result + 1] = math.max(0, math.floor((now + period - tats[i]) / interval + 1e-6))
+    result[#result + 1] = math.ceil(tats[i] - now)
+end
+if retry == 0 then
+    redis.call('PEXPIRE', KEYS[1], max_period)
+end
+return result
+"""
+
+# Headers for the current response, added by RateLimitHeadersMiddleware; None outside it
+_response_headers: ContextVar[dict | None] = ContextVar("rate_limit_headers", default=None)
+# key -> {window: TAT (ms)}; only used while Redis is unreachable
+_gcra_fallback: "OrderedDict[str, dict]" = OrderedDict()
+_gcra_script = None
+
+
+def _gcra_local(key: str, windows: list[tuple[int, int]]) -> list[int]:
+    """Same algorithm and result layout as GCRA_LUA, kept in this worker."""
+    now = int(time.monotonic() * 1000)
+    state = _gcra_fallback.setdefault(key, {})
+    _gcra_fallback.move_to_end(key)
+    while len(_gcra_fallback) > RATE_LIMIT_LOCAL_KEYS:
+        _gcra_fallback.popitem(last=False)
+
+    tats = [max(state.get(window, now), now) for window in windows]
+    retry = max([tat + period / limit - period - now for tat, (limit, period) in zip(tats, windows)] + [0])
+    result = [math.ceil(retry)]
+    for i, (limit, period) in enumerate(windows):
+        interval = period / limit
+        if retry == 0:
+            tats[i] += interval
+            state[(limit, period)] = tats[i]
+        result += [max(0, math.floor((now + period - tats[i]) / interval + 1e-6)), math.ceil(tats[i] - now)]
+    return result
+
+
+async def check_windows(key: str, windows: list[tuple[int, int]]) -> list[int]:
+    """
+    Check and count one request against every (limit, milliseconds) window for `key`.
+    Returns [retry_ms, remaining_1, reset_ms_1, remaining_2, reset_ms_2, ...]; retry_ms is 0 when admitted.
+    """
+    global _gcra_script
+    if _redis.available():
+        try:
+            client = await get_redis()
+            if _gcra_script is None or _gcra_script.registered_client is not client:
+                _gcra_script = client.register_script(GCRA_LUA)
+            args = [value for window in windows for value in window]
+            return [int(value) for value in await _gcra_script(keys=[RATE_LIMIT_PREFIX + "gcra:" + key], args=args)]
+        except Exception:
+            _redis.failed()
+    _stats["fallback"] += 1
+    return _gcra_local(key, windows)
+
+
+class MultiWindowRateLimiter:
+    """
+    Enforce several windows at once (e.g. a burst and a sustained limit) in one
+    Redis call, and describe the tightest window in RateLimit-* headers.
+    """
+
+    def __init__(self, windows: list[tuple[int, int]], identifier=user_identifier):
+        # (limit, milliseconds), checked together
+        self.windows = [(times, seconds * 1000) for times, seconds in windows]
+        self.policy = ", ".join(f"{times};w={seconds}" for times, seconds in windows)
+        self.identifier = identifier
+
+    def headers(self, result: list[int]) -> dict[str, str]:
+        retry, pairs = result[0], list(zip(result[1::2], result[2::2]))
+        # Report the window that runs out first
+        i = min(range(len(pairs)), key=lambda j: (pairs[j][0], -pairs[j][1]))
+        remaining, reset = pairs[i]
+        headers = {
+            "RateLimit-Limit": str(self.windows[i][0]),
+            "RateLimit-Remaining": str(remaining),
+            "RateLimit-Reset": str(math.ceil(reset / 1000)),
+            "RateLimit-Policy": self.policy,
+        }
+        if retry:
+            headers["Retry-After"] = str(math.ceil(retry / 1000))
+        return headers
+
+    async def __call__(self, request: Request, response: Response):
+        key = f"{await self.identifier(request)}:{_route_scope(request)}"
+        result = await check_windows(key, self.windows)
+        headers = self.headers(result)
+        if result[0]:
+            _stats["rejected"] += 1
+            raise HTTPException(status_code=429, detail="Too Many Requests", headers=headers)
+        pending = _response_headers.get()
+        if pending is None:
+            response.headers.update(headers)
+        else:
+            # Endpoints returning a Response directly drop the injected response's headers
+            pending.update(headers)
+
+
+class RateLimitHeadersMiddleware:
+    """
+    Pure ASGI middleware adding the RateLimit-* headers set by MultiWindowRateLimiter,
+    so they also reach routes that return a Response themselves.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers: dict = {}
+        token = _response_headers.set(headers)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start" and headers:
+                message["headers"] = [
+                    *message.get("headers", ()),
+                    *((name.lower().encode(), value.encode()) for name, value in headers.items()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _response_headers.reset(token)
+
+
+def multi_window_limiter(*windows: tuple[int, int]):
+    """
+    Rate limit per user against several (times, seconds) windows in one Redis round trip.
+    Usage: Depends(multi_window_limiter((10, 1), (1000, 3600)))  # 10/s burst, 1000/h sustained
+    """
+    return MultiWindowRateLimiter(list(windows))
@@ -1,61 +1,131 @@
-from fastapi import Depends, HTTPException, status
+import os
+from dataclasses import dataclass, field
+
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
 from app.database import get_async_session
 from app.models.user import User
-from app.utils.security import verify_token
+from app.models.subscription import SubscriptionPlan
+from app.utils.auth_context import get_token_claims
+from app.utils.entitlements import get_entitlements, is_entitled
+from app.utils.principal_cache import get_cached_snapshot, get_cached_user, load_secrets
 
 # HTTP Bearer scheme
 oauth2_scheme = HTTPBearer()
 
+# Authorize role-guarded routes from token claims instead of the users table
+AUTH_CLAIMS_ONLY = os.getenv("AUTH_CLAIMS_ONLY", "false").lower() == "true"
+
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+@dataclass
+class Principal:
+    """Authenticated caller resolved from token claims."""
+    id: str
+    email: str
+    role: str
+    token_version: int
+    db: AsyncSession = field(repr=False)
+    _user: User | None = field(default=None, repr=False)
+
+    async def load_user(self) -> User:
+        """Load the ORM user on demand, attached to the request session."""
+        if self._user is None:
+            self._user = await get_cached_user(self.db, self.email)
+            if not self._user:
+                raise _unauthorized("User not found")
+        return self._user
+
 
 # --- Current User Dependency ---
 async def get_current_user(
+    request: Request,
     credentials: HTTPAuthorizationCredentials = Depends(oauth2_scheme),
     db: AsyncSession = Depends(get_async_session)
 ) -> User:
     """
     Extract user from JWT token.
+    The token is verified once per request and shared through request.state.
     """
-    token = credentials.credentials
-    payload = verify_token(token)
+    payload = get_token_claims(request)
 
     if not payload or "sub" not in payload:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid or expired token",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-
-    # user = await db.query(User).filter(User.email == payload["sub"]).first()
-    user = (await db.execute(
-        select(User).where(User.email == payload["sub"])
-    )).scalars().first()
-    
+        raise _unauthorized("Invalid or expired token")
+
+    user = await get_cached_user(db, payload["sub"])
+
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
 
+    if "ver" in payload and payload["ver"] != user.token_version:
+        raise _unauthorized("Token has been revoked")
+
     return user
 
 
+async def get_current_user_with_secrets(
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_session)
+) -> User:
+    """
+    get_current_user plus the 2FA secrets, which the principal cache never holds.
+    Usage: current_user: User = Depends(get_current_user_with_secrets)
+    """
+    await load_secrets(db, current_user)
+    return current_user
+
+
+# --- Claims-only Principal Dependency ---
+async def get_current_principal(
+    request: Request,
+    credentials: HTTPAuthorizationCredentials = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_session)
+) -> Principal:
+    """
+    Resolve the caller from token claims alone.
+    The only lookup is the token version, normally answered by the principal cache;
+    invalidate_user() reaches every worker's local tier, so revocation is immediate.
+    """
+    payload = get_token_claims(request)
+    if not payload or not {"sub", "uid", "role", "ver"} <= payload.keys():
+        raise _unauthorized("Invalid or expired token")
+
+    snapshot = await get_cached_snapshot(db, payload["sub"])
+    if snapshot is None or snapshot["token_version"] != payload["ver"]:
+        raise _unauthorized("Token has been revoked")
+
+    return Principal(
+        id=payload["uid"],
+        email=payload["sub"],
+        role=payload["role"],
+        token_version=payload["ver"],
+        db=db,
+    )
+
+
 # --- Role-based Dependency ---
 def require_role(role: str):
     """
     Enforce that the current user has the required role.
+    Returns a Principal when AUTH_CLAIMS_ONLY is enabled, otherwise the User.
     Usage: Depends(require_role("admin"))
     """
-    async def checker(current_user: User = Depends(get_current_user)):
-        if current_user.role != role:
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
-        return current_user
-    return checker
+    return require_roles([role])
 
 
 # --- Optional: Multi-role enforcement ---
 def require_roles(roles: list[str]):
     """
     Enforce that the current user has one of the allowed roles.
+    Returns a Principal when AUTH_CLAIMS_ONLY is enabled, otherwise the User.
     Usage: Depends(require_roles(["admin", "user"]))
     """
     async def checker(current_user: User = Depends(get_current_user)):
@@ -63,4 +133,29 @@ def require_roles(roles: list[str]):
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
         return current_user
 
+    async def claims_checker(principal: Principal = Depends(get_current_principal)):
+        if principal.role not in roles:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
+        return principal
+
+    return claims_checker if AUTH_CLAIMS_ONLY else checker
+
+
+# --- Subscription-based Dependency ---
+def require_subscription(plan: SubscriptionPlan | str | None = None):
+    """
+    Enforce that the caller has an active or trialing subscription covering `plan`
+    (basic < pro < premium; any paid plan when omitted).
+    Entitlements come from the entitlement cache, so a hit costs no database round trip.
+    Usage: Depends(require_subscription(plan="pro"))
+    """
+    if plan is not None:
+        plan = SubscriptionPlan(plan)
+
+    async def checker(principal: Principal = Depends(get_current_principal)):
+        entitlements = await get_entitlements(principal.db, principal.id)
+        if not is_entitled(entitlements, plan):
+            raise HTTPException(status_code=status.HTTP_402_PAYMENT_REQUIRED, detail="Subscription required")
+        return principal
+
     return checker
@@ -1,12 +1,114 @@
+import asyncio
 import redis.asyncio as redis
+from redis.asyncio.client import Pipeline
 import os
 
+from app.utils.metrics import timed
+
+# Coalesce commands issued in the same event-loop tick into one pipeline round trip
+REDIS_AUTO_PIPELINE = os.getenv("REDIS_AUTO_PIPELINE", "true").lower() == "true"
+REDIS_PIPELINE_MAX_BATCH = int(os.getenv("REDIS_PIPELINE_MAX_BATCH", "128"))  # commands per round trip
+
+# Commands that block or change connection state must keep a connection to themselves
+_UNPIPELINED = frozenset({
+    "BLPOP", "BRPOP", "BRPOPLPUSH", "BLMOVE", "BLMPOP", "BZPOPMIN", "BZPOPMAX", "BZMPOP",
+    "XREAD", "XREADGROUP", "WAIT", "WATCH", "UNWATCH", "MULTI", "EXEC", "DISCARD",
+    "SUBSCRIBE", "PSUBSCRIBE", "MONITOR", "SELECT", "CLIENT", "QUIT", "SHUTDOWN",
+})
+
+_stats = {"commands": 0, "round_trips": 0, "max_batch": 0}
+
+
+class TimedPipeline(Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        with timed("redis"):
+            return await super().execute(raise_on_error)
+
+
+class TimedRedis(redis.Redis):
+    """redis.asyncio client that reports the time callers wait on Redis (see app.utils.metrics)."""
+
+    async def execute_command(self, *args, **options):
+        with timed("redis"):
+            return await super().execute_command(*args, **options)
+
+    def pipeline(self, transaction: bool = True, shard_hint: str | None = None) -> Pipeline:
+        return TimedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+class AutoPipelineRedis(TimedRedis):
+    """
+    Drop-in redis.asyncio client that queues every command and sends the commands
+    queued during one loop tick as a single non-transactional pipeline.
+    Each caller still awaits its own result or exception.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._queue: list[tuple[tuple, dict, asyncio.Future]] = []
+        self._flush_scheduled = False
+        self._sending: set[asyncio.Task] = set()  # keeps in-flight batches referenced
+
+    async def execute_command(self, *args, **options):
+        if str(args[0]).upper() in _UNPIPELINED:
+            _stats["commands"] += 1
+            _stats["round_trips"] += 1
+            return await super().execute_command(*args, **options)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.append((args, options, future))
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            loop.call_soon(self._flush)
+        with timed("redis"):
+            return await future
+
+    def _flush(self):
+        self._flush_scheduled = False
+        queue, self._queue = self._queue, []
+        for start in range(0, len(queue), REDIS_PIPELINE_MAX_BATCH):
+            task = asyncio.create_task(self._send(queue[start:start + REDIS_PIPELINE_MAX_BATCH]))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def _send(self, batch: list[tuple[tuple, dict, asyncio.Future]]):
+        # Plain redis.Redis calls: each caller already times its own wait
+        _stats["commands"] += len(batch)
+        _stats["round_trips"] += 1
+        _stats["max_batch"] = max(_stats["max_batch"], len(batch))
+        try:
+            if len(batch) == 1:
+                args, options, _ = batch[0]
+                results = [await redis.Redis.execute_command(self, *args, **options)]
+            else:
+                async with redis.Redis.pipeline(self, transaction=False) as pipe:
+                    for args, options, _ in batch:
+                        pipe.execute_command(*args, **options)
+                    results = await pipe.execute(raise_on_error=False)
+        except Exception as exc:
+            # Connection-level failure: every queued caller sees it
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        for (_, _, future), result in zip(batch, results):
+            if future.done():  # caller was cancelled
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
 redis_client: redis.Redis | None = None
 
 async def get_redis() -> redis.Redis:
     global redis_client
     if not redis_client:
-        redis_client = redis.from_url(
+        client_class = AutoPipelineRedis if REDIS_AUTO_PIPELINE else TimedRedis
+        redis_client = client_class.from_url(
             os.getenv("REDIS_URL", "redis://localhost:6379"),
             encoding="utf-8",
             decode_responses=True
@@ -18,4 +120,11 @@ async def close_redis():
     if redis_client:
         await redis_client.close()
         await redis_client.connection_pool.disconnect()
-        redis_client = None
\ No newline at end of file
+        redis_client = None
+
+def redis_client_stats() -> dict:
+    return {
+        **_stats,
+        "auto_pipeline": REDIS_AUTO_PIPELINE,
+        "commands_per_round_trip": round(_stats["commands"] / _stats["round_trips"], 2) if _stats["round_trips"] else 0.0,
+    }
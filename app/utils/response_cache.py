@@ -0,0 +1,198 @@
+import functools
+import hashlib
+import inspect
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Callable
+
+from fastapi import Request, Response, status
+from fastapi.encoders import jsonable_encoder
+
+from app.utils.auth_context import get_token_claims
+from app.utils.redis_client import get_redis
+from app.utils.tiered_cache import RedisBackoff
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_LOCAL_SIZE = int(os.getenv("RESPONSE_CACHE_LOCAL_SIZE", "10000"))  # fallback entries per worker
+RESPONSE_CACHE_PREFIX = "resp:"
+RESPONSE_CACHE_TAG_PREFIX = "resp:tag:"
+
+# Delete every entry listed in the given tag sets, then the sets themselves
+INVALIDATE_TAGS_LUA = """
+for _, tag in ipairs(KEYS) do
+    local members = redis.call('SMEMBERS', tag)
+    for i = 1, #members, 500 do
+        redis.call('DEL', unpack(members, i, math.min(i + 499, #members)))
+    end
+    redis.call('DEL', tag)
+end
+return 0
+"""
+
+# Used only while Redis is unreachable: key -> (expires_at, etag, body), tag -> keys
+_local: "OrderedDict[str, tuple[float, str, str]]" = OrderedDict()
+_local_tags: dict[str, set[str]] = {}
+_invalidate_script = None
+_stats = {"hits": 0, "misses": 0, "not_modified": 0, "invalidations": 0, "redis_errors": 0}
+_redis = RedisBackoff(_stats)
+
+
+# --- Entry storage ---
+def _local_get(key: str) -> tuple[str, str] | None:
+    entry = _local.get(key)
+    if entry is None:
+        return None
+    expires_at, etag, body = entry
+    if expires_at < time.monotonic():
+        _local.pop(key, None)
+        return None
+    _local.move_to_end(key)
+    return etag, body
+
+
+def _local_set(key: str, etag: str, body: str, tags: list[str], expire: int):
+    _local[key] = (time.monotonic() + expire, etag, body)
+    _local.move_to_end(key)
+    for tag in tags:
+        _local_tags.setdefault(tag, set()).add(key)
+    while len(_local) > RESPONSE_CACHE_LOCAL_SIZE:
+        _local.popitem(last=False)
+
+
+async def _get(key: str) -> tuple[str, str] | None:
+    if _redis.available():
+        try:
+            raw = await (await get_redis()).get(RESPONSE_CACHE_PREFIX + key)
+        except Exception:
+            _redis.failed()
+        else:
+            if raw is None:
+                return None
+            etag, _, body = raw.partition("\n")
+            return etag, body
+    return _local_get(key)
+
+
+async def _set(key: str, etag: str, body: str, tags: list[str], expire: int):
+    if _redis.available():
+        try:
+            async with (await get_redis()).pipeline(transaction=False) as pipe:
+                pipe.set(RESPONSE_CACHE_PREFIX + key, f"{etag}\n{body}", ex=expire)
+                for tag in tags:
+                    pipe.sadd(RESPONSE_CACHE_TAG_PREFIX + tag, RESPONSE_CACHE_PREFIX + key)
+                    pipe.expire(RESPONSE_CACHE_TAG_PREFIX + tag, expire)
+                await pipe.execute()
+            return
+        except Exception:
+            _redis.failed()
+    _local_set(key, etag, body, tags, expire)
+
+
+async def invalidate_tags(*tags: str):
+    """Drop every cached response carrying one of `tags`. Call after committing the change."""
+    global _invalidate_script
+    _stats["invalidations"] += 1
+    for tag in tags:
+        for key in _local_tags.pop(tag, ()):
+            _local.pop(key, None)
+
+    if not _redis.available():
+        return
+    try:
+        client = await get_redis()
+        if _invalidate_script is None or _invalidate_script.registered_client is not client:
+            _invalidate_script = client.register_script(INVALIDATE_TAGS_LUA)
+        await _invalidate_script(keys=[RESPONSE_CACHE_TAG_PREFIX + tag for tag in tags])
+    except Exception:
+        _redis.failed()
+
+
+async def invalidate_user_responses(user_id):
+    """A user row changed: drop that user's own responses and every user listing."""
+    await invalidate_tags(f"user:{user_id}", "users:list")
+
+
+# --- HTTP helpers ---
+def _etag(body: str) -> str:
+    return '"' + hashlib.sha256(body.encode()).hexdigest()[:32] + '"'
+
+
+def _matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [value.strip().removeprefix("W/") for value in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def _cache_key(func: Callable, scope: str, request: Request) -> str:
+    query = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+    digest = hashlib.sha1(f"{request.url.path}?{query}".encode()).hexdigest()
+    return f"{func.__module__}.{func.__qualname__}:{scope}:{digest}"
+
+
+# --- Decorator ---
+def cache_response(expire: int = 60, vary: str = "user", tags: tuple[str, ...] = ()):
+    """
+    Cache a GET endpoint's JSON body per caller, with a strong ETag and 304 on If-None-Match.
+    Route dependencies (authentication, role checks) still run on every request.
+
+    vary: "user" keys entries by the token's user id, "role" by its role.
+    tags: formatted with the token claims, e.g. ("user:{uid}",) or ("users:list",);
+          invalidate_tags() drops every entry carrying a tag.
+    Usage: place under the route decorator, @cache_response(expire=60, tags=("user:{uid}",))
+    """
+    claim = {"user": "uid", "role": "role"}[vary]
+
+    def decorator(func):
+        signature = inspect.signature(func)
+        request_param = next(
+            (p.name for p in signature.parameters.values() if p.annotation is Request), None
+        )
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            request: Request = kwargs[request_param] if request_param else kwargs.pop("__cache_request")
+            claims = get_token_claims(request)
+            if not RESPONSE_CACHE_ENABLED or not claims or claim not in claims:
+                return await func(*args, **kwargs)
+
+            key = _cache_key(func, f"{vary}:{claims[claim]}", request)
+            cached = await _get(key)
+            if cached is not None:
+                _stats["hits"] += 1
+                etag, body = cached
+            else:
+                _stats["misses"] += 1
+                result = await func(*args, **kwargs)
+                if isinstance(result, Response):
+                    # Pre-serialized JSON (see app.utils.serialization) is cached as is
+                    if result.status_code != status.HTTP_200_OK or result.media_type != "application/json":
+                        return result
+                    body = result.body.decode()
+                else:
+                    # Same encoding as FastAPI's JSONResponse
+                    body = json.dumps(jsonable_encoder(result), ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+                etag = _etag(body)
+                await _set(key, etag, body, [tag.format(**claims) for tag in tags], expire)
+
+            headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+            if _matches(request.headers.get("if-none-match"), etag):
+                _stats["not_modified"] += 1
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+            return Response(content=body, media_type="application/json", headers=headers)
+
+        if request_param is None:
+            # Let FastAPI inject the request without changing the endpoint's own signature
+            wrapper.__signature__ = signature.replace(parameters=[
+                *signature.parameters.values(),
+                inspect.Parameter("__cache_request", inspect.Parameter.KEYWORD_ONLY, annotation=Request),
+            ])
+        return wrapper
+
+    return decorator
+
+
+def response_cache_stats() -> dict:
+    return {**_stats, "local_size": len(_local)}
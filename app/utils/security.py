@@ -1,4 +1,6 @@
 import os
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
 import bcrypt
 from jose import jwt
@@ -7,8 +9,15 @@ import secrets
 import hashlib
 import hmac
 
+from app.utils.metrics import timed
+from app.utils.totp import match_totp
+
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret") # For JWT token
 ALGORITHM = "HS256"
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "4096"))  # 0 disables the verified-token cache
+
+# signature -> (signing input, payload) for recently verified tokens
+_verified_tokens: "OrderedDict[str, tuple[str, dict]]" = OrderedDict()
 
 
 # --- Password Hashing ---
@@ -23,6 +32,7 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 
 # --- JWT Token ---
+@timed("jwt")
 def create_access_token(
     data: dict, expires_delta: timedelta = timedelta(hours=12)
 ) -> str:
@@ -33,14 +43,34 @@ def create_access_token(
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
+@timed("jwt")
 def verify_token(token: str) -> dict | None:
-    """Verify JWT token and return payload data."""
+    """
+    Verify JWT token and return payload data.
+    Recently verified tokens are served from an LRU until their `exp`,
+    skipping the HMAC check and JSON decoding.
+    """
+    signing_input, _, signature = token.rpartition(".")
+    cached = _verified_tokens.get(signature)
+    if cached is not None:
+        cached_input, payload = cached
+        if hmac.compare_digest(cached_input, signing_input):
+            if payload["exp"] > time.time():
+                _verified_tokens.move_to_end(signature)
+                return dict(payload)
+            _verified_tokens.pop(signature, None)
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
     except jwt.JWTError:
         return None
 
+    if TOKEN_CACHE_SIZE > 0 and isinstance(payload.get("exp"), (int, float)):
+        _verified_tokens[signature] = (signing_input, dict(payload))
+        while len(_verified_tokens) > TOKEN_CACHE_SIZE:
+            _verified_tokens.popitem(last=False)
+    return payload
+
 
 # --- 2FA (TOTP) ---
 def generate_totp_secret() -> str:
@@ -49,14 +79,11 @@ def generate_totp_secret() -> str:
 
 
 def verify_totp_code(secret: str, code: str, window: int = 1) -> bool:
-    """Verify TOTP code with optional time window tolerance."""
-    if not secret or not code:
-        return False
-    try:
-        totp = pyotp.TOTP(secret)
-        return totp.verify(code, valid_window=window)
-    except Exception:
-        return False
+    """
+    Verify TOTP code with optional time window tolerance.
+    Does not record the code; use app.utils.totp.consume_totp to reject replays.
+    """
+    return match_totp(secret, code, window) is not None
 
 
 # --- 2FA Backup Code (Single) ---
@@ -0,0 +1,51 @@
+from typing import Any
+from uuid import UUID
+
+from fastapi import Response, status
+from pydantic import BaseModel, TypeAdapter
+
+from app.models.user import UserRole
+from app.schemas.auth import MeResponse, UserOut
+from app.schemas.admin import UpdateUserRoleResponse, UserListResponse, UserSummary
+
+# Built once at import: pydantic compiles each serializer a single time
+_adapters: dict[Any, TypeAdapter] = {
+    type_: TypeAdapter(type_)
+    for type_ in (UserOut, list[UserSummary], MeResponse, UserListResponse, UpdateUserRoleResponse)
+}
+
+
+# --- Building models from trusted rows ---
+def to_model(model: type[BaseModel], row) -> BaseModel:
+    """
+    Build `model` from an ORM object or Row without validation: the values come from
+    our own database, so EmailStr and friends need not be checked again.
+    Only the column types the schema differs on (string ids, enum names) are converted.
+    """
+    values = {name: getattr(row, name) for name in model.model_fields}
+    if "id" in values and not isinstance(values["id"], UUID):
+        values["id"] = UUID(values["id"])
+    if "role" in values:
+        values["role"] = UserRole(values["role"])
+    return model.model_construct(**values)
+
+
+def to_user_out(user) -> UserOut:
+    return to_model(UserOut, user)
+
+
+# --- Responses ---
+def adapter_for(type_) -> TypeAdapter:
+    adapter = _adapters.get(type_)
+    if adapter is None:
+        adapter = _adapters[type_] = TypeAdapter(type_)
+    return adapter
+
+
+def json_response(value, type_=None, status_code: int = status.HTTP_200_OK) -> Response:
+    """
+    Serialize `value` straight to JSON bytes with its compiled pydantic serializer,
+    skipping FastAPI's jsonable_encoder pass. `type_` defaults to type(value).
+    """
+    body = adapter_for(type_ or type(value)).dump_json(value)
+    return Response(content=body, status_code=status_code, media_type="application/json")
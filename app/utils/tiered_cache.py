@@ -0,0 +1,248 @@
+import asyncio
+import json
+import time
+import uuid
+from collections import OrderedDict
+
+from app.utils.redis_client import get_redis
+
+REDIS_RETRY_AFTER = 5.0  # seconds to skip Redis after an error
+TOMBSTONE_TTL = 10  # seconds a deleted key refuses read-through fills
+TIERED_CACHE_CHANNEL = "tiered-cache:invalidate"
+
+# prefix -> caches using it; one per worker in production, several in tests
+_caches: dict[str, list["TwoTierCache"]] = {}
+# Local tiers are only read while subscribed, so no invalidation can be missed
+_listening = False
+_listener_stats = {"listener_errors": 0}
+
+
+# --- Redis backoff ---
+class RedisBackoff:
+    """
+    Skips Redis for REDIS_RETRY_AFTER seconds after an error, so a Redis outage
+    costs one failed call per window instead of one per request.
+    Errors are counted as "redis_errors" in the owner's stats dict.
+    """
+
+    def __init__(self, stats: dict, retry_after: float = REDIS_RETRY_AFTER):
+        self.stats = stats
+        self.retry_after = retry_after
+        self.retry_at = 0.0
+
+    def available(self) -> bool:
+        return time.monotonic() >= self.retry_at
+
+    def failed(self):
+        self.stats["redis_errors"] += 1
+        self.retry_at = time.monotonic() + self.retry_after
+
+
+# --- Local LRU + Redis ---
+class TwoTierCache:
+    """
+    JSON values in a bounded per-worker LRU in front of Redis.
+    Lookups try the local tier, then Redis (filling the local tier); callers load
+    from the source of truth on a miss and store the result with fill(), or with
+    set() when writing a value they just changed.
+    Deletes are published on TIERED_CACHE_CHANNEL so every worker drops its local
+    copy at once; run_tiered_cache_listener() must run in each worker, and the
+    local tier is bypassed while it is not subscribed.
+    A delete leaves an empty tombstone in Redis for TOMBSTONE_TTL, so a fill
+    from a read that raced the change cannot put the old value back.
+    local_size=0 disables the local tier, redis_ttl=0 the Redis tier.
+    """
+
+    def __init__(self, prefix: str, local_size: int, local_ttl: float, redis_ttl: int):
+        self.prefix = prefix
+        self.local_size = local_size
+        self.local_ttl = local_ttl
+        self.redis_ttl = redis_ttl
+        self._local: "OrderedDict[str, tuple[float, object]]" = OrderedDict()
+        # Tags our own messages; bumped per received invalidation so a racing read is not kept locally
+        self._origin = uuid.uuid4().hex
+        self._generation = 0
+        self._stats = {
+            "local_hits": 0,
+            "redis_hits": 0,
+            "misses": 0,
+            "invalidations": 0,
+            "invalidations_received": 0,
+            "redis_errors": 0,
+        }
+        self._redis = RedisBackoff(self._stats)
+        _caches.setdefault(prefix, []).append(self)
+
+    # --- Local tier ---
+    def _local_get(self, key: str):
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self._local.pop(key, None)
+            return None
+        self._local.move_to_end(key)
+        return value
+
+    def _local_set(self, key: str, value):
+        if self.local_size <= 0 or not _listening:
+            return
+        self._local[key] = (time.monotonic() + self.local_ttl, value)
+        self._local.move_to_end(key)
+        while len(self._local) > self.local_size:
+            self._local.popitem(last=False)
+
+    # --- Redis tier ---
+    def _redis_available(self) -> bool:
+        return self.redis_ttl > 0 and self._redis.available()
+
+    async def _redis_get(self, key: str):
+        if not self._redis_available():
+            return None
+        try:
+            raw = await (await get_redis()).get(self.prefix + key)
+        except Exception:
+            self._redis.failed()
+            return None
+        return json.loads(raw) if raw else None
+
+    async def _redis_set(self, key: str, value, nx: bool = False) -> bool:
+        if not self._redis_available():
+            return False
+        try:
+            return bool(await (await get_redis()).set(self.prefix + key, json.dumps(value), ex=self.redis_ttl, nx=nx))
+        except Exception:
+            self._redis.failed()
+            return False
+
+    async def _publish(self, key: str):
+        """Tell the other workers to drop `key` from their local tier."""
+        if not self._redis.available():
+            return
+        message = json.dumps({"origin": self._origin, "prefix": self.prefix, "key": key})
+        try:
+            await (await get_redis()).publish(TIERED_CACHE_CHANNEL, message)
+        except Exception:
+            self._redis.failed()
+
+    async def _redis_delete(self, key: str):
+        """Replace the entry with a tombstone; reads see a miss and fill() leaves it alone."""
+        if not self._redis_available():
+            return
+        try:
+            await (await get_redis()).set(self.prefix + key, "", ex=TOMBSTONE_TTL)
+        except Exception:
+            self._redis.failed()
+
+    def _apply_invalidation(self, message: dict):
+        if message["origin"] == self._origin:
+            return
+        self._stats["invalidations_received"] += 1
+        self._generation += 1
+        self._local.pop(message["key"], None)
+
+    # --- Public API ---
+    @property
+    def generation(self) -> int:
+        """Read before loading from the source of truth and pass to fill()."""
+        return self._generation
+
+    async def get(self, key: str):
+        """Return the cached value, or None after counting a miss."""
+        if _listening:
+            value = self._local_get(key)
+            if value is not None:
+                self._stats["local_hits"] += 1
+                return value
+
+        generation = self._generation
+        value = await self._redis_get(key)
+        if value is not None:
+            self._stats["redis_hits"] += 1
+            if generation == self._generation:
+                self._local_set(key, value)
+            return value
+
+        self._stats["misses"] += 1
+        return None
+
+    async def fill(self, key: str, value, generation: int):
+        """
+        Store a value loaded after a miss, unless the key was deleted since `generation`
+        was read (in this worker) or within TOMBSTONE_TTL (in any worker).
+        """
+        if generation != self._generation:
+            return
+        if self.redis_ttl > 0 and self._redis.available():
+            if not await self._redis_set(key, value, nx=True):
+                return
+        if generation == self._generation:
+            self._local_set(key, value)
+
+    async def set(self, key: str, value, publish: bool = False):
+        """Store a value; publish=True also drops other workers' copies (the source changed)."""
+        self._local_set(key, value)
+        await self._redis_set(key, value)
+        if publish:
+            await self._publish(key)
+
+    async def delete(self, key: str):
+        """Drop a key from both tiers in every worker. Call after committing a change to the source."""
+        self._stats["invalidations"] += 1
+        self._generation += 1
+        self._local.pop(key, None)
+        await self._redis_delete(key)
+        await self._publish(key)
+
+    def stats(self) -> dict:
+        lookups = self._stats["local_hits"] + self._stats["redis_hits"] + self._stats["misses"]
+        hits = self._stats["local_hits"] + self._stats["redis_hits"]
+        return {
+            **self._stats,
+            "local_size": len(self._local),
+            "listening": _listening,
+            "listener_errors": _listener_stats["listener_errors"],
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+# --- Cross-worker invalidation ---
+def _apply_invalidation(raw: str):
+    message = json.loads(raw)
+    for cache in _caches.get(message.get("prefix"), ()):
+        cache._apply_invalidation(message)
+
+
+def _clear_local_tiers():
+    for caches in _caches.values():
+        for cache in caches:
+            cache._local.clear()
+
+
+async def run_tiered_cache_listener():
+    """Apply other workers' invalidations to every TwoTierCache. Runs until cancelled."""
+    global _listening
+    while True:
+        pubsub = None
+        try:
+            pubsub = (await get_redis()).pubsub(ignore_subscribe_messages=True)
+            await pubsub.subscribe(TIERED_CACHE_CHANNEL)
+            # Messages may have been missed while unsubscribed
+            _clear_local_tiers()
+            _listening = True
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    _apply_invalidation(message["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            _listener_stats["listener_errors"] += 1
+        finally:
+            _listening = False
+            if pubsub is not None:
+                try:
+                    await pubsub.reset()
+                except Exception:
+                    pass
+        await asyncio.sleep(REDIS_RETRY_AFTER)
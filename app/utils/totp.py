@@ -0,0 +1,114 @@
+import base64
+import hashlib
+import hmac
+import os
+import struct
+import time
+from collections import OrderedDict
+
+from app.utils.redis_client import get_redis
+from app.utils.tiered_cache import RedisBackoff
+
+TOTP_INTERVAL = 30  # seconds per code, as issued by authenticator apps
+TOTP_DIGITS = 6
+TOTP_KEY_CACHE_SIZE = int(os.getenv("TOTP_KEY_CACHE_SIZE", "10000"))
+TOTP_REPLAY_PREFIX = "totp:used:"
+
+# base32 secret -> decoded HMAC key
+_keys: "OrderedDict[str, bytes]" = OrderedDict()
+# Fallback replay record while Redis is unreachable: "user:counter" -> expiry (monotonic)
+_used_local: dict[str, float] = {}
+_stats = {"verified": 0, "rejected": 0, "replays": 0, "redis_errors": 0}
+_redis = RedisBackoff(_stats)
+
+
+# --- Code computation ---
+def _key(secret: str) -> bytes:
+    key = _keys.get(secret)
+    if key is not None:
+        _keys.move_to_end(secret)
+        return key
+
+    # Authenticator secrets are unpadded base32
+    key = base64.b32decode(secret.upper() + "=" * (-len(secret) % 8))
+    if TOTP_KEY_CACHE_SIZE > 0:
+        _keys[secret] = key
+        while len(_keys) > TOTP_KEY_CACHE_SIZE:
+            _keys.popitem(last=False)
+    return key
+
+
+def _code(key: bytes, counter: int) -> str:
+    """RFC 4226 HOTP value for `counter`."""
+    digest = hmac.new(key, struct.pack(">Q", counter), hashlib.sha1).digest()
+    offset = digest[-1] & 0x0F
+    value = struct.unpack(">I", digest[offset:offset + 4])[0] & 0x7FFFFFFF
+    return str(value % 10 ** TOTP_DIGITS).zfill(TOTP_DIGITS)
+
+
+def match_totp(secret: str, code: str, window: int = 1, now: float | None = None) -> int | None:
+    """
+    Return the time-step counter `code` is valid for, or None.
+    Checks the current step and `window` steps either side in a single pass.
+    """
+    # isdigit() alone accepts non-ASCII digits, which compare_digest rejects with TypeError
+    if not secret or not code or len(code) != TOTP_DIGITS or not (code.isascii() and code.isdigit()):
+        return None
+    try:
+        key = _key(secret)
+    except Exception:
+        return None
+
+    current = int((time.time() if now is None else now) // TOTP_INTERVAL)
+    matched = None
+    for counter in range(current - window, current + window + 1):
+        # No early exit, so timing does not reveal which step matched
+        if hmac.compare_digest(_code(key, counter), code) and matched is None:
+            matched = counter
+    return matched
+
+
+# --- Replay protection ---
+def _claim_local(marker: str, ttl: int) -> bool:
+    now = time.monotonic()
+    for stale in [k for k, expires_at in _used_local.items() if expires_at <= now]:
+        del _used_local[stale]
+    if marker in _used_local:
+        return False
+    _used_local[marker] = now + ttl
+    return True
+
+
+async def _claim(marker: str, ttl: int) -> bool:
+    """Record a code as used; False if it was already used. One SET NX round trip."""
+    if _redis.available():
+        try:
+            return bool(await (await get_redis()).set(TOTP_REPLAY_PREFIX + marker, 1, nx=True, ex=ttl))
+        except Exception:
+            _redis.failed()
+    # Redis down: still reject replays that reach this worker
+    return _claim_local(marker, ttl)
+
+
+async def consume_totp(user_id: str, secret: str, code: str, window: int = 1) -> bool:
+    """
+    Verify a TOTP code and mark it used for this user.
+    A code is accepted at most once, even though it stays valid for the whole window.
+    """
+    counter = match_totp(secret, code, window)
+    if counter is None:
+        _stats["rejected"] += 1
+        return False
+
+    # Long enough to outlive every step the code could still be accepted in
+    ttl = (2 * window + 1) * TOTP_INTERVAL
+    if not await _claim(f"{user_id}:{counter}", ttl):
+        _stats["replays"] += 1
+        return False
+
+    _stats["verified"] += 1
+    return True
+
+
+def totp_stats() -> dict:
+    return {**_stats, "cached_keys": len(_keys)}
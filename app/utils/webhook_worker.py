@@ -0,0 +1,318 @@
+import asyncio
+import json
+import logging
+import os
+import random
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import aliased
+
+from app.database import AsyncSessionLocal
+from app.models.subscription import Subscription, SubscriptionPlan, SubscriptionStatus
+from app.models.user import User
+from app.models.webhook import StripeEvent, StripeEventDeadLetter
+from app.utils.entitlements import invalidate_entitlements, refresh_entitlements
+from app.utils.payment_gateway import PaymentGateway, get_gateway
+
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "100"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "8"))
+WEBHOOK_CONCURRENCY = int(os.getenv("WEBHOOK_CONCURRENCY", "4"))  # subscriptions processed in parallel
+WEBHOOK_POLL_INTERVAL = float(os.getenv("WEBHOOK_POLL_INTERVAL", "5"))
+WEBHOOK_RETRY_BASE = float(os.getenv("WEBHOOK_RETRY_BASE", "2"))  # seconds, doubled per attempt
+WEBHOOK_LEASE_SECONDS = float(os.getenv("WEBHOOK_LEASE_SECONDS", "60"))  # claim held by a worker; reclaimed after a crash
+
+# Stripe price id -> plan, e.g. "price_abc:basic,price_def:pro"
+STRIPE_PRICE_PLANS = {
+    price_id.strip(): SubscriptionPlan(plan.strip())
+    for price_id, _, plan in (item.partition(":") for item in os.getenv("STRIPE_PRICE_PLANS", "").split(",") if item.strip())
+}
+
+logger = logging.getLogger(__name__)
+
+_wakeup: asyncio.Event | None = None
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def subscription_key(event: dict) -> str | None:
+    """Stripe subscription id an event applies to; events sharing it are applied in order."""
+    obj = event["data"]["object"]
+    if event["type"].startswith("customer.subscription."):
+        return obj.get("id")
+    return obj.get("subscription")
+
+
+# --- Ingestion (webhook request path) ---
+async def ingest_event(db: AsyncSession, payload: str) -> bool:
+    """Persist a verified event. Returns False if the event id was already received."""
+    event = json.loads(payload)
+    db.add(StripeEvent(
+        id=event["id"],
+        type=event["type"],
+        payload=payload,
+        subscription_key=subscription_key(event),
+        stripe_created=event.get("created"),
+    ))
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        return False
+
+    if _wakeup is not None:
+        _wakeup.set()
+    return True
+
+
+# --- Event handlers ---
+def _period_end(obj: dict) -> datetime | None:
+    if not obj.get("current_period_end"):
+        return None
+    return datetime.fromtimestamp(obj["current_period_end"], tz=timezone.utc)
+
+
+def _plan(obj: dict) -> SubscriptionPlan | None:
+    """Plan of a Stripe subscription object, from the price of its first item."""
+    items = (obj.get("items") or {}).get("data") or []
+    if not items:
+        return None
+    return STRIPE_PRICE_PLANS.get(items[0]["price"]["id"])
+
+
+async def _find_subscription(db: AsyncSession, stripe_subscription_id: str) -> Subscription | None:
+    return (await db.execute(
+        select(Subscription).where(Subscription.stripe_subscription_id == stripe_subscription_id)
+    )).scalars().first()
+
+
+async def apply_event(db: AsyncSession, event: dict, gateway: PaymentGateway) -> str | None:
+    """
+    Apply one Stripe event to the database. Raises to trigger a retry.
+    Returns the id of the user whose subscription changed, if any.
+    """
+    event_type = event["type"]
+    data = event["data"]["object"]
+    subscription = None
+
+    if event_type == "checkout.session.completed":
+        sub_id = data["subscription"]
+        user = await db.get(User, data.get("client_reference_id"))
+        if not user:
+            raise ValueError(f"User {data.get('client_reference_id')!r} not found")
+
+        sub = await gateway.retrieve_subscription(sub_id)
+        subscription = await _find_subscription(db, sub_id)
+        if subscription is None:
+            subscription = Subscription(user_id=user.id, stripe_subscription_id=sub_id)
+            db.add(subscription)
+        subscription.status = SubscriptionStatus(sub["status"])
+        subscription.current_period_end = _period_end(sub)
+        subscription.plan = _plan(sub) or subscription.plan
+
+    elif event_type == "customer.subscription.updated":
+        subscription = await _find_subscription(db, data["id"])
+        if subscription:
+            subscription.status = SubscriptionStatus(data["status"])
+            subscription.current_period_end = _period_end(data)
+            subscription.plan = _plan(data) or subscription.plan
+
+    elif event_type in ("customer.subscription.deleted", "invoice.payment_failed"):
+        subscription = await _find_subscription(db, subscription_key(event))
+        if subscription:
+            subscription.status = SubscriptionStatus.CANCELED
+            subscription.is_active = False
+
+    return subscription.user_id if subscription else None
+
+
+# --- Worker ---
+async def _update_entitlements(db: AsyncSession, user_id: str):
+    """Precompute the user's entitlements so paid routes keep hitting the cache."""
+    try:
+        await refresh_entitlements(db, user_id)
+    except Exception:
+        # Fall back to recomputing on the next lookup
+        await invalidate_entitlements(user_id)
+
+
+async def _has_earlier_pending(db: AsyncSession, event: StripeEvent) -> bool:
+    """True if an older event of the same subscription still has to be applied first."""
+    if event.subscription_key is None:
+        return False
+    earlier = (await db.execute(
+        select(StripeEvent.id)
+        .where(
+            StripeEvent.status == "pending",
+            StripeEvent.subscription_key == event.subscription_key,
+            StripeEvent.id != event.id,
+            or_(
+                StripeEvent.stripe_created < event.stripe_created,
+                (StripeEvent.stripe_created == event.stripe_created) & (StripeEvent.received_at < event.received_at),
+            ),
+        )
+        .limit(1)
+    )).first()
+    return earlier is not None
+
+
+async def _process_event(SessionLocal, event_id: str, gateway: PaymentGateway) -> bool:
+    """Apply and mark one event in a single transaction; on failure schedule a retry or dead-letter it."""
+    async with SessionLocal() as db:
+        # Row lock (PostgreSQL): a worker whose claim expired waits here and then sees the event as done
+        event = await db.get(StripeEvent, event_id, with_for_update=True)
+        if event is None or event.status != "pending":
+            return False
+        if await _has_earlier_pending(db, event):
+            # Claimed alongside an older event held by another worker; leave it for later
+            event.locked_until = None
+            await db.commit()
+            return False
+        try:
+            user_id = await apply_event(db, json.loads(event.payload), gateway)
+            event.status = "processed"
+            event.processed_at = _now()
+            event.locked_until = None
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            error = repr(e)[:2000]
+        else:
+            if user_id is not None:
+                await _update_entitlements(db, user_id)
+            return True
+
+        event = await db.get(StripeEvent, event_id, with_for_update=True)
+        if event is None or event.status != "pending":
+            return False
+        event.attempts += 1
+        event.locked_until = None
+        event.last_error = error
+        if event.attempts >= WEBHOOK_MAX_ATTEMPTS:
+            db.add(StripeEventDeadLetter(
+                id=event.id,
+                type=event.type,
+                payload=event.payload,
+                subscription_key=event.subscription_key,
+                attempts=event.attempts,
+                last_error=event.last_error,
+                received_at=event.received_at,
+            ))
+            await db.delete(event)
+        else:
+            # Exponential backoff with full jitter
+            delay = random.uniform(0, WEBHOOK_RETRY_BASE * 2 ** (event.attempts - 1))
+            event.next_attempt_at = _now() + timedelta(seconds=delay)
+        await db.commit()
+        return False
+
+
+def _claimable(now: datetime):
+    """
+    Ids of due, unclaimed events in Stripe order, skipping every subscription that
+    has an event waiting for a retry or claimed by a worker, so those cannot fill
+    the batch and starve the others.
+    """
+    held = aliased(StripeEvent)
+    held_keys = select(held.subscription_key).where(
+        held.status == "pending",
+        held.subscription_key.is_not(None),
+        or_(held.next_attempt_at > now, held.locked_until > now),
+    )
+    return (
+        select(StripeEvent.id)
+        .where(
+            StripeEvent.status == "pending",
+            or_(StripeEvent.next_attempt_at.is_(None), StripeEvent.next_attempt_at <= now),
+            or_(StripeEvent.locked_until.is_(None), StripeEvent.locked_until <= now),
+            or_(StripeEvent.subscription_key.is_(None), StripeEvent.subscription_key.not_in(held_keys)),
+        )
+        .order_by(StripeEvent.stripe_created, StripeEvent.received_at)
+        .limit(WEBHOOK_BATCH_SIZE)
+        .with_for_update(skip_locked=True)
+    )
+
+
+async def claim_events(SessionLocal) -> list[tuple[str, str | None]]:
+    """
+    Lease a batch of events to this worker in one statement and return their
+    (id, subscription_key) in Stripe order. Concurrent workers skip rows being
+    claimed (FOR UPDATE SKIP LOCKED on PostgreSQL) and rows already leased.
+    """
+    now = _now()
+    async with SessionLocal() as db:
+        claimed = (await db.execute(
+            update(StripeEvent)
+            .where(StripeEvent.id.in_(_claimable(now)))
+            .values(locked_until=now + timedelta(seconds=WEBHOOK_LEASE_SECONDS))
+            .returning(StripeEvent.id, StripeEvent.subscription_key, StripeEvent.stripe_created, StripeEvent.received_at)
+            .execution_options(synchronize_session=False)
+        )).all()
+        await db.commit()
+
+    claimed.sort(key=lambda row: (row.stripe_created is None, row.stripe_created or 0, row.received_at))
+    return [(row.id, row.subscription_key) for row in claimed]
+
+
+async def _release(SessionLocal, event_ids: list[str]):
+    """Give back claims on events this worker did not get to."""
+    async with SessionLocal() as db:
+        await db.execute(
+            update(StripeEvent)
+            .where(StripeEvent.id.in_(event_ids), StripeEvent.status == "pending")
+            .values(locked_until=None)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+
+
+async def process_pending_events(SessionLocal=AsyncSessionLocal, gateway: PaymentGateway | None = None) -> int:
+    """
+    Claim and process one batch of pending events and return how many were applied.
+    Events for the same subscription run in Stripe order; an event waiting
+    for a retry holds back the later events of its subscription.
+    """
+    gateway = gateway or get_gateway()
+    groups: dict[str, list[str]] = {}
+    for event_id, key in await claim_events(SessionLocal):
+        groups.setdefault(key or event_id, []).append(event_id)
+
+    semaphore = asyncio.Semaphore(WEBHOOK_CONCURRENCY)
+
+    async def run_group(event_ids: list[str]) -> int:
+        applied = 0
+        async with semaphore:
+            for i, event_id in enumerate(event_ids):
+                if not await _process_event(SessionLocal, event_id, gateway):
+                    # Keep later events of this subscription behind the failed one
+                    if event_ids[i + 1:]:
+                        await _release(SessionLocal, event_ids[i + 1:])
+                    break
+                applied += 1
+        return applied
+
+    return sum(await asyncio.gather(*(run_group(ids) for ids in groups.values())))
+
+
+async def run_webhook_worker(SessionLocal=AsyncSessionLocal):
+    """Background loop: drain pending events, then wait for a new event or the poll interval."""
+    global _wakeup
+    _wakeup = asyncio.Event()
+    while True:
+        _wakeup.clear()
+        try:
+            applied = await process_pending_events(SessionLocal)
+        except Exception:
+            logger.exception("Webhook worker error")
+            applied = 0
+        if applied >= WEBHOOK_BATCH_SIZE:
+            continue
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=WEBHOOK_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
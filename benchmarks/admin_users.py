@@ -0,0 +1,109 @@
+"""
+/admin/users on a large seeded table: unbounded ORM listing vs keyset pages.
+
+    python -m benchmarks.admin_users --rows 1000000
+"""
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import insert, select, func
+
+from app.models.user import User, UserRole
+from app.utils.pagination import encode_cursor
+from benchmarks.common import inprocess_client, seed_users, summarize
+
+BATCH = 10_000
+
+
+async def seed_rows(SessionLocal, rows: int):
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    async with SessionLocal() as session:
+        for offset in range(0, rows, BATCH):
+            await session.execute(insert(User), [
+                {
+                    "id": str(uuid.uuid4()),
+                    "username": f"row{i}",
+                    "email": f"row{i}@example.com",
+                    "hashed_password": "x" * 60,
+                    "role": UserRole.user,
+                    "is_2fa_enabled": False,
+                    "created_at": start + timedelta(seconds=i),
+                }
+                for i in range(offset, min(offset + BATCH, rows))
+            ])
+        await session.commit()
+
+
+async def timed_pages(client, headers, cursor: str | None, pages: int, limit: int) -> list[float]:
+    latencies = []
+    for _ in range(pages):
+        params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        start = time.perf_counter()
+        response = await client.get("/admin/users", params=params, headers=headers)
+        latencies.append(time.perf_counter() - start)
+        cursor = response.json()["next_cursor"]
+    return latencies
+
+
+async def run(rows: int, limit: int, pages: int, skip_full: bool) -> dict:
+    async with inprocess_client() as (client, SessionLocal):
+        start = time.perf_counter()
+        await seed_rows(SessionLocal, rows)
+        seed_seconds = time.perf_counter() - start
+
+        [admin_email] = await seed_users(SessionLocal, 1, role=UserRole.admin)
+        token = (await client.post("/auth/login", json={"email": admin_email, "password": "password123"})).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        result = {"rows": rows, "seed_seconds": round(seed_seconds, 1), "page_size": limit}
+
+        if not skip_full:
+            # What the old endpoint did before serializing: every ORM row in memory
+            tracemalloc.start()
+            start = time.perf_counter()
+            async with SessionLocal() as session:
+                users = (await session.execute(select(User))).scalars().all()
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            result["unbounded_orm_listing"] = {
+                "rows": len(users),
+                "seconds": round(elapsed, 2),
+                "peak_mb": round(peak / 2**20, 1),
+            }
+            del users
+
+        async with SessionLocal() as session:
+            middle = (await session.execute(
+                select(User.created_at, User.id).order_by(User.created_at, User.id).offset(rows // 2).limit(1)
+            )).first()
+            assert (await session.execute(select(func.count(User.id)))).scalar() == rows + 1
+
+        tracemalloc.start()
+        result["keyset_first_pages"] = summarize(await timed_pages(client, headers, None, pages, limit))
+        result["keyset_middle_pages"] = summarize(
+            await timed_pages(client, headers, encode_cursor(middle.created_at, middle.id), pages, limit)
+        )
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result["keyset_peak_mb"] = round(peak / 2**20, 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=50, help="page size")
+    parser.add_argument("--pages", type=int, default=50, help="pages to fetch per scenario")
+    parser.add_argument("--skip-full", action="store_true", help="skip the unbounded listing")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.rows, args.limit, args.pages, args.skip_full)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
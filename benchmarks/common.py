@@ -0,0 +1,85 @@
+"""
+Shared helpers for the benchmark scripts.
+Runs the ASGI app in process against a throwaway SQLite database.
+"""
+import statistics
+import tempfile
+import threading
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.main import app
+from app.database import Base, get_async_session
+from app.models.user import User, UserRole
+from app.utils.security import hash_password
+
+
+@asynccontextmanager
+async def inprocess_client(db_path: Path | None = None):
+    """Yield (client, session factory) for the app bound to a temporary SQLite file."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = db_path or Path(tmp) / "bench.db"
+        engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+        SessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+        async def override_get_db():
+            async with SessionLocal() as session:
+                yield session
+
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        app.dependency_overrides[get_async_session] = override_get_db
+        try:
+            transport = ASGITransport(app=app)
+            async with AsyncClient(transport=transport, base_url="http://bench") as client:
+                yield client, SessionLocal
+        finally:
+            app.dependency_overrides.pop(get_async_session, None)
+            await engine.dispose()
+
+
+async def seed_users(SessionLocal, count: int, password: str = "password123", role: UserRole = UserRole.user) -> list[str]:
+    """Insert `count` users sharing one password hash and return their emails."""
+    hashed = hash_password(password)
+    emails = [f"bench{i}@example.com" for i in range(count)]
+    async with SessionLocal() as session:
+        session.add_all(
+            User(username=f"bench{i}", email=email, hashed_password=hashed, role=role)
+            for i, email in enumerate(emails)
+        )
+        await session.commit()
+    return emails
+
+
+def summarize(latencies: list[float]) -> dict:
+    """Latency summary in milliseconds."""
+    if not latencies:
+        return {"count": 0}
+    ordered = sorted(latencies)
+
+    def pct(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 2)
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 2),
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+
+def start_fakeredis() -> str:
+    """Serve an in-process fake Redis on a free port and return its URL (pip install -r benchmarks/requirements.txt)."""
+    from fakeredis import TcpFakeServer
+
+    server = TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return f"redis://{host}:{port}"
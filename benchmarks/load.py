@@ -0,0 +1,228 @@
+"""
+Load test of the main endpoints: requests/sec and latency percentiles per scenario, as JSON.
+
+    python -m benchmarks.load                                  # app in process, Redis at REDIS_URL if reachable
+    python -m benchmarks.load --fakeredis                      # app in process, in-process fake Redis
+    python -m benchmarks.load --url http://localhost:8000 \\
+        --admin-email admin@example.com --admin-password ...   # a running uvicorn
+    python -m benchmarks.load --output baseline.json           # store a baseline
+    python -m benchmarks.load --baseline baseline.json         # exit 1 if a scenario regressed
+
+Scenarios: signup, login, me, admin_users, rate_limit. Each runs --requests requests
+through --concurrency closed-loop workers.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from httpx import AsyncClient
+
+from app.models.user import User, UserRole
+from app.utils.cache import init_redis_cache
+from app.utils.rate_limit import init_limiter
+from app.utils.redis_client import close_redis, get_redis
+from app.utils.security import hash_password
+from benchmarks.common import inprocess_client, seed_users, start_fakeredis, summarize
+
+SCENARIOS = ("signup", "login", "me", "admin_users", "rate_limit")
+PASSWORD = "password123"
+
+
+# --- Targets ---
+async def _init_redis() -> str:
+    """Wire the cache and limiter to Redis the way the lifespan does, if Redis answers."""
+    try:
+        await (await get_redis()).ping()
+    except Exception:
+        return "unavailable (in-process fallbacks)"
+    await init_redis_cache()
+    await init_limiter()
+    return os.getenv("REDIS_URL", "redis://localhost:6379")
+
+
+@asynccontextmanager
+async def inprocess_target(users: int, fakeredis: bool):
+    """Yield (client, context) for the app in process on a temporary SQLite database."""
+    if fakeredis:
+        os.environ["REDIS_URL"] = start_fakeredis()
+
+    async with inprocess_client() as (client, SessionLocal):
+        redis = await _init_redis()
+        emails = await seed_users(SessionLocal, users)
+        await _seed_admin(SessionLocal, "benchadmin@example.com")
+        context = {
+            "target": "in-process",
+            "redis": redis,
+            "emails": emails,
+            "tokens": [await _login(client, email, PASSWORD) for email in emails],
+            "admin_token": await _login(client, "benchadmin@example.com", PASSWORD),
+        }
+        try:
+            yield client, context
+        finally:
+            await close_redis()
+
+
+async def _seed_admin(SessionLocal, email: str):
+    async with SessionLocal() as session:
+        session.add(User(username=email.split("@")[0], email=email, hashed_password=hash_password(PASSWORD), role=UserRole.admin))
+        await session.commit()
+
+
+@asynccontextmanager
+async def remote_target(url: str, users: int, admin_email: str | None, admin_password: str | None):
+    """Yield (client, context) for a running server, creating throwaway accounts through /auth/signup."""
+    run_id = uuid.uuid4().hex[:8]
+    async with AsyncClient(base_url=url, timeout=30) as client:
+        emails, tokens = [], []
+        for i in range(users):
+            email = f"load-{run_id}-{i}@example.com"
+            response = await client.post("/auth/signup", json={"username": f"load-{run_id}-{i}", "email": email, "password": PASSWORD})
+            response.raise_for_status()
+            emails.append(email)
+            tokens.append(response.json()["access_token"])
+        context = {
+            "target": url,
+            "redis": "server-side",
+            "emails": emails,
+            "tokens": tokens,
+            "admin_token": await _login(client, admin_email, admin_password) if admin_email else None,
+        }
+        yield client, context
+
+
+async def _login(client: AsyncClient, email: str, password: str) -> str:
+    response = await client.post("/auth/login", json={"email": email, "password": password})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+# --- Scenarios: each issues the i-th request of its run ---
+def _auth(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def signup(client, context, i):
+    name = f"signup-{context['run_id']}-{i}"
+    return await client.post("/auth/signup", json={"username": name, "email": f"{name}@example.com", "password": PASSWORD})
+
+
+async def login(client, context, i):
+    email = context["emails"][i % len(context["emails"])]
+    return await client.post("/auth/login", json={"email": email, "password": PASSWORD})
+
+
+async def me(client, context, i):
+    return await client.get("/user/me", headers=_auth(context["tokens"][i % len(context["tokens"])]))
+
+
+async def admin_users(client, context, i):
+    return await client.get("/admin/users", params={"limit": 50}, headers=_auth(context["admin_token"]))
+
+
+async def rate_limit(client, context, i):
+    # 3 calls per minute per user: after warm-up this measures the rejection path
+    return await client.get("/rate-limit-test", headers=_auth(context["tokens"][i % len(context["tokens"])]))
+
+
+async def run_scenario(scenario, client, context, requests: int, concurrency: int) -> dict:
+    latencies: list[float] = []
+    statuses: dict[str, int] = {}
+    next_index = iter(range(requests))
+
+    async def worker():
+        for i in next_index:
+            start = time.perf_counter()
+            try:
+                status = str((await scenario(client, context, i)).status_code)
+            except Exception as exc:
+                status = type(exc).__name__
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "rps": round(requests / elapsed, 1),
+        "statuses": statuses,
+        "latency": summarize(latencies),
+    }
+
+
+# --- Baseline comparison ---
+def compare(report: dict, baseline: dict, threshold: float) -> list[str]:
+    """Scenarios whose throughput fell, or whose p99 rose, by more than `threshold` (a fraction)."""
+    regressions = []
+    for name, current in report["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous or "skipped" in previous or "skipped" in current:
+            continue
+        if current["rps"] < previous["rps"] * (1 - threshold):
+            regressions.append(f"{name}: rps {previous['rps']} -> {current['rps']}")
+        p99, previous_p99 = current["latency"].get("p99_ms"), previous["latency"].get("p99_ms")
+        if p99 is not None and previous_p99 is not None and p99 > previous_p99 * (1 + threshold):
+            regressions.append(f"{name}: p99 {previous_p99} ms -> {p99} ms")
+    return regressions
+
+
+async def run(args) -> dict:
+    if args.url:
+        target = remote_target(args.url, args.users, args.admin_email, args.admin_password)
+    else:
+        target = inprocess_target(args.users, args.fakeredis)
+
+    async with target as (client, context):
+        context["run_id"] = uuid.uuid4().hex[:8]
+        report = {"target": context["target"], "redis": context["redis"], "users": args.users, "scenarios": {}}
+        for name in args.scenarios:
+            if name == "admin_users" and not context["admin_token"]:
+                report["scenarios"][name] = {"skipped": "pass --admin-email and --admin-password"}
+                continue
+            requests = args.requests if name not in ("signup", "login") else args.auth_requests
+            report["scenarios"][name] = await run_scenario(globals()[name], client, context, requests, args.concurrency)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="base URL of a running server; default drives the app in process")
+    parser.add_argument("--admin-email", help="admin account for the admin_users scenario (--url only)")
+    parser.add_argument("--admin-password")
+    parser.add_argument("--fakeredis", action="store_true", help="in-process fake Redis server (pip install -r benchmarks/requirements.txt)")
+    parser.add_argument("--scenarios", type=lambda s: s.split(","), default=list(SCENARIOS),
+                        help=f"comma-separated subset of {','.join(SCENARIOS)}")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per scenario")
+    parser.add_argument("--auth-requests", type=int, default=200, help="requests for signup and login (bcrypt-bound)")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--users", type=int, default=50, help="accounts to spread requests over")
+    parser.add_argument("--output", type=Path, help="also write the report here (e.g. to store a baseline)")
+    parser.add_argument("--baseline", type=Path, help="compare against a stored report")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed rps drop / p99 rise, as a fraction")
+    args = parser.parse_args()
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    report = asyncio.run(run(args))
+    if args.baseline:
+        report["regressions"] = compare(report, json.loads(args.baseline.read_text()), args.threshold)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n")
+    print(output)
+    if report.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
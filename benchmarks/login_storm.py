@@ -0,0 +1,65 @@
+"""
+p99 of /user/me while a storm of logins is in progress.
+
+    python -m benchmarks.login_storm              # bcrypt in the worker pool
+    python -m benchmarks.login_storm --inline     # bcrypt on the event loop (old behaviour)
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from app.utils import password_hasher
+from benchmarks.common import inprocess_client, seed_users, summarize
+
+
+async def run(duration: float, concurrency: int, inline: bool) -> dict:
+    if inline:
+        password_hasher.PASSWORD_HASH_WORKERS = 0
+
+    async with inprocess_client() as (client, SessionLocal):
+        emails = await seed_users(SessionLocal, concurrency + 1)
+        probe_email = emails[-1]
+        token = (await client.post("/auth/login", json={"email": probe_email, "password": "password123"})).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        deadline = time.perf_counter() + duration
+        logins = {"ok": 0, "rejected": 0}
+        probe_latencies: list[float] = []
+        probe_statuses: dict[str, int] = {}
+
+        async def login_worker(email: str):
+            while time.perf_counter() < deadline:
+                response = await client.post("/auth/login", json={"email": email, "password": "password123"})
+                logins["ok" if response.status_code == 200 else "rejected"] += 1
+
+        async def probe():
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                status = str((await client.get("/user/me", headers=headers)).status_code)
+                probe_latencies.append(time.perf_counter() - start)
+                probe_statuses[status] = probe_statuses.get(status, 0) + 1
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(probe(), *(login_worker(email) for email in emails[:concurrency]))
+
+    return {
+        "mode": "inline" if inline else f"{password_hasher.PASSWORD_HASH_EXECUTOR}-pool",
+        "workers": password_hasher.PASSWORD_HASH_WORKERS,
+        "login_concurrency": concurrency,
+        "logins": logins,
+        "user_me": {**summarize(probe_latencies), "statuses": probe_statuses},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to run the storm")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent login loops")
+    parser.add_argument("--inline", action="store_true", help="hash on the event loop (pre-pool behaviour)")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.duration, args.concurrency, args.inline)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
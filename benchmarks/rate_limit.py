@@ -0,0 +1,103 @@
+"""
+Throughput and Redis commands per request: hybrid leased token buckets vs fastapi-limiter.
+
+    python -m benchmarks.rate_limit                           # Redis at REDIS_URL
+    python -m benchmarks.rate_limit --rtt-ms 0.5              # add simulated network latency per command
+    python -m benchmarks.rate_limit --fakeredis --rtt-ms 0.5  # in-process fake server (pip install -r benchmarks/requirements.txt)
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from fastapi import Depends, FastAPI
+from fastapi_limiter import FastAPILimiter
+from httpx import ASGITransport, AsyncClient
+
+from app.utils import rate_limit, redis_client
+from app.utils.security import create_access_token
+from benchmarks.common import start_fakeredis
+
+
+def _count_commands(client, rtt: float) -> dict:
+    """Wrap the client so every command is counted and optionally delayed by `rtt` seconds."""
+    counter = {"commands": 0}
+    execute = client.execute_command
+
+    async def counted(*args, **kwargs):
+        counter["commands"] += 1
+        if rtt:
+            await asyncio.sleep(rtt)
+        return await execute(*args, **kwargs)
+
+    client.execute_command = counted
+    return counter
+
+
+async def run_engine(engine: str, requests: int, users: int, concurrency: int, rtt: float) -> dict:
+    rate_limit.RATE_LIMIT_ENGINE = engine
+    rate_limit._leases.clear()
+    rate_limit._denied.clear()
+
+    client = await redis_client.get_redis()
+    await client.flushdb()
+    await FastAPILimiter.init(client)
+    counter = _count_commands(client, rtt)
+
+    app = FastAPI()
+    # Generous limit: measures the cost of admitting requests, not of rejecting them
+    limiter = rate_limit.per_user_limiter(times=1_000_000, seconds=60)
+
+    @app.get("/ping", dependencies=[Depends(limiter)])
+    async def ping():
+        return {"ok": True}
+
+    headers = [{"Authorization": f"Bearer {create_access_token({'sub': f'user{i}@example.com'})}"} for i in range(users)]
+    semaphore = asyncio.Semaphore(concurrency)
+    statuses: dict[int, int] = {}
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as http:
+        async def one(i: int):
+            async with semaphore:
+                response = await http.get("/ping", headers=headers[i % users])
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+
+    del client.execute_command  # drop the instance override
+    return {
+        "requests_per_sec": round(requests / elapsed, 1),
+        "redis_commands": counter["commands"],
+        "redis_commands_per_request": round(counter["commands"] / requests, 3),
+        "redis_ops_per_sec": round(counter["commands"] / elapsed, 1),
+        "statuses": statuses,
+    }
+
+
+async def run(args) -> dict:
+    if args.fakeredis:
+        os.environ["REDIS_URL"] = start_fakeredis()
+    report = {"requests": args.requests, "users": args.users, "concurrency": args.concurrency, "rtt_ms": args.rtt_ms}
+    for engine in ("redis", "hybrid"):
+        report[engine] = await run_engine(engine, args.requests, args.users, args.concurrency, args.rtt_ms / 1000)
+    report["hybrid"]["lease_fraction"] = rate_limit.RATE_LIMIT_LEASE_FRACTION
+    await redis_client.close_redis()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=20, help="distinct rate-limit keys")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--rtt-ms", type=float, default=0.0, help="simulated Redis round-trip time")
+    parser.add_argument("--fakeredis", action="store_true", help="run against an in-process fake Redis server")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
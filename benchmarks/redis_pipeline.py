@@ -0,0 +1,97 @@
+"""
+Redis throughput and latency with and without auto-pipelining, under many concurrent requests.
+
+    python -m benchmarks.redis_pipeline                           # Redis at REDIS_URL
+    python -m benchmarks.redis_pipeline --rtt-ms 0.5              # add simulated network latency per round trip
+    python -m benchmarks.redis_pipeline --fakeredis --rtt-ms 0.5  # in-process fake server (pip install -r benchmarks/requirements.txt)
+
+Each simulated request issues a GET, an INCR and a SET with expiry, like a cache lookup plus a counter.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from redis.asyncio.connection import Connection
+
+from app.utils import redis_client
+from benchmarks.common import start_fakeredis, summarize
+
+
+def _count_round_trips(rtt: float) -> dict:
+    """Count (and optionally delay) every write to a Redis socket: one per command or pipeline."""
+    counter = {"round_trips": 0}
+    send = Connection.send_packed_command
+
+    async def counted(self, command, check_health=True):
+        counter["round_trips"] += 1
+        if rtt:
+            await asyncio.sleep(rtt)
+        return await send(self, command, check_health)
+
+    Connection.send_packed_command = counted
+    counter["restore"] = lambda: setattr(Connection, "send_packed_command", send)
+    return counter
+
+
+async def run_mode(auto_pipeline: bool, requests: int, concurrency: int, rtt: float) -> dict:
+    redis_client.REDIS_AUTO_PIPELINE = auto_pipeline
+    await redis_client.close_redis()
+    client = await redis_client.get_redis()
+    await client.flushdb()
+
+    counter = _count_round_trips(rtt)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            await client.get(f"bench:cache:{i % 1000}")
+            await client.incr(f"bench:counter:{i % 100}")
+            await client.set(f"bench:cache:{i % 1000}", "x" * 64, ex=60)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    counter["restore"]()
+
+    commands = requests * 3
+    return {
+        "requests_per_sec": round(requests / elapsed, 1),
+        "redis_ops_per_sec": round(commands / elapsed, 1),
+        "round_trips": counter["round_trips"],
+        "commands_per_round_trip": round(commands / counter["round_trips"], 2),
+        "request_latency": summarize(latencies),
+    }
+
+
+async def run(args) -> dict:
+    if args.fakeredis:
+        os.environ["REDIS_URL"] = start_fakeredis()
+    report = {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "rtt_ms": args.rtt_ms,
+        "max_batch": redis_client.REDIS_PIPELINE_MAX_BATCH,
+    }
+    for name, auto_pipeline in (("plain", False), ("auto_pipeline", True)):
+        report[name] = await run_mode(auto_pipeline, args.requests, args.concurrency, args.rtt_ms / 1000)
+    await redis_client.close_redis()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=1000)
+    parser.add_argument("--rtt-ms", type=float, default=0.0, help="simulated Redis round-trip time")
+    parser.add_argument("--fakeredis", action="store_true", help="run against an in-process fake Redis server")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Time to turn a 10k-user listing into JSON bytes, old path vs the precompiled one.
+
+    python -m benchmarks.serialization
+    python -m benchmarks.serialization --users 1000 --repeat 20
+"""
+import argparse
+import json
+import time
+import uuid
+from datetime import datetime, timezone
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+
+from app.models.user import User, UserRole
+from app.schemas.admin import UserListResponse, UserSummary
+from app.utils.serialization import adapter_for, to_model
+
+
+def _users(count: int) -> list[User]:
+    now = datetime.now(timezone.utc)
+    return [
+        User(
+            id=str(uuid.uuid4()),
+            username=f"bench{i}",
+            email=f"bench{i}@example.com",
+            hashed_password="$2b$12$" + "x" * 53,
+            role=UserRole.user,
+            token_version=0,
+            is_2fa_enabled=False,
+            created_at=now,
+            updated_at=now,
+        )
+        for i in range(count)
+    ]
+
+
+def _envelope(data) -> dict:
+    return {"status": 200, "message": "Users retrieved successfully", "data": data, "next_cursor": None}
+
+
+# Each path returns the response body bytes
+def orm_jsonable_encoder(users):
+    """Raw ORM objects in a dict, rendered by FastAPI's default JSONResponse (leaks every column)."""
+    return json.dumps(jsonable_encoder(_envelope(users)), separators=(",", ":")).encode()
+
+
+def orm_jsonable_encoder_orjson(users):
+    """Same, rendered by ORJSONResponse: only the final dump gets faster."""
+    return orjson.dumps(jsonable_encoder(_envelope(users)))
+
+
+def model_validate(users):
+    """Public fields via UserSummary.model_validate(from_attributes=True), then jsonable_encoder."""
+    data = [UserSummary.model_validate(user, from_attributes=True) for user in users]
+    return orjson.dumps(jsonable_encoder(_envelope(data)))
+
+
+def precompiled(users):
+    """model_construct from trusted attributes + the precompiled TypeAdapter (the new path)."""
+    response = UserListResponse.model_construct(**_envelope([to_model(UserSummary, user) for user in users]))
+    return adapter_for(UserListResponse).dump_json(response)
+
+
+PATHS = (orm_jsonable_encoder, orm_jsonable_encoder_orjson, model_validate, precompiled)
+
+
+def run(users: int, repeat: int) -> dict:
+    rows = _users(users)
+    report = {"users": users, "repeat": repeat}
+    for path in PATHS:
+        body = path(rows)  # warm up
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            path(rows)
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        report[path.__name__] = {
+            "best_ms": round(best * 1000, 2),
+            "users_per_sec": round(users / best),
+            "body_bytes": len(body),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(run(args.users, args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
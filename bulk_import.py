@@ -0,0 +1,231 @@
+"""
+Bulk-provision users from a CSV file with columns: username,email,password[,role]
+
+    python bulk_import.py partners.csv
+    python bulk_import.py partners.csv --resume      # continue after a failure
+
+Passwords are hashed in parallel across cores and rows are inserted in batches
+(COPY on PostgreSQL, multi-row INSERT on SQLite). Emails are normalised as on
+signup; rows whose email already exists, whose username is taken, or whose email
+is invalid are skipped and counted separately.
+Progress is checkpointed after every committed batch.
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+from pydantic import EmailStr, TypeAdapter, ValidationError
+from sqlalchemy import insert, select
+
+from app.database import engine
+from app.models.user import User, UserRole
+from app.utils.redis_client import close_redis
+from app.utils.response_cache import invalidate_tags
+from app.utils.security import hash_password
+
+COLUMNS = [
+    "id",
+    "username",
+    "email",
+    "hashed_password",
+    "role",
+    "token_version",
+    "is_2fa_enabled",
+    "created_at",
+    "updated_at",
+]
+# Same normalisation as the signup schema: whitespace stripped, domain lowercased
+_email = TypeAdapter(EmailStr)
+
+
+# --- Checkpointing ---
+def load_checkpoint(path: Path) -> int:
+    if not path.exists():
+        return 0
+    return json.loads(path.read_text())["rows_done"]
+
+
+def save_checkpoint(path: Path, rows_done: int):
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps({"rows_done": rows_done}))
+    os.replace(tmp, path)
+
+
+# --- CSV input ---
+def normalize_email(email: str) -> str | None:
+    """The email as signup would store it, or None when it is invalid."""
+    try:
+        return _email.validate_python(email.strip())
+    except ValidationError:
+        return None
+
+
+def read_batches(csv_path: Path, start: int, batch_size: int):
+    """Yield lists of CSV rows, skipping the first `start` data rows."""
+    with open(csv_path, newline="") as f:
+        batch = []
+        for i, row in enumerate(csv.DictReader(f)):
+            if i < start:
+                continue
+            batch.append(row)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+# --- Inserts ---
+def insert_postgres(conn, rows: list[dict]) -> int:
+    """COPY into a temp table, then insert what does not clash with an existing row."""
+    raw = conn.connection.dbapi_connection
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow([row[c] for c in COLUMNS])
+    buf.seek(0)
+
+    with raw.cursor() as cur:
+        cur.execute("CREATE TEMP TABLE IF NOT EXISTS users_import (LIKE users INCLUDING DEFAULTS) ON COMMIT DELETE ROWS")
+        cur.copy_expert(f"COPY users_import ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buf)
+        cur.execute(
+            f"INSERT INTO users ({', '.join(COLUMNS)}) "
+            f"SELECT {', '.join(COLUMNS)} FROM users_import ON CONFLICT DO NOTHING"
+        )
+        return cur.rowcount
+
+
+def insert_sqlite(conn, rows: list[dict]) -> int:
+    """Single multi-row INSERT OR IGNORE per batch."""
+    return conn.execute(insert(User.__table__).values(rows).prefix_with("OR IGNORE")).rowcount
+
+
+def insert_generic(conn, rows: list[dict]) -> int:
+    return conn.execute(insert(User.__table__), rows).rowcount
+
+
+async def invalidate_listings():
+    await invalidate_tags("users:list")
+    await close_redis()
+
+
+def import_users(
+    csv_path: Path,
+    checkpoint: Path,
+    db_engine=engine,
+    batch_size: int = 1000,
+    workers: int = 1,
+    default_role: str = UserRole.user.value,
+    resume: bool = False,
+) -> dict:
+    """
+    Import `csv_path` into `db_engine` and return the counts:
+    inserted, duplicate_emails, username_conflicts, invalid_emails and conflicts
+    (rows a concurrent writer claimed between the checks and the insert).
+    """
+    rows_done = load_checkpoint(checkpoint) if resume else 0
+    if rows_done:
+        print(f"[INFO] Resuming after row {rows_done}")
+
+    insert_rows = {"postgresql": insert_postgres, "sqlite": insert_sqlite}.get(db_engine.dialect.name, insert_generic)
+    counts = {"inserted": 0, "duplicate_emails": 0, "username_conflicts": 0, "invalid_emails": 0, "conflicts": 0}
+    started = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for batch in read_batches(csv_path, rows_done, batch_size):
+            for row in batch:
+                row["email"] = normalize_email(row["email"])
+                row["username"] = row["username"].strip()
+            emails = {row["email"] for row in batch if row["email"]}
+            usernames = {row["username"] for row in batch}
+            with db_engine.connect() as conn:
+                existing = set(conn.execute(select(User.email).where(User.email.in_(emails))).scalars())
+                taken = set(conn.execute(select(User.username).where(User.username.in_(usernames))).scalars())
+
+            new_rows = []
+            for row in batch:
+                if row["email"] is None:
+                    counts["invalid_emails"] += 1
+                elif row["email"] in existing:
+                    counts["duplicate_emails"] += 1
+                elif row["username"] in taken:
+                    counts["username_conflicts"] += 1
+                else:
+                    existing.add(row["email"])
+                    taken.add(row["username"])
+                    new_rows.append(row)
+
+            hashes = pool.map(hash_password, [row["password"] for row in new_rows], chunksize=max(1, len(new_rows) // (workers * 4)))
+            now = datetime.now(timezone.utc)
+            values = [
+                {
+                    "id": str(uuid.uuid4()),
+                    "username": row["username"],
+                    "email": row["email"],
+                    "hashed_password": hashed,
+                    "role": UserRole(row.get("role") or default_role).value,
+                    "token_version": 0,
+                    "is_2fa_enabled": False,
+                    "created_at": now,
+                    "updated_at": now,
+                }
+                for row, hashed in zip(new_rows, hashes)
+            ]
+
+            with db_engine.begin() as conn:
+                batch_inserted = insert_rows(conn, values) if values else 0
+
+            rows_done += len(batch)
+            counts["inserted"] += batch_inserted
+            counts["conflicts"] += len(values) - batch_inserted
+            save_checkpoint(checkpoint, rows_done)
+
+            elapsed = time.perf_counter() - started
+            print(f"[INFO] {rows_done} rows read, {_summary(counts)} ({counts['inserted'] / elapsed:.1f} rows/sec)")
+
+    return counts
+
+
+def _summary(counts: dict) -> str:
+    return ", ".join(f"{value} {name.replace('_', ' ')}" for name, value in counts.items())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("csv_path", type=Path)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="password hashing processes")
+    parser.add_argument("--role", default=UserRole.user.value, choices=[r.value for r in UserRole], help="role for rows without one")
+    parser.add_argument("--resume", action="store_true", help="continue from the last checkpoint")
+    parser.add_argument("--checkpoint", type=Path, help="defaults to <csv_path>.checkpoint")
+    args = parser.parse_args()
+
+    checkpoint = args.checkpoint or args.csv_path.with_name(args.csv_path.name + ".checkpoint")
+    started = time.perf_counter()
+    counts = import_users(
+        args.csv_path,
+        checkpoint,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        default_role=args.role,
+        resume=args.resume,
+    )
+
+    if counts["inserted"]:
+        # Cached admin user listings no longer match the table
+        asyncio.run(invalidate_listings())
+
+    elapsed = time.perf_counter() - started
+    print(f"[INFO] Done in {elapsed:.1f}s: {_summary(counts)}, {counts['inserted'] / elapsed if elapsed else 0:.1f} rows/sec")
+
+
+if __name__ == "__main__":
+    main()
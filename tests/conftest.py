@@ -1,4 +1,6 @@
+import pytest
 import pytest_asyncio
+from fastapi import FastAPI
 from httpx import AsyncClient, ASGITransport
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
@@ -6,6 +8,7 @@ from sqlalchemy.orm import sessionmaker
 from app.main import app
 from app.database import Base, get_async_session
 from app.models.user import User
+from app.utils import tiered_cache
 from app.utils.security import hash_password
 
 # Use a test database (SQLite in-memory for speed)
@@ -54,5 +57,64 @@ async def test_client(setup_database):
         yield ac
 
 
+@pytest.fixture
+def probe_app():
+    """Bare app for exercising a dependency on its own routes, backed by the test database."""
+    probe = FastAPI()
+    probe.dependency_overrides[get_async_session] = override_get_db
+    return probe
+
+
+@pytest_asyncio.fixture
+async def probe_client(probe_app):
+    """Client for probe_app; declare the routes before the first request."""
+    async with AsyncClient(transport=ASGITransport(app=probe_app), base_url="http://test") as client:
+        yield client
+
+
+@pytest.fixture
+def local_cache_tier(monkeypatch):
+    """Serve principal and entitlement lookups from the local tier, as a subscribed worker does."""
+    monkeypatch.setattr(tiered_cache, "_listening", True)
+
+
+class SharedRedis:
+    """In-memory Redis for TwoTierCache; published invalidations reach every cache at once."""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def delete(self, key):
+        return int(self.data.pop(key, None) is not None)
+
+    async def publish(self, channel, message):
+        tiered_cache._apply_invalidation(message)
+        return 1
+
+
+@pytest.fixture
+def shared_redis(monkeypatch, local_cache_tier):
+    """Let TwoTierCache instances act as separate workers sharing one Redis."""
+    redis = SharedRedis()
+
+    async def get_redis():
+        return redis
+
+    monkeypatch.setattr(tiered_cache, "get_redis", get_redis)
+    for caches in tiered_cache._caches.values():
+        for cache in caches:
+            monkeypatch.setattr(cache._redis, "retry_at", 0.0)  # earlier tests may have found Redis down
+    return redis
+
+
 ### Note: To run tests, use the command:
 ### pytest -v --tb=short --disable-warnings -p no:warnings
\ No newline at end of file
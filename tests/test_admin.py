@@ -0,0 +1,114 @@
+import csv
+import io
+import json
+
+import pytest
+
+
+async def _admin_headers(test_client):
+    response = await test_client.post("/auth/login", json={
+        "email": "admin@example.com",
+        "password": "password123"
+    })
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.mark.asyncio
+async def test_export_users(test_client):
+    headers = await _admin_headers(test_client)
+
+    listing = (await test_client.get("/admin/users", params={"limit": 200}, headers=headers)).json()
+    response = await test_client.get("/admin/export/users", headers=headers)
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["email"] for row in rows] == [user["email"] for user in listing["data"]]
+    assert all("hashed_password" not in row for row in rows)
+
+    # gzip is decoded transparently by the client
+    response = await test_client.get("/admin/export/users", params={"format": "csv", "gzip": True}, headers=headers)
+    assert response.headers["content-encoding"] == "gzip"
+    reader = csv.DictReader(io.StringIO(response.text))
+    assert [row["email"] for row in reader] == [row["email"] for row in rows]
+
+    response = await test_client.get("/admin/export/users", params={"since": "2999-01-01T00:00:00"}, headers=headers)
+    assert response.text == ""
+
+
+@pytest.mark.asyncio
+async def test_export_subscriptions(test_client):
+    from app.models.subscription import Subscription, SubscriptionStatus
+    from app.models.user import User
+    from sqlalchemy.future import select
+    from tests.conftest import TestingSessionLocal
+
+    async with TestingSessionLocal() as session:
+        admin = (await session.execute(select(User).where(User.email == "admin@example.com"))).scalars().first()
+        session.add(Subscription(user_id=admin.id, stripe_subscription_id="sub_export", status=SubscriptionStatus.ACTIVE))
+        await session.commit()
+
+    headers = await _admin_headers(test_client)
+    response = await test_client.get("/admin/export/subscriptions", headers=headers)
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [(row["stripe_subscription_id"], row["status"]) for row in rows] == [("sub_export", "active")]
+
+    # updated_at is timezone-aware, so bare and offset timestamps both filter
+    for since in ("2000-01-01T00:00:00", "2000-01-01T00:00:00+02:00"):
+        response = await test_client.get("/admin/export/subscriptions", params={"since": since}, headers=headers)
+        assert [json.loads(line)["stripe_subscription_id"] for line in response.text.splitlines()] == ["sub_export"]
+
+
+@pytest.mark.asyncio
+async def test_metrics_report_pool_usage(test_client, tmp_path):
+    from sqlalchemy import create_engine, text
+    from app.utils.metrics import TimedQueuePool, pool_stats
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=TimedQueuePool, pool_size=2)
+    with engine.connect() as conn:
+        conn.execute(text("select 1"))
+        stats = pool_stats(engine.pool)
+        assert stats["checked_out"] == 1
+        assert stats["checkout_wait_seconds"]["count"] == 1
+    engine.dispose()
+
+    response = await test_client.get("/admin/metrics", headers=await _admin_headers(test_client))
+    assert response.status_code == 200
+    assert {"sync", "async"} <= response.json()["data"]["db_pool"].keys()
+
+
+@pytest.mark.asyncio
+async def test_admin_can_profile_a_request(test_client):
+    headers = await _admin_headers(test_client)
+
+    profiled = await test_client.get("/admin/users", headers={**headers, "X-Profile": "1"})
+    profile_id = profiled.headers["X-Profile-Id"]
+
+    speedscope = (await test_client.get(f"/admin/profiles/{profile_id}", headers=headers)).json()
+    assert speedscope["profiles"][0]["type"] == "sampled"
+    collapsed = await test_client.get(f"/admin/profiles/{profile_id}", params={"format": "collapsed"}, headers=headers)
+    assert collapsed.headers["content-type"].startswith("text/plain")
+
+    # The header is ignored for everyone else
+    signup = await test_client.post("/auth/signup", json={
+        "username": "profiled",
+        "email": "profiled@example.com",
+        "password": "password123"
+    })
+    user_headers = {"Authorization": f"Bearer {signup.json()['access_token']}", "X-Profile": "1"}
+    assert "X-Profile-Id" not in (await test_client.get("/user/me", headers=user_headers)).headers
+
+    # ...and for a demoted admin whose token still claims the role
+    signup = await test_client.post("/auth/signup", json={
+        "username": "demoted",
+        "email": "demoted@example.com",
+        "password": "password123"
+    })
+    user_id = signup.json()["user"]["id"]
+    promote = await test_client.post("/admin/update-role", json={"user_id": user_id, "new_role": "admin"}, headers=headers)
+    assert promote.status_code == 200
+    login = await test_client.post("/auth/login", json={"email": "demoted@example.com", "password": "password123"})
+    demoted_headers = {"Authorization": f"Bearer {login.json()['access_token']}", "X-Profile": "1"}
+    assert "X-Profile-Id" in (await test_client.get("/health", headers=demoted_headers)).headers
+
+    demote = await test_client.post("/admin/update-role", json={"user_id": user_id, "new_role": "user"}, headers=headers)
+    assert demote.status_code == 200
+    assert "X-Profile-Id" not in (await test_client.get("/health", headers=demoted_headers)).headers
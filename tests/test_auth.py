@@ -1,3 +1,5 @@
+import time
+
 import pytest
 
 
@@ -23,4 +25,86 @@ async def test_login(test_client):
     data = response.json()
     assert "access_token" in data
     assert data["token_type"] == "bearer"
-    
\ No newline at end of file
+    
+@pytest.mark.asyncio
+async def test_login_rejected_when_hasher_saturated(test_client, monkeypatch):
+    from app.utils import password_hasher
+
+    # Pretend every worker and queue slot is taken
+    monkeypatch.setattr(password_hasher, "_pending", password_hasher.PASSWORD_HASH_WORKERS + password_hasher.PASSWORD_HASH_QUEUE_SIZE)
+    response = await test_client.post("/auth/login", json={
+        "email": "user@example.com",
+        "password": "password123"
+    })
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+
+
+def test_verified_token_cache():
+    from app.utils import security
+
+    token = security.create_access_token({"sub": "cache@example.com", "role": "user"})
+    assert security.verify_token(token)["sub"] == "cache@example.com"
+    assert token.rsplit(".", 1)[1] in security._verified_tokens
+
+    # A cached signature must not vouch for a different payload
+    header, payload, signature = token.split(".")
+    forged = security.create_access_token({"sub": "admin@example.com", "role": "admin"})
+    assert security.verify_token(".".join([header, forged.split(".")[1], signature])) is None
+
+
+@pytest.mark.asyncio
+async def test_setup_2fa_reuses_pending_secret_and_cached_qr(test_client):
+    from app.utils import qr
+
+    await test_client.post("/auth/signup", json={
+        "username": "qruser",
+        "email": "qr@example.com",
+        "password": "password123"
+    })
+    login = await test_client.post("/auth/login", json={"email": "qr@example.com", "password": "password123"})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+    first = (await test_client.post("/auth/setup-2fa", params={"format": "svg"}, headers=headers)).json()
+    assert first["qr_code"].startswith("data:image/svg+xml;utf8,%3Csvg xmlns='http://www.w3.org/2000/svg'")
+
+    renders = qr.qr_cache_stats()["renders"]
+    second = (await test_client.post("/auth/setup-2fa", params={"format": "svg"}, headers=headers)).json()
+    assert second["secret"] == first["secret"]
+    assert second["qr_code"] == first["qr_code"]
+    assert qr.qr_cache_stats()["renders"] == renders
+
+    png = (await test_client.post("/auth/setup-2fa", headers=headers)).json()
+    assert png["qr_code"].startswith("data:image/png;base64,")
+
+
+@pytest.mark.asyncio
+async def test_totp_codes_cannot_be_replayed(test_client, shared_redis):
+    import pyotp
+    from app.utils.principal_cache import PRINCIPAL_CACHE_PREFIX
+
+    await test_client.post("/auth/signup", json={
+        "username": "totpuser",
+        "email": "totp@example.com",
+        "password": "password123"
+    })
+    login = await test_client.post("/auth/login", json={"email": "totp@example.com", "password": "password123"})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+    secret = (await test_client.post("/auth/setup-2fa", headers=headers)).json()["secret"]
+    totp = pyotp.TOTP(secret)
+    response = await test_client.post("/auth/verify-2fa-setup", json={"code": totp.now()}, headers=headers)
+    assert response.status_code == 200
+    # 2FA secrets are loaded from the database, never cached with the user
+    del shared_redis.data[PRINCIPAL_CACHE_PREFIX + "totp@example.com"]  # let the tombstone expire
+    await test_client.get("/user/me", headers=headers)
+    cached = shared_redis.data[PRINCIPAL_CACHE_PREFIX + "totp@example.com"]
+    assert cached and secret not in cached and "backup_2fa_code" not in cached
+
+    # The setup code was consumed, so use the next step's code for login verification
+    code = totp.at(time.time() + 30)
+    assert (await test_client.post("/auth/verify-2fa", json={"code": code}, headers=headers)).status_code == 200
+    assert (await test_client.post("/auth/verify-2fa", json={"code": code}, headers=headers)).status_code == 401
+    assert (await test_client.post("/auth/verify-2fa", json={"code": "000000"}, headers=headers)).status_code == 401
+    # Non-ASCII digits are rejected, not a server error
+    assert (await test_client.post("/auth/verify-2fa", json={"code": "١٢٣٤٥٦"}, headers=headers)).status_code == 401
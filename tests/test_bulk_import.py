@@ -0,0 +1,52 @@
+import csv
+
+from sqlalchemy import create_engine, select
+
+import bulk_import
+from app.database import Base
+from app.models.user import User
+
+
+def _write_csv(path, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["username", "email", "password"])
+        writer.writerows(rows)
+
+
+def test_bulk_import_skips_duplicates_and_resumes(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'import.db'}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert().values(
+            id="existing", username="carol", email="carol@example.com", hashed_password="x", role="user",
+        ))
+
+    csv_path, checkpoint = tmp_path / "users.csv", tmp_path / "users.checkpoint"
+    _write_csv(csv_path, [
+        ("alice", " Alice@EXAMPLE.com ", "pw-alice"),
+        ("bob", "bob@example.com", "pw-bob"),
+        ("alice2", "Alice@example.com", "pw"),      # same email once normalised
+        ("carol2", "carol@example.com", "pw"),      # already in the table
+        ("bob", "robert@example.com", "pw"),        # username taken earlier in the file
+        ("carol", "carol.new@example.com", "pw"),   # username taken in the table
+        ("dave", "not-an-email", "pw"),
+    ])
+
+    counts = bulk_import.import_users(csv_path, checkpoint, engine, batch_size=3)
+    assert counts == {"inserted": 2, "duplicate_emails": 2, "username_conflicts": 2, "invalid_emails": 1, "conflicts": 0}
+    with engine.connect() as conn:
+        emails = set(conn.execute(select(User.email)).scalars())
+    assert emails == {"carol@example.com", "Alice@example.com", "bob@example.com"}
+    assert bulk_import.load_checkpoint(checkpoint) == 7
+
+    # Rows appended after the run: --resume only reads what is past the checkpoint
+    with open(csv_path, "a", newline="") as f:
+        csv.writer(f).writerow(("erin", "erin@example.com", "pw"))
+    counts = bulk_import.import_users(csv_path, checkpoint, engine, batch_size=3, resume=True)
+    assert counts == {"inserted": 1, "duplicate_emails": 0, "username_conflicts": 0, "invalid_emails": 0, "conflicts": 0}
+    assert bulk_import.load_checkpoint(checkpoint) == 8
+
+    # A full re-run is safe: nothing is inserted twice
+    counts = bulk_import.import_users(csv_path, checkpoint, engine, batch_size=3)
+    assert counts["inserted"] == 0 and counts["duplicate_emails"] == 5
@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+from app.utils import cache
+from app.utils.tiered_cache import TwoTierCache
+
+
+def test_local_tier_is_bounded_and_invalidated_by_other_workers(monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_LOCAL_MAX_BYTES", 10)
+    cache._local_clear()
+
+    # Least recently used entries are evicted to stay under the byte cap
+    cache._local_set("fastapi-cache:a", b"12345", 60)
+    cache._local_set("fastapi-cache:b", b"12345", 60)
+    cache._local_get("fastapi-cache:a")
+    cache._local_set("fastapi-cache:c", b"12345", 60)
+    assert list(cache._local) == ["fastapi-cache:a", "fastapi-cache:c"]
+    assert cache.cache_stats()["local_bytes"] == 10
+
+    # Our own messages are ignored; another worker's drop the named keys
+    cache._apply_invalidation(json.dumps({"origin": cache._origin, "keys": ["fastapi-cache:a"]}))
+    assert "fastapi-cache:a" in cache._local
+    cache._apply_invalidation(json.dumps({"origin": "other", "keys": ["fastapi-cache:a"]}))
+    assert "fastapi-cache:a" not in cache._local
+    cache._apply_invalidation(json.dumps({"origin": "other", "namespace": "fastapi-cache"}))
+    assert cache.cache_stats()["local_size"] == 0
+
+
+@pytest.mark.asyncio
+async def test_two_tier_deletes_reach_other_workers(shared_redis):
+    worker_a = TwoTierCache("test:", local_size=10, local_ttl=60, redis_ttl=60)
+    worker_b = TwoTierCache("test:", local_size=10, local_ttl=60, redis_ttl=60)
+    await worker_a.set("k", {"v": 1})
+    assert await worker_b.get("k") == {"v": 1}  # now held in worker B's local tier
+
+    await worker_a.delete("k")
+    assert await worker_b.get("k") is None
+    assert worker_b.stats()["invalidations_received"] == 1
+
+
+@pytest.mark.asyncio
+async def test_fill_cannot_resurrect_a_deleted_value(shared_redis):
+    worker_a = TwoTierCache("fill:", local_size=10, local_ttl=60, redis_ttl=60)
+    worker_b = TwoTierCache("fill:", local_size=10, local_ttl=60, redis_ttl=60)
+
+    # Worker B misses and reads the old row; worker A commits a change and deletes meanwhile
+    generation = worker_b.generation
+    assert await worker_b.get("k") is None
+    await worker_a.delete("k")
+    await worker_b.fill("k", {"v": "old"}, generation)
+    assert await worker_a.get("k") is None
+
+    # Even where the invalidation has not arrived yet, the Redis tombstone refuses the fill
+    await worker_b.fill("k", {"v": "old"}, worker_b.generation)
+    assert shared_redis.data["fill:k"] == "" and not worker_b._local
+
+    # Reads after the tombstone load the new row as usual
+    del shared_redis.data["fill:k"]
+    await worker_b.fill("k", {"v": "new"}, worker_b.generation)
+    assert await worker_a.get("k") == {"v": "new"}
+
+
+@pytest.mark.asyncio
+async def test_clear_survives_redis_outage(monkeypatch):
+    async def unreachable():
+        raise ConnectionError("redis is down")
+
+    monkeypatch.setattr(cache, "get_redis", unreachable)
+    monkeypatch.setattr(cache._redis, "retry_at", 0.0)
+    cache._local_set("fastapi-cache:a", b"1", 60)
+    errors = cache.cache_stats()["redis_errors"]
+
+    assert await cache.TieredBackend().clear(namespace="fastapi-cache") == 0
+    assert "fastapi-cache:a" not in cache._local
+    assert cache.cache_stats()["redis_errors"] == errors + 1
+    # Skipped while backing off, but the local tier is still cleared
+    cache._local_set("fastapi-cache:b", b"1", 60)
+    assert await cache.TieredBackend().clear(key="fastapi-cache:b") == 0
+    assert "fastapi-cache:b" not in cache._local
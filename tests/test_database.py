@@ -0,0 +1,57 @@
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.future import select
+
+from app.database import Base, make_async_sessionmaker
+from app.models.user import User
+from app.utils.db_routing import is_replica_healthy, watch_replica
+
+
+async def _create_db(path, email):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(User.__table__.insert().values(id=email, username=email, email=email, hashed_password="x"))
+    return engine
+
+
+async def _emails(session):
+    return set((await session.execute(select(User.email))).scalars())
+
+
+@pytest.mark.asyncio
+async def test_reads_use_replica_until_session_writes(tmp_path):
+    primary = await _create_db(tmp_path / "primary.db", "primary@example.com")
+    replica = await _create_db(tmp_path / "replica.db", "replica@example.com")
+    SessionLocal = make_async_sessionmaker(primary, [replica])
+
+    async with SessionLocal() as session:
+        assert await _emails(session) == {"replica@example.com"}
+
+        session.add(User(username="writer", email="writer@example.com", hashed_password="x"))
+        await session.flush()
+        # Pinned to the primary from now on, so the session reads its own write
+        assert await _emails(session) == {"primary@example.com", "writer@example.com"}
+        await session.commit()
+
+    await primary.dispose()
+    await replica.dispose()
+
+
+@pytest.mark.asyncio
+async def test_unreachable_replica_falls_back_to_primary(tmp_path):
+    primary = await _create_db(tmp_path / "primary.db", "primary@example.com")
+    replica = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    watch_replica(replica)
+    SessionLocal = make_async_sessionmaker(primary, [replica])
+
+    async with SessionLocal() as session:
+        with pytest.raises(Exception):
+            await _emails(session)
+    assert not is_replica_healthy(replica.sync_engine)
+
+    async with SessionLocal() as session:
+        assert await _emails(session) == {"primary@example.com"}
+
+    await primary.dispose()
+    await replica.dispose()
@@ -0,0 +1,26 @@
+import pytest
+
+
+@pytest.mark.asyncio
+async def test_server_timing_and_prometheus_metrics(test_client):
+    from app.utils.metrics import instrument_engine
+    from tests.conftest import engine
+
+    instrument_engine(engine.sync_engine)
+    signup = await test_client.post("/auth/signup", json={
+        "username": "timed",
+        "email": "timed@example.com",
+        "password": "password123"
+    })
+    timing = signup.headers["Server-Timing"]
+    for component in ("db", "bcrypt", "jwt", "total"):
+        assert f"{component};dur=" in timing
+
+    headers = {"Authorization": f"Bearer {signup.json()['access_token']}"}
+    assert (await test_client.get("/user/me", headers=headers)).status_code == 200
+
+    body = (await test_client.get("/metrics")).text
+    assert 'http_requests_total{method="GET",route="/user/me",status="200"}' in body
+    assert 'http_request_duration_seconds_bucket{method="POST",route="/auth/signup",le="+Inf"}' in body
+    assert 'app_component_duration_seconds_count{component="bcrypt"}' in body
+    assert 'http_requests_in_progress{method="GET"} 1' in body  # the scrape itself
@@ -0,0 +1,336 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+from fastapi import Depends
+from sqlalchemy.future import select
+
+from app.api import payment
+from app.models.subscription import Subscription, SubscriptionPlan, SubscriptionStatus
+from app.models.user import User
+from app.models.webhook import StripeEvent, StripeEventDeadLetter
+from app.utils import catalog, entitlements, payment_gateway, rbac, webhook_worker
+from app.utils.payment_gateway import PaymentGateway
+from tests.conftest import TestingSessionLocal
+
+WEBHOOK_SECRET = "whsec_test"
+
+
+class FakeGateway(PaymentGateway):
+    """Local stand-in for the Stripe API."""
+
+    def __init__(self):
+        self.subscriptions = {}
+        self.prices = {}
+        self.price_calls = 0
+
+    async def retrieve_subscription(self, subscription_id):
+        return self.subscriptions[subscription_id]
+
+    async def retrieve_price(self, price_id):
+        self.price_calls += 1
+        return self.prices[price_id]
+
+    async def create_checkout_session(self, **params):
+        return {"id": "cs_test", "url": "https://checkout.stripe.test/cs_test"}
+
+    async def cancel_subscription_at_period_end(self, subscription_id):
+        self.subscriptions[subscription_id] = {"cancel_at_period_end": True}
+        return self.subscriptions[subscription_id]
+
+
+def _signed(event: dict) -> tuple[str, dict]:
+    payload = json.dumps(event)
+    timestamp = int(time.time())
+    signature = hmac.new(WEBHOOK_SECRET.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256).hexdigest()
+    return payload, {"stripe-signature": f"t={timestamp},v1={signature}", "Content-Type": "application/json"}
+
+
+async def _post_event(test_client, event: dict):
+    payload, headers = _signed(event)
+    return await test_client.post("/payment/webhook", content=payload, headers=headers)
+
+
+async def _admin_id():
+    async with TestingSessionLocal() as session:
+        return (await session.execute(select(User.id).where(User.email == "admin@example.com"))).scalar()
+
+
+@pytest.mark.asyncio
+async def test_webhook_is_acknowledged_then_processed(test_client, monkeypatch):
+    monkeypatch.setattr(payment, "STRIPE_WEBHOOK_SECRET", WEBHOOK_SECRET)
+    gateway = FakeGateway()
+    gateway.subscriptions["sub_webhook"] = {"status": "active", "current_period_end": int(time.time()) + 86400}
+
+    event = {
+        "id": "evt_checkout",
+        "type": "checkout.session.completed",
+        "created": 1,
+        "data": {"object": {"subscription": "sub_webhook", "client_reference_id": await _admin_id()}},
+    }
+    response = await _post_event(test_client, event)
+    assert response.json() == {"status": "accepted"}
+    response = await _post_event(test_client, event)
+    assert response.json() == {"status": "duplicate"}
+
+    cancel = {
+        "id": "evt_cancel",
+        "type": "customer.subscription.deleted",
+        "created": 2,
+        "data": {"object": {"id": "sub_webhook"}},
+    }
+    await _post_event(test_client, cancel)
+
+    # Applied in order: created, then canceled
+    assert await webhook_worker.process_pending_events(TestingSessionLocal, gateway) == 2
+    async with TestingSessionLocal() as session:
+        subscription = (await session.execute(
+            select(Subscription).where(Subscription.stripe_subscription_id == "sub_webhook")
+        )).scalars().one()
+        assert subscription.status == SubscriptionStatus.CANCELED
+
+
+@pytest.mark.asyncio
+async def test_webhook_rejects_bad_signature(test_client, monkeypatch):
+    monkeypatch.setattr(payment, "STRIPE_WEBHOOK_SECRET", "whsec_other")
+    response = await _post_event(test_client, {"id": "evt_bad", "type": "x", "data": {"object": {}}})
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_failing_event_is_dead_lettered(test_client, monkeypatch):
+    monkeypatch.setattr(payment, "STRIPE_WEBHOOK_SECRET", WEBHOOK_SECRET)
+    monkeypatch.setattr(webhook_worker, "WEBHOOK_RETRY_BASE", 0)
+    monkeypatch.setattr(webhook_worker, "WEBHOOK_MAX_ATTEMPTS", 2)
+
+    await _post_event(test_client, {
+        "id": "evt_orphan",
+        "type": "checkout.session.completed",
+        "created": 3,
+        "data": {"object": {"subscription": "sub_orphan", "client_reference_id": "missing-user"}},
+    })
+    for _ in range(2):
+        assert await webhook_worker.process_pending_events(TestingSessionLocal, FakeGateway()) == 0
+
+    async with TestingSessionLocal() as session:
+        assert await session.get(StripeEvent, "evt_orphan") is None
+        dead = await session.get(StripeEventDeadLetter, "evt_orphan")
+        assert dead.attempts == 2 and "missing-user" in dead.last_error
+
+
+@pytest.mark.asyncio
+async def test_held_subscriptions_do_not_starve_others(test_client, monkeypatch):
+    monkeypatch.setattr(webhook_worker, "WEBHOOK_BATCH_SIZE", 1)
+    later = datetime.now(timezone.utc) + timedelta(hours=1)
+
+    def event(event_id, key, created, **fields):
+        payload = json.dumps({"id": event_id, "type": "customer.subscription.updated", "data": {"object": {"id": key}}})
+        return StripeEvent(id=event_id, type="customer.subscription.updated", payload=payload,
+                           subscription_key=key, stripe_created=created, **fields)
+
+    async with TestingSessionLocal() as session:
+        session.add_all([
+            event("evt_retrying", "sub_retrying", 10, next_attempt_at=later),
+            event("evt_behind_retry", "sub_retrying", 11),
+            event("evt_claimed", "sub_claimed", 12, locked_until=later),
+            event("evt_due", "sub_due", 13),
+        ])
+        await session.commit()
+
+    # Only the due subscription is claimed, although older events come first
+    assert await webhook_worker.process_pending_events(TestingSessionLocal, FakeGateway()) == 1
+    # Handled elsewhere in the meantime
+    assert await webhook_worker._process_event(TestingSessionLocal, "evt_gone", FakeGateway()) is False
+
+    async with TestingSessionLocal() as session:
+        assert (await session.get(StripeEvent, "evt_due")).status == "processed"
+        for event_id in ("evt_retrying", "evt_behind_retry", "evt_claimed", "evt_due"):
+            event = await session.get(StripeEvent, event_id)
+            assert event_id == "evt_due" or event.status == "pending"
+            await session.delete(event)
+        await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_products_are_served_from_catalog_cache(test_client, monkeypatch):
+    monkeypatch.setattr(catalog, "CATALOG_REDIS", False)
+    monkeypatch.setattr(catalog, "_entry", None)
+    gateway = FakeGateway()
+    gateway.prices = {pid: {"id": pid, "unit_amount": 500} for pid in payment.PRICE_IDS}
+    monkeypatch.setattr("app.utils.payment_gateway._gateway", gateway)
+
+    response = await test_client.get("/payment/products")
+    assert [p["id"] for p in response.json()["prices"]] == payment.PRICE_IDS
+    await test_client.get("/payment/products")
+    assert gateway.price_calls == len(payment.PRICE_IDS)
+
+    # Past the refresh-ahead point: served immediately, refreshed in the background
+    catalog._entry["fetched_at"] -= catalog.CATALOG_TTL
+    gateway.prices = {pid: {"id": pid, "unit_amount": 700} for pid in payment.PRICE_IDS}
+    response = await test_client.get("/payment/products")
+    assert response.json()["prices"][0]["unit_amount"] == 500
+    await catalog._refresh_task
+    response = await test_client.get("/payment/products")
+    assert response.json()["prices"][0]["unit_amount"] == 700
+
+    # Stripe down: stale prices keep being served
+    catalog._entry["fetched_at"] -= catalog.CATALOG_TTL
+    gateway.prices = {}
+    response = await test_client.get("/payment/products")
+    assert response.status_code == 200
+    await asyncio.gather(catalog._refresh_task, return_exceptions=True)
+    assert catalog.catalog_stats()["refresh_errors"] == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_cancel_catalog_refresh(monkeypatch):
+    monkeypatch.setattr(catalog, "CATALOG_REDIS", False)
+    monkeypatch.setattr(catalog, "_entry", None)
+    monkeypatch.setattr(catalog, "_refresh_task", None)
+    release = asyncio.Event()
+
+    class SlowGateway(FakeGateway):
+        async def retrieve_price(self, price_id):
+            await release.wait()
+            return {"id": price_id}
+
+    monkeypatch.setattr("app.utils.payment_gateway._gateway", SlowGateway())
+
+    first = asyncio.create_task(catalog.get_catalog(["price_a"]))
+    second = asyncio.create_task(catalog.get_catalog(["price_a"]))
+    await asyncio.sleep(0)
+    first.cancel()  # the first client disconnects
+    release.set()
+
+    assert await second == [{"id": "price_a"}]
+    assert first.cancelled()
+
+
+@pytest.mark.asyncio
+async def test_http_gateway_retries_and_opens_circuit(monkeypatch):
+    monkeypatch.setattr(payment_gateway, "STRIPE_RETRY_BASE", 0)
+    responses = [httpx.Response(503), httpx.Response(200, json={"id": "price_1"})]
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return responses.pop(0) if responses else httpx.Response(500)
+
+    breaker = payment_gateway.CircuitBreaker(threshold=1, cooldown=60)
+    gateway = payment_gateway.StripeHTTPGateway("sk_test", transport=httpx.MockTransport(handler), breaker=breaker)
+
+    assert await gateway.retrieve_price("price_1") == {"id": "price_1"}
+    assert len(requests) == 2
+
+    with pytest.raises(payment_gateway.GatewayUnavailable):
+        await gateway.cancel_subscription_at_period_end("sub_1")
+    post = requests[-1]
+    assert post.content == b"cancel_at_period_end=true" and post.headers["Idempotency-Key"]
+    # Every retry of the POST reuses its idempotency key
+    assert len({r.headers["Idempotency-Key"] for r in requests[2:]}) == 1
+
+    # Circuit open: fail fast without touching the network
+    sent = len(requests)
+    with pytest.raises(payment_gateway.GatewayUnavailable):
+        await gateway.retrieve_price("price_1")
+    assert len(requests) == sent
+
+    # A cancelled half-open trial does not keep the circuit blocked
+    breaker.opened_at -= breaker.cooldown
+    trial = asyncio.create_task(gateway.retrieve_price("price_1"))
+    await asyncio.sleep(0)
+    trial.cancel()
+    await asyncio.gather(trial, return_exceptions=True)
+    responses.append(httpx.Response(200, json={"id": "price_1"}))
+    assert await gateway.retrieve_price("price_1") == {"id": "price_1"}
+    assert breaker.state == "closed"
+    await gateway.close()
+
+
+def test_gateway_must_implement_every_call():
+    class Incomplete(payment_gateway.PaymentGateway):
+        async def retrieve_price(self, price_id):
+            return {}
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_form_encoding_matches_stripe():
+    assert payment_gateway._form_encode({"line_items": [{"price": "p", "quantity": 1}], "mode": "subscription"}) == [
+        ("line_items[0][price]", "p"),
+        ("line_items[0][quantity]", "1"),
+        ("mode", "subscription"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_cancel_subscription_uses_gateway(test_client, monkeypatch):
+    gateway = FakeGateway()
+    monkeypatch.setattr("app.utils.payment_gateway._gateway", gateway)
+    async with TestingSessionLocal() as session:
+        session.add(Subscription(user_id=await _admin_id(), stripe_subscription_id="sub_cancel"))
+        await session.commit()
+
+    login = await test_client.post("/auth/login", json={"email": "admin@example.com", "password": "password123"})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    response = await test_client.post("/payment/cancel-subscription", headers=headers)
+    assert response.status_code == 200
+    assert list(gateway.subscriptions.values()) == [{"cancel_at_period_end": True}]
+
+
+@pytest.mark.asyncio
+async def test_webhook_precomputes_entitlements(test_client, monkeypatch, local_cache_tier, probe_app, probe_client):
+    monkeypatch.setattr(payment, "STRIPE_WEBHOOK_SECRET", WEBHOOK_SECRET)
+    monkeypatch.setattr(webhook_worker, "STRIPE_PRICE_PLANS", {"price_pro": SubscriptionPlan.PRO})
+    signup = await test_client.post("/auth/signup", json={
+        "username": "subscriber",
+        "email": "subscriber@example.com",
+        "password": "password123"
+    })
+    user_id = signup.json()["user"]["id"]
+    headers = {"Authorization": f"Bearer {signup.json()['access_token']}"}
+
+    @probe_app.get("/pro")
+    async def pro_route(principal: rbac.Principal = Depends(rbac.require_subscription(plan="pro"))):
+        return {"id": principal.id}
+
+    @probe_app.get("/premium", dependencies=[Depends(rbac.require_subscription(plan="premium"))])
+    async def premium_route():
+        return {}
+
+    assert (await probe_client.get("/pro", headers=headers)).status_code == 402
+
+    gateway = FakeGateway()
+    gateway.subscriptions["sub_pro"] = {
+        "status": "active",
+        "current_period_end": int(time.time()) + 86400,
+        "items": {"data": [{"price": {"id": "price_pro"}}]},
+    }
+    await _post_event(test_client, {
+        "id": "evt_pro",
+        "type": "checkout.session.completed",
+        "created": 10,
+        "data": {"object": {"subscription": "sub_pro", "client_reference_id": user_id}},
+    })
+    assert await webhook_worker.process_pending_events(TestingSessionLocal, gateway) == 1
+
+    # Precomputed by the worker: served without recomputing from the database
+    misses = entitlements.entitlement_cache_stats()["misses"]
+    assert (await probe_client.get("/pro", headers=headers)).json() == {"id": user_id}
+    assert (await probe_client.get("/premium", headers=headers)).status_code == 402
+    assert entitlements.entitlement_cache_stats()["misses"] == misses
+
+    await _post_event(test_client, {
+        "id": "evt_pro_deleted",
+        "type": "customer.subscription.deleted",
+        "created": 11,
+        "data": {"object": {"id": "sub_pro"}},
+    })
+    assert await webhook_worker.process_pending_events(TestingSessionLocal, gateway) == 1
+    assert (await probe_client.get("/pro", headers=headers)).status_code == 402
@@ -0,0 +1,103 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import Depends, Response
+from starlette.requests import Request
+
+from app.models.subscription import Subscription, SubscriptionPlan, SubscriptionStatus
+from app.utils import entitlements, rate_limit
+from app.utils.rate_limit import per_plan_limiter
+from tests.conftest import TestingSessionLocal
+
+
+def _request(claims: dict | None) -> Request:
+    request = Request({"type": "http", "method": "GET", "path": "/", "headers": []})
+    request.state.auth_claims = claims
+    return request
+
+
+@pytest.mark.asyncio
+async def test_plan_limiter_resolves_quota_from_entitlements(test_client, local_cache_tier):
+    signup = await test_client.post("/auth/signup", json={
+        "username": "premiumuser",
+        "email": "premium@example.com",
+        "password": "password123"
+    })
+    user_id = signup.json()["user"]["id"]
+    limiter = per_plan_limiter({"pro": (60, 60), "premium": (300, 60)}, times=3, seconds=60)
+
+    async with TestingSessionLocal() as db:
+        claims = {"sub": "premium@example.com", "uid": user_id}
+        assert await limiter.resolve_limit(_request(claims), db) == ("free", 3, 60000)
+        assert await limiter.resolve_limit(_request(None), db) == ("free", 3, 60000)
+
+        db.add(Subscription(
+            user_id=user_id,
+            stripe_subscription_id="sub_premium_limits",
+            plan=SubscriptionPlan.PREMIUM,
+            status=SubscriptionStatus.ACTIVE,
+            current_period_end=datetime.now(timezone.utc) + timedelta(days=30),
+        ))
+        await db.commit()
+        await entitlements.refresh_entitlements(db, user_id)
+
+        # Warm entitlement cache: resolved without touching the database
+        misses = entitlements.entitlement_cache_stats()["misses"]
+        assert await limiter.resolve_limit(_request(claims), db) == ("premium", 300, 60000)
+        assert entitlements.entitlement_cache_stats()["misses"] == misses
+
+
+@pytest.mark.asyncio
+async def test_hybrid_limiter_enforces_limit_without_redis(test_client, monkeypatch):
+    async def unreachable():
+        raise ConnectionError("redis is down")
+
+    monkeypatch.setattr(rate_limit, "get_redis", unreachable)
+    monkeypatch.setattr(rate_limit._redis, "retry_at", 0.0)
+
+    login = await test_client.post("/auth/login", json={"email": "premium@example.com", "password": "password123"})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+    # /rate-limit-test allows 3 calls per minute
+    codes = [(await test_client.get("/rate-limit-test", headers=headers)).status_code for _ in range(4)]
+    assert codes == [200, 200, 200, 429]
+    assert rate_limit.rate_limit_stats()["fallback"] >= 4
+
+
+@pytest.mark.asyncio
+async def test_multi_window_limiter_headers(test_client, monkeypatch, probe_app, probe_client):
+    async def unreachable():
+        raise ConnectionError("redis is down")
+
+    monkeypatch.setattr(rate_limit, "get_redis", unreachable)
+    monkeypatch.setattr(rate_limit._redis, "retry_at", 0.0)
+    probe_app.add_middleware(rate_limit.RateLimitHeadersMiddleware)
+
+    @probe_app.get("/search", dependencies=[Depends(rate_limit.multi_window_limiter((2, 1), (3, 3600)))])
+    async def search():
+        # Returned directly, like the json_response and cache_response routes
+        return Response(content="{}", media_type="application/json")
+
+    login = await test_client.post("/auth/login", json={"email": "premium@example.com", "password": "password123"})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+    first = await probe_client.get("/search", headers=headers)
+    assert first.headers["RateLimit-Remaining"] == "1"
+    assert first.headers["RateLimit-Limit"] == "2"
+    assert first.headers["RateLimit-Policy"] == "2;w=1, 3;w=3600"
+
+    second = await probe_client.get("/search", headers=headers)
+    burst = await probe_client.get("/search", headers=headers)
+    assert second.status_code == 200
+    assert burst.status_code == 429 and int(burst.headers["Retry-After"]) >= 1
+
+    # Burst window refilled, but the hourly window allows only one more
+    await asyncio.sleep(1.05)
+    assert (await probe_client.get("/search", headers=headers)).headers["RateLimit-Limit"] == "3"
+    hourly = await probe_client.get("/search", headers=headers)
+    assert hourly.status_code == 429 and int(hourly.headers["Retry-After"]) > 60
+
+    # The app's own demo route, behind the app middleware
+    demo = await test_client.get("/multi-window-rate-limit-test", headers=headers)
+    assert demo.status_code == 200 and demo.headers["RateLimit-Policy"] == "10;w=1, 1000;w=3600"
@@ -48,3 +48,113 @@ async def test_admin_access_only(test_client):
     )
     # assert response_user.status_code == 403
     print(response_user.json())
+
+
+async def _login(test_client, email):
+    response = await test_client.post("/auth/login", json={"email": email, "password": "password123"})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.mark.asyncio
+async def test_role_change_revokes_old_tokens(test_client):
+    signup = await test_client.post("/auth/signup", json={
+        "username": "promoted",
+        "email": "promoted@example.com",
+        "password": "password123"
+    })
+    user_id = signup.json()["user"]["id"]
+    old_headers = {"Authorization": f"Bearer {signup.json()['access_token']}"}
+
+    admin_headers = await _login(test_client, "admin@example.com")
+    response = await test_client.post(
+        "/admin/update-role",
+        json={"user_id": user_id, "new_role": "admin"},
+        headers=admin_headers,
+    )
+    assert response.status_code == 200
+    assert response.json()["data"] == {
+        "id": user_id,
+        "username": "promoted",
+        "email": "promoted@example.com",
+        "role": "admin",
+        "is_2fa_enabled": False,
+    }
+
+    # The token issued with the old role is rejected, a fresh one carries the new role
+    assert (await test_client.get("/user/me", headers=old_headers)).status_code == 401
+    new_headers = await _login(test_client, "promoted@example.com")
+    listing = await test_client.get("/admin/users", headers=new_headers)
+    assert listing.status_code == 200
+    assert {"id", "email", "role", "created_at"} <= set(listing.json()["data"][0])
+
+
+@pytest.mark.asyncio
+async def test_claims_only_role_check(test_client, monkeypatch, probe_app, probe_client):
+    from fastapi import Depends
+    from app.utils import rbac
+
+    monkeypatch.setattr(rbac, "AUTH_CLAIMS_ONLY", True)
+
+    @probe_app.get("/probe")
+    async def probe_route(principal: rbac.Principal = Depends(rbac.require_role("admin"))):
+        return {"email": principal.email, "role": principal.role}
+
+    response = await probe_client.get("/probe", headers=await _login(test_client, "admin@example.com"))
+    assert response.status_code == 200
+    assert response.json() == {"email": "admin@example.com", "role": "admin"}
+
+    response = await probe_client.get("/probe", headers=await _login(test_client, "user@example.com"))
+    assert response.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_claims_only_revocation_reaches_other_workers(test_client, shared_redis):
+    from sqlalchemy.future import select
+    from app.models.user import User
+    from app.utils.principal_cache import PRINCIPAL_CACHE_PREFIX
+    from app.utils.tiered_cache import TwoTierCache
+    from tests.conftest import TestingSessionLocal
+
+    signup = await test_client.post("/auth/signup", json={
+        "username": "revoked",
+        "email": "revoked@example.com",
+        "password": "password123"
+    })
+    headers = {"Authorization": f"Bearer {signup.json()['access_token']}"}
+    # Claims-only check; the principal is now in this worker's local tier
+    assert (await test_client.get("/payment/entitlements", headers=headers)).status_code == 200
+
+    # Another worker revokes the token (as /admin/update-role does) and invalidates through its own cache
+    other_worker = TwoTierCache(PRINCIPAL_CACHE_PREFIX, local_size=10, local_ttl=60, redis_ttl=60)
+    async with TestingSessionLocal() as session:
+        user = (await session.execute(select(User).where(User.email == "revoked@example.com"))).scalars().one()
+        user.token_version += 1
+        await session.commit()
+    await other_worker.delete("revoked@example.com")
+
+    assert (await test_client.get("/payment/entitlements", headers=headers)).status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_admin_users_keyset_pagination(test_client):
+    headers = await _login(test_client, "admin@example.com")
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 1, **({"cursor": cursor} if cursor else {})}
+        page = (await test_client.get("/admin/users", params=params, headers=headers)).json()
+        assert len(page["data"]) <= 1
+        assert all("hashed_password" not in user for user in page["data"])
+        seen += [user["email"] for user in page["data"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+
+    full = (await test_client.get("/admin/users", params={"limit": 200}, headers=headers)).json()
+    assert seen == [user["email"] for user in full["data"]]
+
+    admins = (await test_client.get("/admin/users", params={"role": "admin"}, headers=headers)).json()
+    assert admins["data"] and all(user["role"] == "admin" for user in admins["data"])
+
+    response = await test_client.get("/admin/users", params={"cursor": "not-a-cursor"}, headers=headers)
+    assert response.status_code == 400
@@ -0,0 +1,23 @@
+import asyncio
+
+import pytest
+from redis.exceptions import ConnectionError
+
+from app.utils.redis_client import AutoPipelineRedis, redis_client_stats
+
+
+@pytest.mark.asyncio
+async def test_commands_in_one_tick_share_a_round_trip():
+    client = AutoPipelineRedis.from_url("redis://127.0.0.1:1", decode_responses=True)
+    before = redis_client_stats()
+
+    # Nothing listens on port 1: the whole batch fails, and every caller gets the error
+    results = await asyncio.gather(
+        client.get("a"), client.incr("b"), client.set("c", "1"), return_exceptions=True
+    )
+    assert all(isinstance(result, ConnectionError) for result in results)
+
+    after = redis_client_stats()
+    assert after["commands"] - before["commands"] == 3
+    assert after["round_trips"] - before["round_trips"] == 1
+    await client.connection_pool.disconnect()
@@ -16,4 +16,57 @@ async def test_access_protected_route(test_client):
     )
     assert response.status_code == 200
     data = response.json()
-    assert data["user_info"]["email"] == "user@example.com"
\ No newline at end of file
+    assert data["user_info"]["email"] == "user@example.com"
+
+@pytest.mark.asyncio
+async def test_current_user_cache_tracks_changes(test_client, local_cache_tier):
+    from sqlalchemy.future import select
+    from app.models.user import User
+    from app.utils.principal_cache import principal_cache_stats
+    from tests.conftest import TestingSessionLocal
+
+    login = await test_client.post("/auth/login", json={
+        "email": "user@example.com",
+        "password": "password123"
+    })
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+    # Second lookup is served from the local tier
+    await test_client.get("/user/me", headers=headers)
+    hits = principal_cache_stats()["local_hits"]
+    await test_client.get("/user/me", headers=headers)
+    assert principal_cache_stats()["local_hits"] == hits + 1
+
+    # Changes made through a cached user are still persisted
+    response = await test_client.post("/auth/enable-2fa", headers=headers)
+    secret = response.json()["secret"]
+    async with TestingSessionLocal() as session:
+        user = (await session.execute(select(User).where(User.email == "user@example.com"))).scalars().first()
+    assert user.pending_2fa_secret == secret
+
+
+@pytest.mark.asyncio
+async def test_me_is_cached_with_etag_and_invalidated(test_client):
+    from app.utils.response_cache import response_cache_stats
+
+    login = await test_client.post("/auth/login", json={
+        "email": "user@example.com",
+        "password": "password123"
+    })
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+    first = await test_client.get("/user/me", headers=headers)
+    etag = first.headers["ETag"]
+    assert "hashed_password" not in first.json()["user_info"]
+
+    hits = response_cache_stats()["hits"]
+    revalidated = await test_client.get("/user/me", headers={**headers, "If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert response_cache_stats()["hits"] == hits + 1
+
+    # Changing the row drops the entry; the rebuilt body is identical, so the ETag still matches
+    await test_client.post("/auth/enable-2fa", headers=headers)
+    misses = response_cache_stats()["misses"]
+    rebuilt = await test_client.get("/user/me", headers={**headers, "If-None-Match": etag})
+    assert response_cache_stats()["misses"] == misses + 1
+    assert rebuilt.status_code == 304